@@ -1,6 +1,10 @@
-import requests
 import os
 
+try:
+    from app.http_client import http_post
+except ImportError:
+    from http_client import http_post
+
 # Configuración con datos de EmailOctopus desde variables de entorno
 OCTOPUS_API_KEY = os.environ.get('OCTOPUS_API_KEY')
 OCTOPUS_LIST_ID = os.environ.get('OCTOPUS_LIST_ID')
@@ -39,7 +43,7 @@ def add_contact_to_octopus(email_address, nombre_apellido, empresa, ruc_dni):
         "tags": [],
         "status": "subscribed"
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_post("octopus", url, headers=headers, json=payload)
     return response
 
 if __name__ == '__main__':
@@ -1,14 +1,15 @@
 import os
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
 try:
     # Importaciones del paquete app (para Render/producción)
     from app.Mailing.lead_notification_template import create_lead_notification_email
+    from app.Mailing.smtp_transport import enviar_correo
 except ImportError:
     # Importaciones relativas (para desarrollo con run_app.py)
     from Mailing.lead_notification_template import create_lead_notification_email
+    from Mailing.smtp_transport import enviar_correo
 
 
 def send_lead_notification_email(lead_data):
@@ -63,15 +64,8 @@ def send_lead_notification_email(lead_data):
         part_html = MIMEText(html_body, 'html', 'utf-8')
         msg.attach(part_html)
         
-        # Enviar email
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, [notification_email], msg.as_string())
-        server.quit()
+        # Enviar email usando el pool SMTP compartido
+        enviar_correo(msg, [notification_email])
         
         print(f"✅ Notificación de lead {lead_data.get('origen', 'UNKNOWN')} enviada a {notification_email}")
         return {'status': 'ok', 'message': f'Notificación enviada correctamente a {notification_email}'}, 200
@@ -0,0 +1,346 @@
+"""
+Transporte SMTP compartido para todos los correos del sistema.
+
+Mantiene sesiones SMTP autenticadas (STARTTLS + login) reutilizables en un pool,
+en lugar de abrir y cerrar una conexión por correo. Gmail limita los logins
+repetidos y el handshake TLS es la mayor parte de la latencia de un envío.
+
+Incluye:
+- enviar_correo(): envío inmediato usando una sesión del pool
+- encolar_correo(): cola acotada atendida por hilos en segundo plano
+"""
+
+import os
+import time
+import queue
+import smtplib
+import threading
+
+# Configuración SMTP
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT', 30))
+# Sesiones autenticadas abiertas como máximo por proceso
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 2))
+# Si una sesión estuvo ociosa más de estos segundos se verifica con NOOP
+SMTP_IDLE_CHECK = int(os.environ.get('SMTP_IDLE_CHECK', 60))
+# Se cierra y renueva una sesión tras enviar esta cantidad de mensajes
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_SESSION', 90))
+# Cola de envío en segundo plano
+SMTP_QUEUE_SIZE = int(os.environ.get('SMTP_QUEUE_SIZE', 1000))
+SMTP_QUEUE_WORKERS = int(os.environ.get('SMTP_QUEUE_WORKERS', 1))
+# Cantidad de mensajes que un worker de la cola envía por sesión en cada vuelta
+SMTP_QUEUE_BATCH = int(os.environ.get('SMTP_QUEUE_BATCH', 50))
+
+# Errores que indican que la sesión ya no sirve y hay que reconectar
+ERRORES_RECONEXION = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+def es_error_reconexion(error):
+    """
+    True si el error deja la sesión inservible: desconexión o error de socket.
+    SMTPException hereda de OSError, pero un destinatario rechazado, un error
+    de datos o de autenticación es un error del mensaje y no de la sesión.
+    """
+    if isinstance(error, ERRORES_RECONEXION):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class _Sesion:
+    """Sesión SMTP autenticada con metadatos para decidir su reutilización."""
+
+    def __init__(self, server):
+        self.server = server
+        self.creada_en = time.time()
+        self.usada_en = time.time()
+        self.mensajes = 0
+
+    def cerrar(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPTransport:
+    """Pool de sesiones SMTP autenticadas y reutilizables."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abiertas = 0
+
+    def _credenciales(self):
+        # Se leen en cada conexión: el .env puede cargarse después de importar este módulo
+        return os.environ.get('EMAIL_USER'), os.environ.get('EMAIL_PASSWORD')
+
+    def _abrir_sesion(self):
+        usuario, password = self._credenciales()
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(usuario, password)
+        except Exception:
+            server.close()
+            raise
+        return _Sesion(server)
+
+    def _descartar(self, sesion):
+        with self._lock:
+            self._abiertas -= 1
+        sesion.cerrar()
+
+    def _sesion_sana(self, sesion):
+        if sesion.mensajes >= SMTP_MAX_MESSAGES_PER_SESSION:
+            return False
+        if time.time() - sesion.usada_en > SMTP_IDLE_CHECK:
+            try:
+                return sesion.server.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    def prestar(self):
+        """Entrega una sesión autenticada (reutilizada o nueva)."""
+        while True:
+            try:
+                sesion = self._libres.get_nowait()
+            except queue.Empty:
+                sesion = None
+
+            if sesion is not None:
+                if self._sesion_sana(sesion):
+                    return sesion
+                self._descartar(sesion)
+                continue
+
+            with self._lock:
+                puede_abrir = self._abiertas < self.size
+                if puede_abrir:
+                    self._abiertas += 1
+
+            if puede_abrir:
+                try:
+                    return self._abrir_sesion()
+                except Exception:
+                    with self._lock:
+                        self._abiertas -= 1
+                    raise
+
+            # Todas las sesiones están en uso: esperar a que se libere una
+            sesion = self._libres.get(timeout=self.timeout)
+            if self._sesion_sana(sesion):
+                return sesion
+            self._descartar(sesion)
+
+    def devolver(self, sesion, valida=True):
+        if not valida:
+            self._descartar(sesion)
+            return
+        sesion.usada_en = time.time()
+        self._libres.put(sesion)
+
+    def _enviar_con_sesion(self, sesion, msg, destinatarios):
+        remitente, _ = self._credenciales()
+        sesion.server.sendmail(remitente, destinatarios, msg.as_string())
+        sesion.mensajes += 1
+
+    def enviar(self, msg, destinatarios):
+        """
+        Envía un mensaje usando una sesión del pool.
+        Si la sesión se cayó, reconecta y reintenta una vez.
+        Lanza la excepción de smtplib si el envío falla.
+        """
+        for intento in range(2):
+            sesion = self.prestar()
+            try:
+                self._enviar_con_sesion(sesion, msg, destinatarios)
+            except Exception as e:
+                if not es_error_reconexion(e):
+                    # Error del mensaje (destinatario rechazado, etc.): la sesión sigue sirviendo
+                    self.devolver(sesion)
+                    raise
+                self.devolver(sesion, valida=False)
+                if intento == 0:
+                    continue
+                raise
+            self.devolver(sesion)
+            return
+
+    def enviar_lote(self, mensajes):
+        """
+        Envía muchos mensajes reutilizando una misma sesión.
+
+        Args:
+            mensajes: lista de tuplas (msg, destinatarios)
+
+        Returns:
+            Lista de (ok: bool, error: str|None) en el mismo orden
+        """
+        resultados = []
+        sesion = None
+
+        for msg, destinatarios in mensajes:
+            enviado = False
+            error = None
+
+            for intento in range(2):
+                try:
+                    if sesion is None:
+                        sesion = self.prestar()
+                    if sesion.mensajes >= SMTP_MAX_MESSAGES_PER_SESSION:
+                        self.devolver(sesion)
+                        sesion = self.prestar()
+                    self._enviar_con_sesion(sesion, msg, destinatarios)
+                    enviado = True
+                    break
+                except Exception as e:
+                    error = str(e)
+                    if not es_error_reconexion(e):
+                        break
+                    # Sesión caída: descartarla y reintentar con una nueva
+                    if sesion is not None:
+                        self.devolver(sesion, valida=False)
+                        sesion = None
+
+            resultados.append((enviado, None if enviado else error))
+
+        if sesion is not None:
+            self.devolver(sesion)
+
+        return resultados
+
+    def stats(self):
+        with self._lock:
+            abiertas = self._abiertas
+        return {'size': self.size, 'abiertas': abiertas, 'libres': self._libres.qsize()}
+
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Transporte SMTP del proceso actual (se recrea tras un fork)."""
+    global _transport, _transport_pid
+    pid = os.getpid()
+    if _transport is None or _transport_pid != pid:
+        with _transport_lock:
+            if _transport is None or _transport_pid != pid:
+                _transport = SMTPTransport()
+                _transport_pid = pid
+    return _transport
+
+
+def enviar_correo(msg, destinatarios):
+    """Envía un mensaje MIME ya construido a la lista de destinatarios."""
+    get_transport().enviar(msg, destinatarios)
+
+
+# ============================================================================
+# COLA DE ENVÍO EN SEGUNDO PLANO
+# ============================================================================
+
+_cola = None
+_cola_pid = None
+
+
+def _resolver(item):
+    """
+    Un item de la cola puede ser (msg, destinatarios) o una función que lo
+    construye en el hilo de envío (útil para diferir consultas y plantillas).
+    La función puede retornar None si no hay nada que enviar.
+    """
+    if callable(item):
+        return item()
+    return item
+
+
+def _worker_cola(cola):
+    transport = get_transport()
+    while True:
+        items = [cola.get()]
+        # Juntar lo que ya esté esperando para enviarlo por la misma sesión
+        while len(items) < SMTP_QUEUE_BATCH:
+            try:
+                items.append(cola.get_nowait())
+            except queue.Empty:
+                break
+
+        mensajes = []
+        for item in items:
+            try:
+                mensaje = _resolver(item)
+                if mensaje is not None:
+                    mensajes.append(mensaje)
+            except Exception as e:
+                print(f"❌ Error preparando correo en cola: {e}")
+
+        try:
+            if mensajes:
+                resultados = transport.enviar_lote(mensajes)
+                fallidos = [error for ok, error in resultados if not ok]
+                for error in fallidos:
+                    print(f"❌ Error enviando correo en cola: {error}")
+                print(f"📧 Cola SMTP: {len(mensajes) - len(fallidos)}/{len(mensajes)} correos enviados")
+        except Exception as e:
+            print(f"❌ Error en worker de cola SMTP: {e}")
+        finally:
+            for _ in items:
+                cola.task_done()
+
+
+def _get_cola():
+    global _cola, _cola_pid
+    pid = os.getpid()
+    if _cola is None or _cola_pid != pid:
+        with _transport_lock:
+            if _cola is None or _cola_pid != pid:
+                _cola = queue.Queue(maxsize=SMTP_QUEUE_SIZE)
+                _cola_pid = pid
+                for i in range(max(1, SMTP_QUEUE_WORKERS)):
+                    threading.Thread(
+                        target=_worker_cola, args=(_cola,), name=f"smtp-queue-{i}", daemon=True
+                    ).start()
+    return _cola
+
+
+def encolar_correo(item, timeout=None):
+    """
+    Encola un correo para envío en segundo plano.
+
+    Args:
+        item: (msg, destinatarios) o función sin argumentos que lo retorna
+        timeout: segundos a esperar si la cola está llena (None = no esperar)
+
+    Returns:
+        True si se encoló, False si la cola está llena
+    """
+    try:
+        if timeout is None:
+            _get_cola().put_nowait(item)
+        else:
+            _get_cola().put(item, timeout=timeout)
+        return True
+    except queue.Full:
+        print("⚠️ Cola SMTP llena: correo no encolado")
+        return False
+
+
+def estado_cola():
+    """Profundidad actual de la cola y estado del pool de sesiones (sin arrancar la cola)."""
+    cola = _cola if _cola_pid == os.getpid() else None
+    return {
+        'pendientes': cola.qsize() if cola is not None else 0,
+        'capacidad': SMTP_QUEUE_SIZE,
+        'pool': get_transport().stats()
+    }
@@ -3,42 +3,31 @@ from flask import Blueprint, request, jsonify
 try:
     # Importaciones del paquete app (para Render/producción)
     from app.db import get_db_connection
-    from app.Mailing.octopus import add_contact_to_octopus
-    from app.Mailing.send_lead_notification import send_lead_notification_email
-    from app.gemini.service import analizar_lead_automatico
-    from app.sync_service import enviar_lead_a_sistema_externo
+    from app.jobs_service import encolar_pipeline_lead, notificar_workers
+    from app.listados import responder_listado
+    from app.wix_stats import invalidar_wix_stats
+    from app.cache_respuestas import respuesta_condicional, marcar_cambio
 except ImportError:
     # Importaciones relativas (para desarrollo con run_app.py)
     from db import get_db_connection
-    from Mailing.octopus import add_contact_to_octopus
-    from Mailing.send_lead_notification import send_lead_notification_email
-    from gemini.service import analizar_lead_automatico
-    from sync_service import enviar_lead_a_sistema_externo
+    from jobs_service import encolar_pipeline_lead, notificar_workers
+    from listados import responder_listado
+    from wix_stats import invalidar_wix_stats
+    from cache_respuestas import respuesta_condicional, marcar_cambio
 
 wix_bp = Blueprint('wix_bp', __name__)
 TABLE_NAME = "WIX"  # Nombre exacto de la tabla en tu BD
 
 @wix_bp.route('/records', methods=['GET'])
+@respuesta_condicional(TABLE_NAME)
 def get_records():
     """
     GET /wix/records
-    Devuelve todos los registros de la tabla WIX.
+    Devuelve los registros de la tabla WIX.
+    Admite fields, limit, cursor y format (ver listados.py); sin parámetros
+    devuelve la tabla completa en streaming.
     """
-    cnx = get_db_connection()
-    if cnx is None:
-        return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
-
-    try:
-        cursor = cnx.cursor(dictionary=True)
-        query = f"SELECT * FROM `{TABLE_NAME}`;"
-        cursor.execute(query)
-        records = cursor.fetchall()
-        return jsonify({'status': 'success', 'records': records}), 200
-    except Exception as err:
-        return jsonify({'status': 'error', 'message': str(err)}), 500
-    finally:
-        cursor.close()
-        cnx.close()
+    return responder_listado(TABLE_NAME, 'id')
 
 @wix_bp.route('/records', methods=['POST'])
 def insert_record():
@@ -52,7 +41,8 @@ def insert_record():
       - ruc_dni
       - correo
       - treq_requerimiento
-    Luego, se envía el contacto a EmailOctopus.
+    Luego se encolan en segundo plano: EmailOctopus, notificación,
+    análisis Gemini y sincronización externa (estado en /jobs/record/{id}).
     
     La columna submission_time se asigna automáticamente con el timestamp actual.
     """
@@ -79,19 +69,7 @@ def insert_record():
 
     try:
         cursor = cnx.cursor()
-        
-        # Agregar columna origen si no existe
-        try:
-            add_origen_query = f"""
-                ALTER TABLE `{TABLE_NAME}` 
-                ADD COLUMN origen VARCHAR(50) DEFAULT 'UNKNOWN' AFTER treq_requerimiento;
-            """
-            cursor.execute(add_origen_query)
-            cnx.commit()
-        except Exception:
-            # La columna ya existe, continuar
-            pass
-        
+
         # Se agrega NOW() para que submission_time reciba la fecha y hora exacta
         insert_query = f"""
             INSERT INTO `{TABLE_NAME}` 
@@ -108,25 +86,22 @@ def insert_record():
             "WIX"  # Origen fijo para WIX
         )
         cursor.execute(insert_query, values)
-        cnx.commit()
 
-        # Obtener el ID del registro insertado para Gemini
+        # Obtener el ID del registro insertado
         record_id = cursor.lastrowid
 
-        # Llamada a la función para enviar el contacto a EmailOctopus
-        oct_response = add_contact_to_octopus(
-            email_address=data["correo"],
-            nombre_apellido=data["nombre_apellido"],
-            empresa=data["empresa"],
-            ruc_dni=data["ruc_dni"]
-        )
-        if oct_response.status_code not in [200, 201]:
-            print("Error al agregar el contacto a Octopus:", oct_response.text)
-
-        # NUEVA FUNCIONALIDAD: Enviar notificación de lead solo si es WIX
-        try:
-            # Preparar datos del lead para la notificación
-            lead_notification_data = {
+        # Encolar las tareas lentas en la misma transacción del INSERT.
+        # EmailOctopus, notificación, análisis Gemini y sincronización externa
+        # se procesan en segundo plano (ver jobs_service); la sincronización
+        # se encola automáticamente al terminar el análisis Gemini.
+        jobs = encolar_pipeline_lead(cursor, record_id, {
+            'octopus': {
+                'correo': data["correo"],
+                'nombre_apellido': data["nombre_apellido"],
+                'empresa': data["empresa"],
+                'ruc_dni': data["ruc_dni"]
+            },
+            'notificacion': {
                 'nombre_apellido': data["nombre_apellido"],
                 'empresa': data["empresa"],
                 'telefono2': data["telefono2"],
@@ -134,67 +109,26 @@ def insert_record():
                 'ruc_dni': data["ruc_dni"],
                 'treq_requerimiento': data["treq_requerimiento"],
                 'origen': "WIX",  # Siempre WIX para este endpoint
-                'submission_time': 'Recién registrado'  # Se podría mejorar con timestamp real
-            }
-            
-            # Enviar notificación (solo si origen=WIX, que es siempre true aquí)
-            notification_result, notification_status = send_lead_notification_email(lead_notification_data)
-            
-            if notification_result['status'] == 'ok':
-                print(f"✅ Notificación de lead WIX enviada: {notification_result['message']}")
-            elif notification_result['status'] == 'error':
-                print(f"❌ Error en notificación de lead: {notification_result['message']}")
-            # Si es 'skipped', no se imprime nada (aunque no debería pasar aquí)
-                
-        except Exception as notification_error:
-            # Error en notificación no debe afectar el flujo principal
-            print(f"⚠️ Error al enviar notificación de lead WIX: {notification_error}")
-
-        # ANÁLISIS AUTOMÁTICO CON GEMINI IA
-        gemini_result = None
-        try:
-            lead_data_gemini = {
+                'submission_time': 'Recién registrado'
+            },
+            'gemini': {
                 'empresa': data["empresa"],
                 'ruc_dni': data.get("ruc_dni"),
                 'treq_requerimiento': data.get("treq_requerimiento"),
                 'origen': "WIX"
             }
-
-            gemini_result = analizar_lead_automatico(lead_data_gemini, record_id)
-
-            if gemini_result.get('success'):
-                print(f"✅ Análisis Gemini completado para lead {record_id}: siek_cliente={gemini_result.get('siek_cliente')}")
-            else:
-                print(f"⚠️ Análisis Gemini sin resultados: {gemini_result.get('error', 'Sin datos suficientes')}")
-
-        except Exception as gemini_error:
-            # Error en Gemini no debe afectar el flujo principal
-            print(f"⚠️ Error en análisis Gemini (no crítico): {gemini_error}")
-
-        # ENVÍO A SISTEMA EXTERNO (SINCRONIZACIÓN)
-        sync_sent = False
-        if record_id:
-            try:
-                sync_result = enviar_lead_a_sistema_externo(record_id)
-
-                if sync_result.get('success'):
-                    sync_sent = True
-                    print(f"✅ Lead {record_id} enviado a sistema externo")
-                elif sync_result.get('skipped'):
-                    print(f"⏭️ Sincronización deshabilitada para lead {record_id}")
-                else:
-                    print(f"⚠️ Error al enviar lead {record_id} a sistema externo: {sync_result.get('message')}")
-
-            except Exception as sync_error:
-                # Error en sync no debe afectar el flujo principal
-                print(f"⚠️ Error en sincronización (no crítico): {sync_error}")
+        })
+        cnx.commit()
+        invalidar_wix_stats(cnx)
+        marcar_cambio(TABLE_NAME, cnx)
+        notificar_workers()
 
         return jsonify({
             'status': 'success',
             'message': 'Registro insertado correctamente.',
             'record_id': record_id,
-            'gemini_analyzed': gemini_result.get('success', False) if gemini_result else False,
-            'sync_sent': sync_sent
+            'jobs': jobs,
+            'jobs_status_url': f'/jobs/record/{record_id}'
         }), 201
     except Exception as err:
         return jsonify({'status': 'error', 'message': str(err)}), 500
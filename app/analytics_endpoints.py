@@ -0,0 +1,178 @@
+"""
+Analytics Endpoints - Metricas de encuestas desde el rollup diario
+
+- GET  /analytics/encuestas/resumen    - Totales del rango (tasa de respuesta, distribucion, NPS, CSAT, tiempo)
+- GET  /analytics/encuestas/desglose   - Mismas metricas por asesor, tipo, grupo o segmento (?por=)
+- GET  /analytics/encuestas/serie      - Serie temporal por dia, semana o mes (?intervalo=)
+- POST /analytics/encuestas/refrescar  - Pone al dia el rollup (?completo=true lo reconstruye)
+
+Parametros comunes: desde, hasta (YYYY-MM-DD, fecha de envio, inclusive;
+por defecto los ultimos 30 dias) y filtros exactos asesor, tipo, grupo,
+segmento ('' = sin valor).
+
+Las lecturas responden 503 mientras el rollup no se haya construido.
+"""
+
+from datetime import date, datetime, timedelta
+from functools import wraps
+from flask import Blueprint, jsonify, request
+
+try:
+    from app.analytics_service import (
+        consultar_analytics, refrescar_rollup, asegurar_rollup_vigente,
+        DIMENSIONES, INTERVALOS, TABLA_ROLLUP
+    )
+    from app.cache_respuestas import respuesta_condicional
+except ImportError:
+    from analytics_service import (
+        consultar_analytics, refrescar_rollup, asegurar_rollup_vigente,
+        DIMENSIONES, INTERVALOS, TABLA_ROLLUP
+    )
+    from cache_respuestas import respuesta_condicional
+
+
+analytics_bp = Blueprint('analytics_bp', __name__)
+
+# Dias por defecto cuando no se envia desde
+ANALYTICS_DIAS_DEFECTO = 30
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _parametros_comunes():
+    """(desde, hasta, filtros) de la query; ParametroInvalido si algo no es valido."""
+    try:
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if 'hasta' in request.args else date.today()
+        desde = (
+            datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if 'desde' in request.args
+            else hasta - timedelta(days=ANALYTICS_DIAS_DEFECTO - 1)
+        )
+    except ValueError:
+        raise ParametroInvalido('Fecha invalida. Formato esperado: YYYY-MM-DD')
+    if desde > hasta:
+        raise ParametroInvalido('desde no puede ser posterior a hasta')
+
+    filtros = {d: request.args[d] for d in DIMENSIONES if d in request.args}
+    return desde, hasta, filtros
+
+
+def _cabecera(desde, hasta, filtros):
+    return {
+        'status': 'success',
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'filtros': filtros,
+    }
+
+
+def _error_bd():
+    return jsonify({'status': 'error', 'message': 'Error consultando analytics'}), 500
+
+
+def _con_rollup_vigente(vista):
+    """
+    Refresca el rollup antes de calcular el ETag: el marcador es la marca del
+    rollup, asi un 304 nunca confirma un cuerpo anterior al ultimo refresco.
+    Si el rollup aun no se construyo responde 503 (las lecturas no lo reconstruyen).
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if not asegurar_rollup_vigente():
+            return jsonify({
+                'status': 'error',
+                'message': 'El rollup de analytics aun no esta construido. '
+                           'Ejecutar POST /analytics/encuestas/refrescar o python -m app.analytics_service --rebuild'
+            }), 503
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+@analytics_bp.route('/resumen', methods=['GET'])
+@_con_rollup_vigente
+@respuesta_condicional(TABLA_ROLLUP)
+def get_resumen():
+    """
+    GET /analytics/encuestas/resumen
+
+    Totales del rango: enviadas, respondidas, tasa_respuesta, distribucion 1-10,
+    promedio, nps, csat y tiempo_respuesta_promedio_h.
+    """
+    try:
+        desde, hasta, filtros = _parametros_comunes()
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    filas = consultar_analytics(desde, hasta, filtros)
+    if filas is None:
+        return _error_bd()
+    return jsonify({**_cabecera(desde, hasta, filtros), 'metricas': filas[0] if filas else None}), 200
+
+
+@analytics_bp.route('/desglose', methods=['GET'])
+@_con_rollup_vigente
+@respuesta_condicional(TABLA_ROLLUP)
+def get_desglose():
+    """
+    GET /analytics/encuestas/desglose?por=asesor|tipo|grupo|segmento
+
+    Una fila de metricas por valor de la dimension, ordenadas por enviadas.
+    """
+    por = request.args.get('por', 'asesor')
+    if por not in DIMENSIONES:
+        return jsonify({
+            'status': 'error',
+            'message': f'por invalido: {por}. Valores: {", ".join(DIMENSIONES)}'
+        }), 400
+    try:
+        desde, hasta, filtros = _parametros_comunes()
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    filas = consultar_analytics(desde, hasta, filtros, por=por)
+    if filas is None:
+        return _error_bd()
+    return jsonify({**_cabecera(desde, hasta, filtros), 'por': por, 'grupos': filas}), 200
+
+
+@analytics_bp.route('/serie', methods=['GET'])
+@_con_rollup_vigente
+@respuesta_condicional(TABLA_ROLLUP)
+def get_serie():
+    """
+    GET /analytics/encuestas/serie?intervalo=dia|semana|mes
+
+    Metricas por periodo (semana = lunes de inicio, mes = dia 1).
+    """
+    intervalo = request.args.get('intervalo', 'dia')
+    if intervalo not in INTERVALOS:
+        return jsonify({
+            'status': 'error',
+            'message': f'intervalo invalido: {intervalo}. Valores: {", ".join(INTERVALOS)}'
+        }), 400
+    try:
+        desde, hasta, filtros = _parametros_comunes()
+    except ParametroInvalido as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    filas = consultar_analytics(desde, hasta, filtros, intervalo=intervalo)
+    if filas is None:
+        return _error_bd()
+    return jsonify({**_cabecera(desde, hasta, filtros), 'intervalo': intervalo, 'serie': filas}), 200
+
+
+@analytics_bp.route('/refrescar', methods=['POST'])
+def post_refrescar():
+    """
+    POST /analytics/encuestas/refrescar
+
+    Recalcula los dias tocados desde el ultimo refresco; con ?completo=true
+    reconstruye el rollup entero.
+    """
+    completo = request.args.get('completo', 'false').lower() == 'true'
+    resultado = refrescar_rollup(completo=completo)
+    if not resultado['success']:
+        return jsonify({'status': 'error', 'message': resultado['error']}), 500
+    resultado.pop('success')
+    return jsonify({'status': 'success', **resultado}), 200
@@ -0,0 +1,336 @@
+"""
+Analytics de encuestas - rollup diario mantenido de forma incremental
+
+/analytics/encuestas no recorre envio_de_encuestas: lee
+encuestas_rollup_diario (migracion 14), una fila por
+(dia de envio, asesor, tipo, grupo, segmento) con enviadas, respondidas,
+distribucion de calificaciones 1-10 y suma de tiempos de respuesta. De ahi
+salen tasa de respuesta, promedio, NPS, CSAT y tiempo de respuesta para
+cualquier rango de fechas y desglose.
+
+Mantenimiento incremental:
+    - analytics_estado guarda la marca (NOW() del ultimo refresco)
+    - los dias con filas tocadas desde la marca (actualizado_en, migracion 13)
+      se recalculan enteros con DELETE + INSERT ... SELECT por rango de fechas
+    - se relee un solape de ANALYTICS_SOLAPE_S para no perder transacciones
+      que confirmaron tarde; recalcular un dia dos veces es inocuo
+    - GET_LOCK evita que dos workers refresquen a la vez
+Las lecturas refrescan como maximo cada ANALYTICS_MAX_AGE segundos y solo
+de forma incremental: mientras no haya marca (rollup sin construir) responden
+503 hasta que corra la reconstruccion (--rebuild o POST /refrescar).
+Los borrados de encuestas no dejan rastro en actualizado_en: se corrigen
+con la reconstruccion completa.
+
+Escala 1-10 (la de /encuesta):
+    - NPS: promotores 9-10, pasivos 7-8, detractores 1-6
+    - CSAT: porcentaje de 8-10 ("Satisfecho")
+Calificaciones antiguas no numericas cuentan como respondidas pero no
+entran en la distribucion.
+
+Reconstruccion:
+    python -m app.analytics_service --rebuild
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from app.db import get_db_connection
+    from app.cache_respuestas import marcar_cambio
+except ImportError:
+    from db import get_db_connection
+    from cache_respuestas import marcar_cambio
+
+
+ANALYTICS_MAX_AGE = int(os.getenv("ANALYTICS_MAX_AGE", "60"))
+ANALYTICS_SOLAPE_S = int(os.getenv("ANALYTICS_SOLAPE_S", "300"))
+
+TABLA_ENCUESTAS = "envio_de_encuestas"
+TABLA_ROLLUP = "encuestas_rollup_diario"
+CLAVE_ESTADO = "encuestas_rollup"
+NOMBRE_LOCK = "analytics_encuestas_rollup"
+
+DIMENSIONES = ("asesor", "tipo", "grupo", "segmento")
+# Largo de cada dimension en el rollup (ver migracion 14)
+LARGO_DIMENSION = {"asesor": 150, "tipo": 50, "grupo": 150, "segmento": 150}
+INTERVALOS = {
+    "dia": "dia",
+    "semana": "DATE_SUB(dia, INTERVAL WEEKDAY(dia) DAY)",
+    "mes": "DATE_FORMAT(dia, '%%Y-%%m-01')",
+}
+ESCALA = range(1, 11)
+
+_RESPONDIDA = "(calificacion IS NOT NULL AND TRIM(calificacion) <> '')"
+
+_SQL_RECALCULO = f"""
+    INSERT INTO {TABLA_ROLLUP} (
+        dia, {", ".join(DIMENSIONES)}, enviadas, respondidas,
+        {", ".join(f"c{i}" for i in ESCALA)}, con_tiempo, suma_respuesta_s
+    )
+    SELECT
+        DATE(timestamp) AS dia,
+        {", ".join(f"LEFT(COALESCE({d}, ''), {LARGO_DIMENSION[d]})" for d in DIMENSIONES)},
+        COUNT(*),
+        SUM({_RESPONDIDA}),
+        {", ".join(f"SUM(TRIM(calificacion) = '{i}')" for i in ESCALA)},
+        SUM({_RESPONDIDA} AND fecha_califacion >= timestamp),
+        COALESCE(SUM(CASE WHEN {_RESPONDIDA} AND fecha_califacion >= timestamp
+                          THEN TIMESTAMPDIFF(SECOND, timestamp, fecha_califacion) END), 0)
+    FROM {TABLA_ENCUESTAS}
+    WHERE timestamp >= %s AND timestamp < %s
+    GROUP BY 1, 2, 3, 4, 5
+    ON DUPLICATE KEY UPDATE
+        {", ".join(f"{c} = {c} + VALUES({c})" for c in
+                   ["enviadas", "respondidas", *(f"c{i}" for i in ESCALA), "con_tiempo", "suma_respuesta_s"])}
+"""
+# El ON DUPLICATE KEY solo actua si dos grupos coinciden bajo la collation del
+# rollup (p.ej. valores recortados a LARGO_DIMENSION): se suman en vez de fallar.
+
+# construido: None = aun no se sabe si el rollup tiene marca
+_memoria: Dict[str, Any] = {"refrescado": 0.0, "construido": None}
+_refresco_lock = threading.Lock()
+
+
+def _rangos_contiguos(dias: List[date]) -> List[Tuple[date, date]]:
+    """[d1, d2, d3, d7] -> [(d1, d4), (d7, d8)] (fin exclusivo)."""
+    rangos: List[Tuple[date, date]] = []
+    for dia in sorted(set(dias)):
+        if rangos and rangos[-1][1] == dia:
+            rangos[-1] = (rangos[-1][0], dia + timedelta(days=1))
+        else:
+            rangos.append((dia, dia + timedelta(days=1)))
+    return rangos
+
+
+def _rangos_mensuales(desde: date, hasta: date) -> List[Tuple[date, date]]:
+    rangos = []
+    inicio = desde
+    while inicio < hasta:
+        siguiente = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+        rangos.append((inicio, min(siguiente, hasta)))
+        inicio = siguiente
+    return rangos
+
+
+def _recalcular(cnx, cursor, rangos: List[Tuple[date, date]]) -> None:
+    """Recalcula los dias de cada rango; un commit por rango."""
+    for inicio, fin in rangos:
+        cursor.execute(f"DELETE FROM {TABLA_ROLLUP} WHERE dia >= %s AND dia < %s", (inicio, fin))
+        cursor.execute(_SQL_RECALCULO, (inicio, fin))
+        cnx.commit()
+
+
+def _leer_marca(cursor) -> Optional[datetime]:
+    cursor.execute("SELECT marca FROM analytics_estado WHERE nombre = %s", (CLAVE_ESTADO,))
+    fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def refrescar_rollup(completo: bool = False, construir: bool = True) -> Dict[str, Any]:
+    """
+    Pone al dia el rollup. Sin marca previa (o con completo=True) lo
+    reconstruye mes a mes; si no, recalcula solo los dias tocados.
+    Con construir=False (lecturas) nunca reconstruye: sin marca retorna
+    modo "sin_construir".
+
+    Returns:
+        Dict con success, modo y dias/rangos recalculados
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        return {"success": False, "error": "No se pudo conectar a la base de datos"}
+
+    try:
+        cursor = cnx.cursor()
+        if not construir and not completo and _leer_marca(cursor) is None:
+            cnx.rollback()
+            _memoria["construido"] = False
+            return {"success": True, "modo": "sin_construir"}
+
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (NOMBRE_LOCK,))
+        if not cursor.fetchone()[0]:
+            return {"success": True, "modo": "en_curso"}
+
+        try:
+            cursor.execute("SELECT NOW()")
+            nueva_marca = cursor.fetchone()[0]
+            marca = _leer_marca(cursor)
+
+            if completo or marca is None:
+                cursor.execute(f"SELECT MIN(timestamp) FROM {TABLA_ENCUESTAS}")
+                primera = cursor.fetchone()[0]
+                fin = nueva_marca.date() + timedelta(days=1)
+                # Cada mes se reemplaza en su propia transaccion; lo que quede fuera se descarta
+                rangos = _rangos_mensuales(primera.date(), fin) if primera else []
+                cursor.execute(
+                    f"DELETE FROM {TABLA_ROLLUP} WHERE dia < %s OR dia >= %s",
+                    (primera.date() if primera else fin, fin)
+                )
+                modo = "completo"
+            else:
+                cursor.execute(
+                    f"SELECT DISTINCT DATE(timestamp) FROM {TABLA_ENCUESTAS} WHERE actualizado_en >= %s",
+                    (marca - timedelta(seconds=ANALYTICS_SOLAPE_S),)
+                )
+                rangos = _rangos_contiguos([f[0] for f in cursor.fetchall() if f[0] is not None])
+                modo = "incremental"
+
+            _recalcular(cnx, cursor, rangos)
+            cursor.execute("""
+                INSERT INTO analytics_estado (nombre, marca, actualizado_en) VALUES (%s, %s, NOW())
+                ON DUPLICATE KEY UPDATE marca = VALUES(marca), actualizado_en = VALUES(actualizado_en)
+            """, (CLAVE_ESTADO, nueva_marca))
+            cnx.commit()
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (NOMBRE_LOCK,))
+            cursor.fetchone()
+
+        _memoria["refrescado"] = time.time()
+        _memoria["construido"] = True
+        # Las respuestas de /analytics/encuestas se condicionan con la marca
+        marcar_cambio(TABLA_ROLLUP)
+        dias = sum((fin - inicio).days for inicio, fin in rangos)
+        if dias:
+            print(f"[Analytics] Rollup {modo}: {dias} dias en {len(rangos)} rangos")
+        return {"success": True, "modo": modo, "dias": dias, "rangos": len(rangos)}
+    except Exception as e:
+        print(f"[Analytics] Error refrescando el rollup: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        cnx.close()
+
+
+def asegurar_rollup_vigente() -> bool:
+    """
+    Refresca (solo incremental) el rollup si el de este proceso tiene mas de
+    ANALYTICS_MAX_AGE segundos. Retorna False si el rollup aun no se construyo.
+    """
+    if time.time() - _memoria["refrescado"] >= ANALYTICS_MAX_AGE:
+        # Un solo refresco por proceso; el resto lee el rollup tal como esta,
+        # salvo la primera vez, cuando aun no se sabe si existe
+        if _refresco_lock.acquire(blocking=_memoria["construido"] is None):
+            try:
+                refrescar_rollup(construir=False)
+            finally:
+                _refresco_lock.release()
+    return _memoria["construido"] is not False
+
+
+def _metricas(fila: Dict[str, Any]) -> Dict[str, Any]:
+    distribucion = {str(i): int(fila[f"c{i}"] or 0) for i in ESCALA}
+    calificadas = sum(distribucion.values())
+    enviadas = int(fila["enviadas"] or 0)
+    respondidas = int(fila["respondidas"] or 0)
+    con_tiempo = int(fila["con_tiempo"] or 0)
+
+    promotores = distribucion["9"] + distribucion["10"]
+    pasivos = distribucion["7"] + distribucion["8"]
+    detractores = calificadas - promotores - pasivos
+    satisfechos = distribucion["8"] + distribucion["9"] + distribucion["10"]
+    suma = sum(i * distribucion[str(i)] for i in ESCALA)
+
+    return {
+        "enviadas": enviadas,
+        "respondidas": respondidas,
+        "tasa_respuesta": round(respondidas / enviadas, 4) if enviadas else None,
+        "calificadas": calificadas,
+        "distribucion": distribucion,
+        "promedio": round(suma / calificadas, 2) if calificadas else None,
+        "nps": {
+            "promotores": promotores,
+            "pasivos": pasivos,
+            "detractores": detractores,
+            "valor": round((promotores - detractores) * 100 / calificadas, 1) if calificadas else None,
+        },
+        "csat": round(satisfechos * 100 / calificadas, 1) if calificadas else None,
+        "tiempo_respuesta_promedio_h": (
+            round(int(fila["suma_respuesta_s"] or 0) / con_tiempo / 3600, 2) if con_tiempo else None
+        ),
+    }
+
+
+def consultar_analytics(
+    desde: date,
+    hasta: date,
+    filtros: Optional[Dict[str, str]] = None,
+    por: Optional[str] = None,
+    intervalo: Optional[str] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Metricas del rollup entre `desde` y `hasta` (inclusive, por fecha de envio).
+
+    Args:
+        filtros: dimension -> valor exacto ('' = sin valor)
+        por: dimension para desglosar (una fila por valor)
+        intervalo: 'dia', 'semana' o 'mes' para una serie temporal
+
+    Returns:
+        Lista de dicts con las metricas (y la clave `por`/`periodo`), None si falla la BD
+    """
+    condiciones = ["dia >= %s", "dia <= %s"]
+    params: List[Any] = [desde, hasta]
+    for dimension, valor in (filtros or {}).items():
+        condiciones.append(f"{dimension} = %s")
+        params.append(valor)
+
+    grupo = None
+    if por:
+        grupo = por
+    elif intervalo:
+        grupo = INTERVALOS[intervalo]
+
+    sumas = ", ".join(
+        f"SUM({c}) AS {c}" for c in
+        ["enviadas", "respondidas", *(f"c{i}" for i in ESCALA), "con_tiempo", "suma_respuesta_s"]
+    )
+    query = f"SELECT {grupo + ' AS clave, ' if grupo else ''}{sumas} FROM {TABLA_ROLLUP} WHERE {' AND '.join(condiciones)}"
+    if grupo:
+        query += f" GROUP BY clave ORDER BY {'clave' if intervalo else 'enviadas DESC'}"
+
+    cnx = get_db_connection()
+    if cnx is None:
+        return None
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(query, params)
+        filas = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        print(f"[Analytics] Error consultando el rollup: {e}")
+        return None
+    finally:
+        cnx.close()
+
+    resultado = []
+    for fila in filas:
+        metricas = _metricas(fila)
+        if por:
+            metricas = {por: fila["clave"], **metricas}
+        elif intervalo:
+            clave = fila["clave"]
+            metricas = {"periodo": clave.isoformat() if hasattr(clave, "isoformat") else str(clave), **metricas}
+        resultado.append(metricas)
+    return resultado
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rollup diario de envio_de_encuestas")
+    parser.add_argument("--rebuild", action="store_true", help="Reconstruye todo el rollup")
+    args = parser.parse_args(argv)
+
+    inicio = datetime.now()
+    resultado = refrescar_rollup(completo=args.rebuild)
+    if not resultado["success"]:
+        print(f"[Analytics] ERROR: {resultado['error']}")
+        return 1
+    print(f"[Analytics] {resultado} en {(datetime.now() - inicio).total_seconds():.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
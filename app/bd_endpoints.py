@@ -3,42 +3,31 @@ from flask import Blueprint, request, jsonify
 try:
     # Importaciones del paquete app (para Render/producción)
     from app.db import get_db_connection
-    from app.Mailing.octopus import add_contact_to_octopus
-    from app.Mailing.send_lead_notification import send_lead_notification_email
-    from app.gemini.service import analizar_lead_automatico
-    from app.sync_service import enviar_lead_a_sistema_externo
+    from app.jobs_service import encolar_pipeline_lead, notificar_workers
+    from app.listados import responder_listado
+    from app.wix_stats import invalidar_wix_stats
+    from app.cache_respuestas import respuesta_condicional, marcar_cambio
 except ImportError:
     # Importaciones relativas (para desarrollo con run_app.py)
     from db import get_db_connection
-    from Mailing.octopus import add_contact_to_octopus
-    from Mailing.send_lead_notification import send_lead_notification_email
-    from gemini.service import analizar_lead_automatico
-    from sync_service import enviar_lead_a_sistema_externo
+    from jobs_service import encolar_pipeline_lead, notificar_workers
+    from listados import responder_listado
+    from wix_stats import invalidar_wix_stats
+    from cache_respuestas import respuesta_condicional, marcar_cambio
 
 bd_bp = Blueprint('bd_bp', __name__)
 TABLE_NAME = "WIX"  # Nombre exacto de la tabla en tu BD
 
 @bd_bp.route('/records', methods=['GET'])
+@respuesta_condicional(TABLE_NAME)
 def get_bd_records():
     """
     GET /bd/records
-    Devuelve todos los registros de la tabla WIX.
+    Devuelve los registros de la tabla WIX.
+    Admite fields, limit, cursor y format (ver listados.py); sin parámetros
+    devuelve la tabla completa en streaming.
     """
-    cnx = get_db_connection()
-    if cnx is None:
-        return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
-
-    try:
-        cursor = cnx.cursor(dictionary=True)
-        query = f"SELECT * FROM `{TABLE_NAME}`;"
-        cursor.execute(query)
-        records = cursor.fetchall()
-        return jsonify({'status': 'success', 'records': records}), 200
-    except Exception as err:
-        return jsonify({'status': 'error', 'message': str(err)}), 500
-    finally:
-        cursor.close()
-        cnx.close()
+    return responder_listado(TABLE_NAME, 'id')
 
 @bd_bp.route('/records', methods=['POST'])
 def insert_bd_record():
@@ -62,8 +51,10 @@ def insert_bd_record():
 
     FUNCIONALIDADES:
     1. Inserta en BD con todos los campos
-    2. Envía automáticamente a EmailOctopus
-    3. Envía notificación SOLO si treq_requerimiento tiene contenido
+    2. Encola en segundo plano (estado en /jobs/record/{id}):
+       - Envío a EmailOctopus
+       - Notificación SOLO si treq_requerimiento tiene contenido
+       - Análisis Gemini y luego sincronización con sistema externo
     """
     data = request.get_json()
     if not data:
@@ -96,18 +87,6 @@ def insert_bd_record():
 
     try:
         cursor = cnx.cursor()
-        
-        # Agregar columna origen si no existe
-        try:
-            add_origen_query = f"""
-                ALTER TABLE `{TABLE_NAME}` 
-                ADD COLUMN origen VARCHAR(50) DEFAULT 'UNKNOWN' AFTER treq_requerimiento;
-            """
-            cursor.execute(add_origen_query)
-            cnx.commit()
-        except Exception:
-            # La columna ya existe, continuar
-            pass
 
         # Insertar el registro con todos los campos (incluyendo opcionales)
         if submission_time_custom:
@@ -148,101 +127,55 @@ def insert_bd_record():
                 asesor_tecnico
             )
         cursor.execute(insert_query, values)
-        cnx.commit()
-        
+
         # Obtener el ID del registro insertado
         record_id = cursor.lastrowid
 
-        # NUEVA FUNCIONALIDAD: Enviar a EmailOctopus
-        try:
-            oct_response = add_contact_to_octopus(
-                email_address=data["correo"],
-                nombre_apellido=data["nombre_apellido"],
-                empresa=data["empresa"],
-                ruc_dni=ruc_dni or ""  # Enviar string vacío si es None
-            )
-            if oct_response.status_code not in [200, 201]:
-                print("Error al agregar el contacto a Octopus:", oct_response.text)
-        except Exception as octopus_error:
-            print(f"⚠️ Error al enviar a EmailOctopus: {octopus_error}")
-
-        # NUEVA FUNCIONALIDAD: Notificación condicional
-        notification_sent = False
-        if treq_requerimiento and treq_requerimiento.strip():  # Solo si tiene contenido
-            try:
-                # Preparar datos del lead para la notificación
-                lead_notification_data = {
-                    'nombre_apellido': data["nombre_apellido"],
-                    'empresa': data["empresa"],
-                    'telefono2': data["telefono2"],
-                    'correo': data["correo"],
-                    'ruc_dni': ruc_dni or "",
-                    'treq_requerimiento': treq_requerimiento,
-                    'origen': origen,
-                    'submission_time': submission_time_custom or 'Recién registrado'
-                }
-
-                # Enviar notificación
-                notification_result, notification_status = send_lead_notification_email(lead_notification_data)
-
-                if notification_result['status'] == 'ok':
-                    print(f"✅ Notificación de lead enviada: {notification_result['message']}")
-                    notification_sent = True
-                elif notification_result['status'] == 'error':
-                    print(f"❌ Error en notificación de lead: {notification_result['message']}")
-
-            except Exception as notification_error:
-                print(f"⚠️ Error al enviar notificación de lead: {notification_error}")
-
-        # ANÁLISIS AUTOMÁTICO CON GEMINI IA
-        gemini_result = None
-        gemini_analyzed = False
-        try:
-            lead_data_gemini = {
+        # Encolar las tareas lentas en la misma transacción del INSERT
+        # (se procesan en segundo plano, ver jobs_service)
+        etapas = {
+            'octopus': {
+                'correo': data["correo"],
+                'nombre_apellido': data["nombre_apellido"],
+                'empresa': data["empresa"],
+                'ruc_dni': ruc_dni or ""  # Enviar string vacío si es None
+            },
+            'gemini': {
                 'empresa': data["empresa"],
                 'ruc_dni': ruc_dni,
                 'treq_requerimiento': treq_requerimiento,
                 'origen': origen
             }
+        }
 
-            gemini_result = analizar_lead_automatico(lead_data_gemini, record_id)
-
-            if gemini_result.get('success'):
-                gemini_analyzed = True
-                print(f"✅ Análisis Gemini completado para lead {record_id}: siek_cliente={gemini_result.get('siek_cliente')}")
-            else:
-                print(f"⚠️ Análisis Gemini sin resultados: {gemini_result.get('error', 'Sin datos suficientes')}")
-
-        except Exception as gemini_error:
-            # Error en Gemini no debe afectar el flujo principal
-            print(f"⚠️ Error en análisis Gemini (no crítico): {gemini_error}")
-
-        # ENVÍO A SISTEMA EXTERNO (SINCRONIZACIÓN)
-        sync_sent = False
-        if record_id:
-            try:
-                sync_result = enviar_lead_a_sistema_externo(record_id)
-
-                if sync_result.get('success'):
-                    sync_sent = True
-                    print(f"✅ Lead {record_id} enviado a sistema externo")
-                elif sync_result.get('skipped'):
-                    print(f"⏭️ Sincronización deshabilitada para lead {record_id}")
-                else:
-                    print(f"⚠️ Error al enviar lead {record_id} a sistema externo: {sync_result.get('message')}")
+        # Notificación condicional: solo si el requerimiento tiene contenido
+        notification_queued = bool(treq_requerimiento and treq_requerimiento.strip())
+        if notification_queued:
+            etapas['notificacion'] = {
+                'nombre_apellido': data["nombre_apellido"],
+                'empresa': data["empresa"],
+                'telefono2': data["telefono2"],
+                'correo': data["correo"],
+                'ruc_dni': ruc_dni or "",
+                'treq_requerimiento': treq_requerimiento,
+                'origen': origen,
+                'submission_time': submission_time_custom or 'Recién registrado'
+            }
 
-            except Exception as sync_error:
-                # Error en sync no debe afectar el flujo principal
-                print(f"⚠️ Error en sincronización (no crítico): {sync_error}")
+        jobs = encolar_pipeline_lead(cursor, record_id, etapas)
+        cnx.commit()
+        invalidar_wix_stats(cnx)
+        marcar_cambio(TABLE_NAME, cnx)
+        notificar_workers()
 
         return jsonify({
             'status': 'success',
             'message': 'Registro insertado correctamente en BD.',
             'record_id': record_id,
             'origen': origen,
-            'notification_sent': notification_sent,
-            'gemini_analyzed': gemini_analyzed,
-            'sync_sent': sync_sent
+            'notification_queued': notification_queued,
+            'jobs': jobs,
+            'jobs_status_url': f'/jobs/record/{record_id}'
         }), 201
     except Exception as err:
         return jsonify({'status': 'error', 'message': str(err)}), 500
@@ -0,0 +1,344 @@
+"""
+Buffer de calificaciones (write-behind) para /encuesta
+
+Tras un envio masivo cientos de clientes pulsan la calificacion en el mismo
+minuto y cada clic abre una conexion MySQL y hace commit. Con
+ENCUESTA_BUFFER_ENABLED=true el clic se valida, se anota en un SQLite local
+en modo WAL y se redirige al instante. Un hilo por proceso (flusher) aplica
+los clics pendientes a envio_de_encuestas en lotes:
+    - una transaccion por lote: SELECT ... FOR UPDATE + un UPDATE con CASE
+    - first-write-wins: el primer clic de cada encuesta gana; los siguientes
+      del lote quedan como 'duplicado' y las ya calificadas en MySQL como
+      'ya_respondida', igual que el UPDATE condicional del modo directo
+    - re-aplicar un lote es inocuo: una encuesta que ya tiene la calificacion
+      y la fecha del propio clic cuenta como 'aplicado', asi un corte entre
+      el commit en MySQL y la marca en SQLite no pierde el correo de
+      lamentamos, y solo quien marca el clic en SQLite lo dispara
+Los clics aplicados se conservan ENCUESTA_BUFFER_RETENCION_HORAS para
+detectar dobles clics sin ir a MySQL.
+
+Antes de anotar un clic, estado_encuesta() consulta la encuesta por clave
+primaria (sin commit ni bloqueos): una inexistente responde 404 y una ya
+calificada va a "ya respondida", igual que el modo directo. Esos dos estados
+se cachean ENCUESTA_BUFFER_VALIDACION_TTL segundos en el proceso.
+
+El archivo SQLite es local a la instancia: si hay varias, cada una aplica
+sus propios clics. Los workers de una misma instancia comparten el archivo y
+pueden aplicar el mismo lote a la vez sin efecto doble. Diferencia con el
+modo directo: si dos instancias reciben a la vez el primer clic de una misma
+encuesta, ambas muestran la pagina de la calificacion y el flush solo aplica
+uno (el otro queda 'ya_respondida').
+
+Estado: GET /health/buffer_encuestas (pendientes y lag del flush)
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from app.db import get_db_connection
+    from app.cache_respuestas import marcar_cambio
+except ImportError:
+    from db import get_db_connection
+    from cache_respuestas import marcar_cambio
+
+
+ENCUESTA_BUFFER_ENABLED = os.environ.get('ENCUESTA_BUFFER_ENABLED', 'false').lower() == 'true'
+ENCUESTA_BUFFER_PATH = os.environ.get(
+    'ENCUESTA_BUFFER_PATH', os.path.join(os.path.dirname(__file__), 'calificaciones_buffer.db')
+)
+# Clics por transaccion MySQL y segundos entre flush cuando no hay lote completo
+ENCUESTA_BUFFER_LOTE = int(os.environ.get('ENCUESTA_BUFFER_LOTE', 200))
+ENCUESTA_BUFFER_INTERVALO = float(os.environ.get('ENCUESTA_BUFFER_INTERVALO', 1))
+ENCUESTA_BUFFER_RETENCION_HORAS = float(os.environ.get('ENCUESTA_BUFFER_RETENCION_HORAS', 72))
+# Segundos que se recuerda que una encuesta no existe o ya esta calificada
+ENCUESTA_BUFFER_VALIDACION_TTL = float(os.environ.get('ENCUESTA_BUFFER_VALIDACION_TTL', 300))
+_VALIDACIONES_MAX = 10000
+
+TABLA_ENCUESTAS = "envio_de_encuestas"
+
+_ESQUEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS clicks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        unique_id TEXT NOT NULL,
+        calificacion INTEGER NOT NULL,
+        tipo TEXT,
+        recibido_en REAL NOT NULL,
+        aplicado_en REAL,
+        resultado TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_clicks_pendientes ON clicks (id) WHERE aplicado_en IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_clicks_unique ON clicks (unique_id)",
+]
+
+_local = threading.local()
+_estado: Dict[str, Any] = {"ultimo_flush": None, "ultimo_error": None, "lotes": 0, "errores": 0}
+_lock = threading.Lock()
+_hilo: Optional[threading.Thread] = None
+_hilo_pid: Optional[int] = None
+# unique_id -> (estado, leido_en); solo 'no_existe' y 'respondida'
+_validadas: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+
+def _conexion() -> sqlite3.Connection:
+    """Conexion SQLite del hilo actual (se reabre tras un fork)."""
+    cnx = getattr(_local, "cnx", None)
+    if cnx is None or getattr(_local, "pid", None) != os.getpid():
+        cnx = sqlite3.connect(ENCUESTA_BUFFER_PATH, timeout=10)
+        # WAL: escrituras de las peticiones y lecturas del flusher sin bloquearse.
+        # synchronous=NORMAL sobrevive a la caida del proceso (no a un corte de energia).
+        cnx.execute("PRAGMA journal_mode=WAL")
+        cnx.execute("PRAGMA synchronous=NORMAL")
+        for sentencia in _ESQUEMA:
+            cnx.execute(sentencia)
+        cnx.commit()
+        _local.cnx, _local.pid = cnx, os.getpid()
+    return cnx
+
+
+def estado_encuesta(unique_id: str) -> Optional[str]:
+    """
+    'pendiente', 'respondida' o 'no_existe' segun MySQL; None si no se pudo
+    consultar (la peticion debe seguir por el modo directo).
+    """
+    ahora = time.time()
+    with _lock:
+        guardado = _validadas.get(unique_id)
+    if guardado and ahora - guardado[1] < ENCUESTA_BUFFER_VALIDACION_TTL:
+        return guardado[0]
+
+    cnx = get_db_connection()
+    if cnx is None:
+        return None
+    try:
+        cursor = cnx.cursor()
+        cursor.execute(f"SELECT calificacion FROM {TABLA_ENCUESTAS} WHERE idcalificacion = %s", (unique_id,))
+        fila = cursor.fetchone()
+        cursor.close()
+    except Exception as e:
+        print(f"[BufferCalificaciones] No se pudo validar la encuesta {unique_id}: {e}")
+        return None
+    finally:
+        cnx.close()
+
+    if fila is None:
+        estado = "no_existe"
+    elif fila[0] is not None and str(fila[0]).strip():
+        estado = "respondida"
+    else:
+        # Una pendiente no se cachea: su primer clic la cambia
+        return "pendiente"
+
+    with _lock:
+        _validadas[unique_id] = (estado, ahora)
+        _validadas.move_to_end(unique_id)
+        while len(_validadas) > _VALIDACIONES_MAX:
+            _validadas.popitem(last=False)
+    return estado
+
+
+def registrar_click(unique_id: str, calificacion: int, tipo: Optional[str]) -> Optional[bool]:
+    """
+    Anota un clic en el buffer.
+
+    Returns:
+        True si quedo anotado, False si esa encuesta ya tiene un clic en el
+        buffer (doble clic), None si el buffer no esta disponible (la peticion
+        debe seguir por el modo directo)
+    """
+    try:
+        cnx = _conexion()
+        if cnx.execute("SELECT 1 FROM clicks WHERE unique_id = ? LIMIT 1", (unique_id,)).fetchone():
+            return False
+        with cnx:
+            cnx.execute(
+                "INSERT INTO clicks (unique_id, calificacion, tipo, recibido_en) VALUES (?, ?, ?, ?)",
+                (unique_id, calificacion, tipo, time.time())
+            )
+        return True
+    except sqlite3.Error as e:
+        print(f"[BufferCalificaciones] No se pudo anotar el clic de {unique_id}: {e}")
+        return None
+
+
+def _aplicar_en_mysql(clicks: List[tuple]) -> Dict[int, str]:
+    """Aplica el primer clic de cada encuesta en una transaccion. Retorna id_click -> resultado."""
+    primeros: Dict[str, tuple] = {}
+    resultados: Dict[int, str] = {}
+    for click in clicks:
+        if click[1] in primeros:
+            resultados[click[0]] = "duplicado"
+        else:
+            primeros[click[1]] = click
+
+    cnx = get_db_connection()
+    if cnx is None:
+        raise RuntimeError("sin conexion a la base de datos")
+    try:
+        cursor = cnx.cursor()
+        marcadores = ", ".join(["%s"] * len(primeros))
+        cursor.execute(
+            f"SELECT idcalificacion, calificacion, UNIX_TIMESTAMP(fecha_califacion) FROM {TABLA_ENCUESTAS} "
+            f"WHERE idcalificacion IN ({marcadores}) FOR UPDATE",
+            list(primeros)
+        )
+        actuales = {str(fila[0]): (fila[1], fila[2]) for fila in cursor.fetchall()}
+
+        aplicar = []
+        for unique_id, click in primeros.items():
+            if unique_id not in actuales:
+                resultados[click[0]] = "no_existe"
+                continue
+            calificacion, fecha = actuales[unique_id]
+            if calificacion is None or not str(calificacion).strip():
+                resultados[click[0]] = "aplicado"
+                aplicar.append(click)
+            elif str(calificacion).strip() == str(click[2]) and fecha is not None \
+                    and int(fecha) == int(click[4]):
+                # El propio clic ya se aplico (corte antes de marcarlo en SQLite)
+                resultados[click[0]] = "aplicado"
+            else:
+                resultados[click[0]] = "ya_respondida"
+
+        if aplicar:
+            casos_calificacion = " ".join(["WHEN %s THEN %s"] * len(aplicar))
+            casos_fecha = " ".join(["WHEN %s THEN FROM_UNIXTIME(%s)"] * len(aplicar))
+            params = [v for c in aplicar for v in (c[1], c[2])]
+            params += [v for c in aplicar for v in (c[1], int(c[4]))]
+            params += [c[1] for c in aplicar]
+            cursor.execute(f"""
+                UPDATE {TABLA_ENCUESTAS}
+                SET calificacion = CASE idcalificacion {casos_calificacion} END,
+                    fecha_califacion = CASE idcalificacion {casos_fecha} END
+                WHERE idcalificacion IN ({", ".join(["%s"] * len(aplicar))})
+                  AND (calificacion IS NULL OR calificacion = '')
+            """, params)
+        cnx.commit()
+        cursor.close()
+        if aplicar:
+            marcar_cambio(TABLA_ENCUESTAS, cnx)
+        return resultados
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cnx.close()
+
+
+def flush(al_aplicar: Optional[Callable[[str, int, Optional[str]], None]] = None) -> int:
+    """
+    Aplica un lote de clics pendientes. `al_aplicar(unique_id, calificacion, tipo)`
+    se llama por cada calificacion registrada (p.ej. para encolar correos).
+
+    Returns:
+        Cantidad de clics procesados (0 si no habia pendientes)
+    """
+    cnx = _conexion()
+    clicks = cnx.execute(
+        "SELECT id, unique_id, calificacion, tipo, recibido_en FROM clicks "
+        "WHERE aplicado_en IS NULL ORDER BY id LIMIT ?",
+        (ENCUESTA_BUFFER_LOTE,)
+    ).fetchall()
+    if not clicks:
+        return 0
+
+    resultados = _aplicar_en_mysql(clicks)
+    ahora = time.time()
+    marcados = set()
+    with cnx:
+        for id_click, resultado in resultados.items():
+            # Si otro proceso ya marco el clic, se conserva su resultado y no se repite al_aplicar
+            cursor = cnx.execute(
+                "UPDATE clicks SET aplicado_en = ?, resultado = ? WHERE id = ? AND aplicado_en IS NULL",
+                (ahora, resultado, id_click)
+            )
+            if cursor.rowcount == 1:
+                marcados.add(id_click)
+
+    with _lock:
+        _estado["ultimo_flush"] = ahora
+        _estado["lotes"] += 1
+
+    if al_aplicar:
+        for click in clicks:
+            if resultados[click[0]] == "aplicado" and click[0] in marcados:
+                try:
+                    al_aplicar(click[1], click[2], click[3])
+                except Exception as e:
+                    print(f"[BufferCalificaciones] Error posterior al clic de {click[1]}: {e}")
+    return len(clicks)
+
+
+def _purgar() -> None:
+    limite = time.time() - ENCUESTA_BUFFER_RETENCION_HORAS * 3600
+    with _conexion() as cnx:
+        cnx.execute("DELETE FROM clicks WHERE aplicado_en IS NOT NULL AND aplicado_en < ?", (limite,))
+
+
+def _loop_flush(al_aplicar) -> None:
+    ultima_purga = 0.0
+    espera = ENCUESTA_BUFFER_INTERVALO
+    while True:
+        try:
+            procesados = flush(al_aplicar)
+            espera = ENCUESTA_BUFFER_INTERVALO
+            if time.time() - ultima_purga > 3600:
+                _purgar()
+                ultima_purga = time.time()
+        except Exception as e:
+            procesados = 0
+            with _lock:
+                _estado["ultimo_error"] = str(e)
+                _estado["errores"] += 1
+            print(f"[BufferCalificaciones] Error en flush, se reintenta: {e}")
+            espera = min(espera * 2, 60)
+        # Con lote completo puede haber mas pendientes: seguir sin esperar
+        if procesados < ENCUESTA_BUFFER_LOTE:
+            time.sleep(espera)
+
+
+def iniciar_flusher(al_aplicar: Optional[Callable[[str, int, Optional[str]], None]] = None) -> bool:
+    """Inicia el hilo de flush (una vez por proceso)."""
+    global _hilo, _hilo_pid
+
+    pid = os.getpid()
+    with _lock:
+        if _hilo_pid == pid and _hilo is not None:
+            return False
+        _hilo = threading.Thread(target=_loop_flush, args=(al_aplicar,), name="buffer-calificaciones", daemon=True)
+        _hilo_pid = pid
+        _hilo.start()
+    print(f"[BufferCalificaciones] Flush cada {ENCUESTA_BUFFER_INTERVALO}s, lotes de {ENCUESTA_BUFFER_LOTE} (pid {pid})")
+    return True
+
+
+def estado_buffer() -> Dict[str, Any]:
+    """Pendientes, lag del flush (antiguedad del pendiente mas viejo) y resultados."""
+    if not ENCUESTA_BUFFER_ENABLED:
+        return {"habilitado": False}
+
+    cnx = _conexion()
+    pendientes, mas_antiguo = cnx.execute(
+        "SELECT COUNT(*), MIN(recibido_en) FROM clicks WHERE aplicado_en IS NULL"
+    ).fetchone()
+    resultados = dict(cnx.execute(
+        "SELECT resultado, COUNT(*) FROM clicks WHERE aplicado_en IS NOT NULL GROUP BY resultado"
+    ).fetchall())
+
+    with _lock:
+        estado = dict(_estado)
+    ahora = time.time()
+    return {
+        "habilitado": True,
+        "pendientes": pendientes,
+        "lag_s": round(ahora - mas_antiguo, 1) if mas_antiguo else 0,
+        "resultados": resultados,
+        "flusher_activo": _hilo is not None and _hilo.is_alive() and _hilo_pid == os.getpid(),
+        **estado
+    }
@@ -0,0 +1,232 @@
+"""
+Cache de respuestas y GET condicional (ETag / Last-Modified -> 304)
+
+Los dashboards consultan cada pocos segundos /roles_menu, /records,
+/bd/records, /wix/records, /sync/leads/asesores y /sync/leads/stats aunque
+los datos no cambien. Cada ruta se asocia a un recurso con un marcador de
+cambios barato:
+    - WIX y envio_de_encuestas: MAX(pk), MAX(actualizado_en) (indices de la
+      migracion 13; detecta cambios hechos fuera de esta app con resolucion de
+      un segundo) y su contador en cache_version, que los endpoints de
+      escritura suben despues de su commit (varias escrituras en el mismo
+      segundo y borrados)
+    - roles_menu: contador en cache_version que suben sus endpoints de escritura
+    - encuestas_rollup_diario: marca del ultimo refresco en analytics_estado
+
+El ETag se deriva del marcador y de la URL, asi que un If-None-Match vigente
+se responde 304 sin ejecutar la vista. Las respuestas pequenas se guardan en
+memoria del proceso por RESPUESTAS_CACHE_TTL segundos mientras el marcador no
+cambie. Los endpoints de escritura llaman a marcar_cambio(recurso, cnx) despues
+del commit: sube el contador en una transaccion corta propia (la fila de
+cache_version no queda bloqueada durante la transaccion del escritor) y
+descarta al instante el marcador y las respuestas de este proceso.
+
+Uso:
+    @bp.route('/records', methods=['GET'])
+    @respuesta_condicional("envio_de_encuestas")
+    def get_records(): ...
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from flask import request, make_response
+
+try:
+    from app.db import get_db_connection
+except ImportError:
+    from db import get_db_connection
+
+
+RESPUESTAS_CACHE_ENABLED = os.environ.get('RESPUESTAS_CACHE_ENABLED', 'true').lower() == 'true'
+# Segundos que se reutiliza una respuesta guardada con el mismo marcador
+RESPUESTAS_CACHE_TTL = float(os.environ.get('RESPUESTAS_CACHE_TTL', 5))
+# Segundos que se reutiliza el marcador leido de la BD
+RESPUESTAS_MARCADOR_TTL = float(os.environ.get('RESPUESTAS_MARCADOR_TTL', 2))
+# Respuestas guardadas por proceso y tamano maximo de cada una
+RESPUESTAS_CACHE_ENTRADAS = int(os.environ.get('RESPUESTAS_CACHE_ENTRADAS', 256))
+RESPUESTAS_CACHE_MAX_BYTES = int(os.environ.get('RESPUESTAS_CACHE_MAX_BYTES', 2 * 1024 * 1024))
+
+# Consulta del marcador de cambios de cada recurso
+MARCADORES: Dict[str, str] = {
+    "WIX": (
+        "SELECT MAX(id), MAX(actualizado_en), "
+        "(SELECT version FROM cache_version WHERE recurso = 'WIX') FROM WIX"
+    ),
+    "envio_de_encuestas": (
+        "SELECT MAX(idcalificacion), MAX(actualizado_en), "
+        "(SELECT version FROM cache_version WHERE recurso = 'envio_de_encuestas') FROM envio_de_encuestas"
+    ),
+    "roles_menu": "SELECT version FROM cache_version WHERE recurso = 'roles_menu'",
+    "encuestas_rollup_diario": "SELECT marca FROM analytics_estado WHERE nombre = 'encuestas_rollup'",
+}
+# Recursos cuyo marcador incluye el contador de cache_version
+RECURSOS_CON_VERSION = {"roles_menu", "WIX", "envio_de_encuestas"}
+
+# recurso -> (marcador, leido_en, visto_desde)
+_marcadores: Dict[str, Tuple[Any, float, float]] = {}
+# (recurso, url) -> (marcador, guardado_en, response)
+_respuestas: "OrderedDict[Tuple[str, str], Tuple[Any, float, Any]]" = OrderedDict()
+_contadores = {"304": 0, "aciertos": 0, "fallos": 0, "sin_marcador": 0}
+_lock = threading.Lock()
+
+
+def marcar_cambio(recurso: str, cnx=None) -> None:
+    """
+    Registra una escritura ya confirmada sobre `recurso`. Los recursos con
+    contador lo incrementan en una transaccion corta propia, despues del commit
+    de quien llama: sobre `cnx` si se pasa (no ocupa otra conexion del pool) o
+    sobre una conexion prestada. Siempre descarta el marcador y las respuestas
+    guardadas en este proceso.
+    """
+    if recurso in RECURSOS_CON_VERSION:
+        propia = cnx is None
+        if propia:
+            cnx = get_db_connection()
+        if cnx is not None:
+            try:
+                cursor = cnx.cursor()
+                cursor.execute("""
+                    INSERT INTO cache_version (recurso, version) VALUES (%s, 1)
+                    ON DUPLICATE KEY UPDATE version = version + 1
+                """, (recurso,))
+                cnx.commit()
+                cursor.close()
+            except Exception as e:
+                # Sin tabla (migracion pendiente) el cambio solo se ve en este proceso
+                print(f"[CacheRespuestas] No se pudo incrementar la version de {recurso}: {e}")
+                try:
+                    cnx.rollback()
+                except Exception:
+                    pass
+            finally:
+                if propia:
+                    cnx.close()
+
+    with _lock:
+        _marcadores.pop(recurso, None)
+        for clave in [c for c in _respuestas if c[0] == recurso]:
+            del _respuestas[clave]
+
+
+def _leer_marcador(recurso: str) -> Optional[Tuple[Any, float]]:
+    """(marcador, visto_desde) vigente del recurso; None si no se pudo leer."""
+    ahora = time.time()
+    with _lock:
+        guardado = _marcadores.get(recurso)
+    if guardado and ahora - guardado[1] < RESPUESTAS_MARCADOR_TTL:
+        return guardado[0], guardado[2]
+
+    cnx = get_db_connection()
+    if cnx is None:
+        return None
+    try:
+        cursor = cnx.cursor()
+        cursor.execute(MARCADORES[recurso])
+        fila = cursor.fetchone()
+        cursor.close()
+    except Exception as e:
+        print(f"[CacheRespuestas] No se pudo leer el marcador de {recurso}: {e}")
+        return None
+    finally:
+        cnx.close()
+
+    marcador = repr(tuple(fila) if fila else None)
+    with _lock:
+        anterior = _marcadores.get(recurso)
+        visto_desde = anterior[2] if anterior and anterior[0] == marcador else ahora
+        _marcadores[recurso] = (marcador, ahora, visto_desde)
+    return marcador, visto_desde
+
+
+def _contar(contador: str) -> None:
+    with _lock:
+        _contadores[contador] += 1
+
+
+def _condicionar(response, etag: str, visto_desde: float):
+    response.set_etag(etag, weak=True)
+    response.last_modified = int(visto_desde)
+    # El navegador puede guardar la respuesta pero debe revalidar siempre
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _no_modificado(etag: str, visto_desde: float) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return int(visto_desde) <= request.if_modified_since.timestamp()
+    return False
+
+
+def respuesta_condicional(recurso: str, omitir_si: Tuple[str, ...] = ()):
+    """
+    Decorador para GET de lectura: ETag/Last-Modified, 304 y cache corto.
+
+    Args:
+        recurso: clave de MARCADORES
+        omitir_si: parametros de query que desactivan el cache (p.ej. fresh)
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if not RESPUESTAS_CACHE_ENABLED or any(request.args.get(p) for p in omitir_si):
+                return vista(*args, **kwargs)
+
+            leido = _leer_marcador(recurso)
+            if leido is None:
+                _contar("sin_marcador")
+                return vista(*args, **kwargs)
+            marcador, visto_desde = leido
+
+            url = request.full_path
+            etag = hashlib.sha1(f"{recurso}|{marcador}|{url}".encode()).hexdigest()[:32]
+
+            if _no_modificado(etag, visto_desde):
+                _contar("304")
+                return _condicionar(make_response('', 304), etag, visto_desde)
+
+            clave = (recurso, url)
+            with _lock:
+                guardada = _respuestas.get(clave)
+                if guardada and guardada[0] == marcador and time.time() - guardada[1] < RESPUESTAS_CACHE_TTL:
+                    _respuestas.move_to_end(clave)
+                    _contadores["aciertos"] += 1
+                    cuerpo, status, headers = guardada[2]
+                    return _condicionar(make_response(cuerpo, status, headers), etag, visto_desde)
+
+            _contar("fallos")
+            response = make_response(vista(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            # Las respuestas en streaming (tablas completas) no se guardan, pero si se condicionan
+            if not response.is_streamed:
+                cuerpo = response.get_data()
+                if len(cuerpo) <= RESPUESTAS_CACHE_MAX_BYTES:
+                    with _lock:
+                        _respuestas[clave] = (marcador, time.time(), (cuerpo, 200, list(response.headers.items())))
+                        _respuestas.move_to_end(clave)
+                        while len(_respuestas) > RESPUESTAS_CACHE_ENTRADAS:
+                            _respuestas.popitem(last=False)
+
+            return _condicionar(response, etag, visto_desde)
+        return envoltura
+    return decorador
+
+
+def estado_cache_respuestas() -> Dict[str, Any]:
+    """Contadores y entradas guardadas (de este proceso)."""
+    with _lock:
+        return {
+            "habilitado": RESPUESTAS_CACHE_ENABLED,
+            "entradas": len(_respuestas),
+            "marcadores": {r: m[0] for r, m in _marcadores.items()},
+            **_contadores
+        }
@@ -0,0 +1,174 @@
+"""
+Catalogo de imagenes de marketing por carpeta de segmento
+
+/segmento_imagenes ya no abre una conexion FTP por peticion: las carpetas
+configuradas se listan en segundo plano cada CATALOGO_REFRESCO_SEGUNDOS y el
+resultado queda:
+    - en memoria del proceso (la peticion solo lee un dict)
+    - en un snapshot JSON en disco, para arrancar con datos aunque el FTP
+      no responda
+Si el FTP falla se conserva el ultimo listado conocido.
+
+Refresco manual: POST /segmento_imagenes/refrescar
+"""
+
+import os
+import json
+import time
+import ftplib
+import threading
+from typing import Any, Dict, List, Optional
+
+CATALOGO_FTP_HOST = os.getenv("CATALOGO_FTP_HOST", "75.102.23.104")
+CATALOGO_FTP_USER = os.getenv("CATALOGO_FTP_USER", "kossodo_kossodo.estilovisual.com")
+CATALOGO_FTP_PASSWORD = os.getenv("CATALOGO_FTP_PASSWORD", "kossodo2024##")
+CATALOGO_FTP_TIMEOUT = int(os.getenv("CATALOGO_FTP_TIMEOUT", "15"))
+CATALOGO_RUTA_FTP = os.getenv("CATALOGO_RUTA_FTP", "/marketing/calificacion/categorias")
+CATALOGO_URL_BASE = os.getenv(
+    "CATALOGO_URL_BASE", "https://kossodo.estilovisual.com/marketing/calificacion/categorias"
+)
+# Carpetas de segmento a listar (la primera es la usada por defecto)
+CATALOGO_CARPETAS = [c.strip() for c in os.getenv("CATALOGO_CARPETAS", "Otros").split(",") if c.strip()]
+CATALOGO_REFRESCO_SEGUNDOS = int(os.getenv("CATALOGO_REFRESCO_SEGUNDOS", "600"))
+# Tras un fallo, segundos sin reintentar el FTP desde una peticion
+CATALOGO_REINTENTO_SEGUNDOS = int(os.getenv("CATALOGO_REINTENTO_SEGUNDOS", "60"))
+CATALOGO_REFRESCO_ENABLED = os.getenv("CATALOGO_REFRESCO_ENABLED", "true").lower() == "true"
+CATALOGO_SNAPSHOT = os.getenv(
+    "CATALOGO_SNAPSHOT", os.path.join(os.path.dirname(__file__), "catalogo_imagenes.json")
+)
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# carpeta -> {"imagenes": [nombres], "actualizado_en": epoch}
+_catalogo: Dict[str, Dict[str, Any]] = {}
+_estado: Dict[str, Any] = {"ultimo_intento": None, "ultimo_error": None, "refrescos": 0, "errores": 0}
+_lock = threading.Lock()
+_refresco_lock = threading.Lock()
+_hilo: Optional[threading.Thread] = None
+_hilo_pid: Optional[int] = None
+
+
+def _listar_ftp(carpetas: List[str]) -> Dict[str, List[str]]:
+    """Lista las imagenes de cada carpeta con una sola conexion FTP."""
+    ftp = ftplib.FTP(CATALOGO_FTP_HOST, CATALOGO_FTP_USER, CATALOGO_FTP_PASSWORD, timeout=CATALOGO_FTP_TIMEOUT)
+    try:
+        listado = {}
+        for carpeta in carpetas:
+            ftp.cwd(f"{CATALOGO_RUTA_FTP}/{carpeta}")
+            listado[carpeta] = sorted(f for f in ftp.nlst() if f.lower().endswith(EXTENSIONES_IMAGEN))
+        return listado
+    finally:
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+
+
+def _guardar_snapshot() -> None:
+    with _lock:
+        datos = json.dumps(_catalogo, ensure_ascii=False)
+    temporal = f"{CATALOGO_SNAPSHOT}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(datos)
+        os.replace(temporal, CATALOGO_SNAPSHOT)
+    except OSError as e:
+        print(f"[CatalogoImagenes] No se pudo guardar el snapshot: {e}")
+
+
+def cargar_snapshot() -> int:
+    """Carga el snapshot de disco si aun no hay datos en memoria. Retorna carpetas cargadas."""
+    try:
+        with open(CATALOGO_SNAPSHOT, encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    with _lock:
+        for carpeta, entrada in datos.items():
+            _catalogo.setdefault(carpeta, entrada)
+        return len(_catalogo)
+
+
+def refrescar_catalogo(carpetas: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Vuelve a listar las carpetas por FTP. Si falla, el catalogo en memoria
+    no se toca. Solo un refresco a la vez por proceso.
+
+    Returns:
+        Dict con success, carpetas actualizadas y error (si aplica)
+    """
+    carpetas = carpetas or CATALOGO_CARPETAS
+    with _refresco_lock:
+        _estado["ultimo_intento"] = time.time()
+        _estado["ultimo_error"] = None
+        try:
+            listado = _listar_ftp(carpetas)
+        except ftplib.all_errors as e:
+            _estado["ultimo_error"] = str(e)
+            _estado["errores"] += 1
+            print(f"[CatalogoImagenes] Error FTP, se conserva el ultimo catalogo: {e}")
+            return {"success": False, "error": str(e)}
+
+        ahora = time.time()
+        with _lock:
+            for carpeta, imagenes in listado.items():
+                _catalogo[carpeta] = {"imagenes": imagenes, "actualizado_en": ahora}
+        _estado["refrescos"] += 1
+
+    _guardar_snapshot()
+    return {"success": True, "carpetas": {c: len(i) for c, i in listado.items()}}
+
+
+def obtener_imagenes(carpeta: str) -> List[str]:
+    """
+    URLs de las imagenes de la carpeta desde memoria. Solo si la carpeta nunca
+    se cargo (sin snapshot) se intenta un refresco en esta peticion, y no mas
+    de una vez cada CATALOGO_REINTENTO_SEGUNDOS si el FTP esta fallando.
+    """
+    with _lock:
+        entrada = _catalogo.get(carpeta)
+    fallo_reciente = _estado["ultimo_error"] and time.time() - _estado["ultimo_intento"] < CATALOGO_REINTENTO_SEGUNDOS
+    if entrada is None and not fallo_reciente:
+        refrescar_catalogo([carpeta])
+        with _lock:
+            entrada = _catalogo.get(carpeta)
+    if entrada is None:
+        return []
+    return [f"{CATALOGO_URL_BASE}/{carpeta}/{nombre}" for nombre in entrada["imagenes"]]
+
+
+def _loop_refresco() -> None:
+    while True:
+        refrescar_catalogo()
+        time.sleep(CATALOGO_REFRESCO_SEGUNDOS)
+
+
+def iniciar_refresco_catalogo() -> bool:
+    """Carga el snapshot e inicia el hilo de refresco (una vez por proceso)."""
+    global _hilo, _hilo_pid
+
+    cargar_snapshot()
+    pid = os.getpid()
+    with _lock:
+        if _hilo_pid == pid and _hilo is not None:
+            return False
+        _hilo = threading.Thread(target=_loop_refresco, name="catalogo-imagenes", daemon=True)
+        _hilo_pid = pid
+        _hilo.start()
+    print(f"[CatalogoImagenes] Refresco cada {CATALOGO_REFRESCO_SEGUNDOS}s de {CATALOGO_CARPETAS} (pid {pid})")
+    return True
+
+
+def estado_catalogo() -> Dict[str, Any]:
+    """Carpetas en memoria, cantidad de imagenes, antiguedad y ultimo error."""
+    ahora = time.time()
+    with _lock:
+        carpetas = {
+            carpeta: {
+                "imagenes": len(entrada["imagenes"]),
+                "antiguedad_s": round(ahora - entrada["actualizado_en"], 1)
+            }
+            for carpeta, entrada in _catalogo.items()
+        }
+    return {"carpetas": carpetas, "refresco_segundos": CATALOGO_REFRESCO_SEGUNDOS, **_estado}
@@ -0,0 +1,97 @@
+"""
+Compresion de respuestas (gzip / brotli) negociada por Accept-Encoding
+
+Se aplica en after_request a respuestas 200 de tipo JSON, NDJSON o texto:
+    - Cuerpo en memoria: solo si supera COMPRESION_MIN_BYTES
+    - Streaming (listados completos): siempre, comprimiendo por partes sin
+      acumular la respuesta
+brotli se usa solo si el paquete esta instalado (dependencia opcional) y el
+cliente lo prefiere o acepta; si no, gzip.
+"""
+
+import os
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional
+    brotli = None
+
+
+COMPRESION_ENABLED = os.environ.get('COMPRESION_ENABLED', 'true').lower() == 'true'
+COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', 1024))
+COMPRESION_NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', 6))
+COMPRESION_NIVEL_BROTLI = int(os.environ.get('COMPRESION_NIVEL_BROTLI', 4))
+
+TIPOS_COMPRIMIBLES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def _nuevo_compresor(codificacion: str):
+    if codificacion == 'br':
+        return brotli.Compressor(quality=COMPRESION_NIVEL_BROTLI)
+    # wbits=31: formato gzip (cabecera + CRC)
+    return zlib.compressobj(COMPRESION_NIVEL_GZIP, zlib.DEFLATED, 31)
+
+
+def _comprimir(datos: bytes, codificacion: str) -> bytes:
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=COMPRESION_NIVEL_BROTLI)
+    compresor = _nuevo_compresor(codificacion)
+    return compresor.compress(datos) + compresor.flush()
+
+
+def _comprimir_stream(partes: Iterable, codificacion: str) -> Iterator[bytes]:
+    compresor = _nuevo_compresor(codificacion)
+    try:
+        for parte in partes:
+            if isinstance(parte, str):
+                parte = parte.encode('utf-8')
+            salida = compresor.process(parte) if codificacion == 'br' else compresor.compress(parte)
+            if salida:
+                yield salida
+        yield compresor.finish() if codificacion == 'br' else compresor.flush()
+    finally:
+        # Si el cliente corta, se cierra el generador original (libera el cursor)
+        if hasattr(partes, 'close'):
+            partes.close()
+
+
+def _elegir_codificacion() -> Optional[str]:
+    ofrecidas = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(ofrecidas)
+
+
+def comprimir_respuesta(response):
+    """after_request: comprime la respuesta si el cliente lo acepta y conviene."""
+    if (response.status_code != 200
+            or request.method == 'HEAD'
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough
+            or not (response.mimetype or '').startswith(TIPOS_COMPRIMIBLES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    codificacion = _elegir_codificacion()
+    if codificacion is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _comprimir_stream(response.response, codificacion)
+        response.headers.pop('Content-Length', None)
+    else:
+        datos = response.get_data()
+        if len(datos) < COMPRESION_MIN_BYTES:
+            return response
+        response.set_data(_comprimir(datos, codificacion))
+
+    response.headers['Content-Encoding'] = codificacion
+    return response
+
+
+def registrar_compresion(app) -> None:
+    """Registra la compresion en la app (COMPRESION_ENABLED=false la desactiva)."""
+    if COMPRESION_ENABLED:
+        app.after_request(comprimir_respuesta)
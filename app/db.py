@@ -1,5 +1,11 @@
 # db.py
 import os
+import time
+import queue
+import weakref
+import threading
+from contextlib import contextmanager
+
 import mysql.connector
 from mysql.connector import errorcode
 
@@ -9,23 +15,244 @@ DB_CONFIG = {
     'password': os.environ.get('MYSQL_PASSWORD'),
     'host': os.environ.get('MYSQL_HOST'),
     'database': os.environ.get('MYSQL_DATABASE'),
-    'port': 3306
+    'port': int(os.environ.get('MYSQL_PORT', 3306))
 }
 
+# Configuración del pool de conexiones (por proceso)
+POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 5))
+# Segundos máximos que se espera por una conexión libre antes de rendirse
+POOL_TIMEOUT = float(os.environ.get('MYSQL_POOL_TIMEOUT', 10))
+# Edad máxima de una conexión física antes de reciclarla (evita wait_timeout del servidor)
+POOL_RECYCLE = int(os.environ.get('MYSQL_POOL_RECYCLE', 1800))
+# Si una conexión estuvo ociosa más de estos segundos, se hace ping antes de entregarla
+POOL_PING_INTERVAL = int(os.environ.get('MYSQL_POOL_PING_INTERVAL', 30))
+
+
+def _log_connection_error(err):
+    """Imprime un mensaje legible para los errores de conexión más comunes."""
+    # Puedes usar print o logs. En Render, print irá a los logs del servidor.
+    if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
+        print("Error de acceso a la base de datos: Usuario o contraseña incorrectos")
+    elif err.errno == errorcode.ER_BAD_DB_ERROR:
+        print("La base de datos no existe")
+    else:
+        print(f"Error de conexión a la base de datos: {err}")
+
+
+class PooledConnection:
+    """
+    Envoltura de una conexión prestada por el pool.
+
+    Se comporta como una conexión de mysql.connector (cursor, commit, rollback...),
+    pero close() la devuelve al pool en lugar de cerrar el socket. También puede
+    usarse como context manager: `with get_db_connection() as cnx: ...`
+    Si se pierde sin llamar a close(), al recolectarla se cierra la conexión
+    física y se libera su cupo en el pool.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+        # No referencia a self: solo el pool y la conexión física
+        self._finalizer = weakref.finalize(self, pool._abandoned, raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)."""
+        if self._returned:
+            return
+        self._returned = True
+        self._finalizer.detach()
+        self._pool._release(self._raw, self._created_at)
+
+    def is_connected(self):
+        if self._returned:
+            return False
+        return self._raw.is_connected()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones MySQL con chequeo de salud y reciclaje.
+
+    - Mantiene como máximo `size` conexiones físicas abiertas por proceso.
+    - Al prestar una conexión verifica que siga viva (ping si estuvo ociosa)
+      y la recicla si superó `recycle` segundos de vida.
+    - Al devolverla descarta cualquier transacción sin confirmar.
+    """
+
+    def __init__(self, config, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_interval=POOL_PING_INTERVAL):
+        self.config = config
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        # Cola de conexiones libres: (conexion, creada_en, devuelta_en)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def _discard(self, raw):
+        with self._lock:
+            self._opened -= 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, raw, created_at, idle_since):
+        now = time.time()
+        if self.recycle and now - created_at > self.recycle:
+            return False
+        if now - idle_since > self.ping_interval:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def acquire(self):
+        """
+        Presta una conexión del pool.
+        Lanza mysql.connector.Error si no se puede abrir una nueva conexión
+        y queue.Empty si no hay conexiones libres dentro del timeout.
+        """
+        deadline = time.time() + self.timeout
+
+        while True:
+            # 1) Reutilizar una conexión ociosa si está sana
+            try:
+                raw, created_at, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                raw = None
+
+            if raw is not None:
+                if self._is_healthy(raw, created_at, idle_since):
+                    return PooledConnection(self, raw, created_at)
+                self._discard(raw)
+                continue
+
+            # 2) Abrir una conexión nueva si hay cupo
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+
+            if can_open:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+                return PooledConnection(self, raw, time.time())
+
+            # 3) Esperar a que alguien devuelva una conexión
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise queue.Empty()
+            raw, created_at, idle_since = self._idle.get(timeout=remaining)
+            if self._is_healthy(raw, created_at, idle_since):
+                return PooledConnection(self, raw, created_at)
+            self._discard(raw)
+
+    def _abandoned(self, raw):
+        """Conexión prestada que se recolectó sin close(): se descarta."""
+        print("Advertencia: conexión a la base de datos recolectada sin close(); se descarta")
+        self._discard(raw)
+
+    def _release(self, raw, created_at):
+        # Sin ping aquí: acquire() lo hace si la conexión estuvo ociosa más de ping_interval
+        try:
+            # No dejar transacciones abiertas ni resultados pendientes para el próximo usuario
+            if raw.in_transaction:
+                raw.rollback()
+            if raw.unread_result:
+                raw.consume_results()
+        except Exception:
+            self._discard(raw)
+            return
+        self._idle.put((raw, created_at, time.time()))
+
+    def stats(self):
+        """Estado actual del pool (útil para diagnóstico)."""
+        with self._lock:
+            opened = self._opened
+        idle = self._idle.qsize()
+        return {
+            'size': self.size,
+            'opened': opened,
+            'idle': idle,
+            'in_use': opened - idle
+        }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Retorna el pool del proceso actual, creándolo la primera vez.
+    Si el proceso fue bifurcado (p. ej. gunicorn con --preload), crea uno nuevo
+    para no compartir sockets entre procesos.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(DB_CONFIG)
+                _pool_pid = pid
+    return _pool
+
+
 def get_db_connection():
     """
-    Establece la conexión con la base de datos.
+    Presta una conexión del pool del proceso.
     Retorna el objeto de conexión si es exitoso o None si falla.
+    Llamar a close() sobre la conexión la devuelve al pool.
     """
     try:
-        cnx = mysql.connector.connect(**DB_CONFIG)
-        return cnx
+        return get_pool().acquire()
     except mysql.connector.Error as err:
-        # Puedes usar print o logs. En Render, print irá a los logs del servidor.
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
-            print("Error de acceso a la base de datos: Usuario o contraseña incorrectos")
-        elif err.errno == errorcode.ER_BAD_DB_ERROR:
-            print("La base de datos no existe")
-        else:
-            print(f"Error de conexión a la base de datos: {err}")
+        _log_connection_error(err)
+        return None
+    except queue.Empty:
+        print(f"Error de conexión a la base de datos: pool agotado tras {POOL_TIMEOUT}s de espera")
         return None
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager que presta una conexión y la devuelve al pool al salir.
+    Lanza RuntimeError si no se pudo obtener una conexión.
+
+        with db_connection() as cnx:
+            cursor = cnx.cursor()
+            ...
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        raise RuntimeError("No se pudo conectar a la base de datos.")
+    try:
+        yield cnx
+    finally:
+        cnx.close()
@@ -1,30 +1,24 @@
-import os
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 try:
     # Importaciones del paquete app (para Render/producción)
-    from app.templates_email import (
-        get_email_template_ventas, 
-        get_email_template_operaciones, 
-        get_email_template_coordinador
-    )
+    from app.plantillas_compiladas import renderizar_encuesta
+    from app.Mailing.smtp_transport import enviar_correo
 except ImportError:
     # Importaciones relativas (para desarrollo con run_app.py)
-    from templates_email import (
-        get_email_template_ventas, 
-        get_email_template_operaciones, 
-        get_email_template_coordinador
-    )
+    from plantillas_compiladas import renderizar_encuesta
+    from Mailing.smtp_transport import enviar_correo
 
-def enviar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tipo, documento=None):
+def preparar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tipo, documento=None):
     """
-    Envía un correo con escala de calificación del 1 al 10.
-    Retorna un dict con 'status' y 'message', y el código de estado HTTP.
+    Valida los datos y construye el correo de la encuesta sin enviarlo.
+    Retorna (mensaje, respuesta):
+      - mensaje: tupla (msg, email_list) lista para enviar, o None si no corresponde enviar
+      - respuesta: (dict, código HTTP) a devolver cuando mensaje es None
     """
     # Validaciones básicas
     if not (nombre_cliente and correo_cliente and asesor and numero_consulta):
-        return {'status': 'error', 'message': 'Faltan parámetros'}, 400
+        return None, ({'status': 'error', 'message': 'Faltan parámetros'}, 400)
 
     # --- NUEVA SECCIÓN: Procesar correos y validación de dominios internos ---
     email_list = [email.strip() for email in correo_cliente.split(',') if email.strip()]
@@ -34,7 +28,7 @@ def enviar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tip
     for email in email_list:
         for domain in forbidden_domains:
             if email.lower().endswith(domain):
-                return {'status': 'ok', 'message': 'No se envió correo para correos internos'}, 200
+                return None, ({'status': 'ok', 'message': 'No se envió correo para correos internos'}, 200)
     # -------------------------------------------------------------------------
 
     # --- FILTRO DE TESTING: Solo enviar emails a gfxjef@gmail.com ---
@@ -61,40 +55,45 @@ def enviar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tip
 
     # Generar el HTML según el tipo de envío usando templates separados - NUEVA LÓGICA CORREGIDA
     if tipo == "Ventas (OT)":
-        html_body = get_email_template_ventas(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("ventas", nombre_cliente, documento, base_url, unique_id, tipo)
     elif tipo == "Ventas (OC)":
-        html_body = get_email_template_coordinador(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("coordinador", nombre_cliente, documento, base_url, unique_id, tipo)
     elif tipo == "Coordinador (Conformidad)":
-        html_body = get_email_template_operaciones(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("operaciones", nombre_cliente, documento, base_url, unique_id, tipo)
     elif tipo == "Operaciones" or tipo == "Entregado":
-        html_body = get_email_template_operaciones(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("operaciones", nombre_cliente, documento, base_url, unique_id, tipo)
     elif tipo == "Ventas":  # Ventas genérico (sin OT/OC)
-        html_body = get_email_template_ventas(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("ventas", nombre_cliente, documento, base_url, unique_id, tipo)
     else:
         # Template por defecto (Coordinador)
-        html_body = get_email_template_coordinador(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("coordinador", nombre_cliente, documento, base_url, unique_id, tipo)
+
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f"Encuesta de Satisfacción - Consulta #{numero_consulta}"
+    msg['From'] = "Kossodo S.A.C. <jcamacho@kossodo.com>"
+    msg['To'] = ", ".join(email_list)
+
+    part_html = MIMEText(html_body, 'html', 'utf-8')
+    msg.attach(part_html)
+
+    return (msg, email_list), None
+
 
+def enviar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tipo, documento=None):
+    """
+    Envía un correo con escala de calificación del 1 al 10.
+    Retorna un dict con 'status' y 'message', y el código de estado HTTP.
+    """
     try:
-        # Configuración SMTP
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        sender_email = os.environ.get('EMAIL_USER')      # Usuario SMTP
-        sender_password = os.environ.get('EMAIL_PASSWORD')  # Contraseña SMTP
-
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"Encuesta de Satisfacción - Consulta #{numero_consulta}"
-        msg['From'] = "Kossodo S.A.C. <jcamacho@kossodo.com>"
-        msg['To'] = ", ".join(email_list)
-
-        part_html = MIMEText(html_body, 'html', 'utf-8')
-        msg.attach(part_html)
-
-        # Enviar correo a la lista de correos
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, email_list, msg.as_string())
-        server.quit()
+        mensaje, respuesta = preparar_encuesta(
+            nombre_cliente, correo_cliente, asesor, numero_consulta, tipo, documento
+        )
+        if mensaje is None:
+            return respuesta
+
+        # Enviar usando una sesión SMTP ya autenticada del pool compartido
+        msg, email_list = mensaje
+        enviar_correo(msg, email_list)
 
         return {'status': 'ok', 'message': 'Encuesta enviada correctamente'}, 200
 
@@ -102,15 +101,15 @@ def enviar_encuesta(nombre_cliente, correo_cliente, asesor, numero_consulta, tip
         return {'status': 'error', 'message': f'Error al enviar el correo: {str(e)}'}, 500
 
 
-def enviar_email_lamentamos(nombre_cliente, correo_cliente, numero_consulta, tipo, documento=None):
+def preparar_email_lamentamos(nombre_cliente, correo_cliente, numero_consulta, tipo, documento=None):
     """
-    Envía un email de lamentamos cuando la calificación es baja (1-3).
-    Se envía automáticamente al recibir una calificación insatisfactoria.
+    Valida los datos y construye el email de lamentamos sin enviarlo.
+    Retorna (mensaje, respuesta) igual que preparar_encuesta.
     """
     # Validaciones básicas
     if not (nombre_cliente and correo_cliente and numero_consulta and tipo):
         print(f"❌ Error: Faltan parámetros para envío de lamentamos")
-        return {'status': 'error', 'message': 'Faltan parámetros para email de lamentamos'}, 400
+        return None, ({'status': 'error', 'message': 'Faltan parámetros para email de lamentamos'}, 400)
 
     # --- PROCESAR CORREOS Y FILTROS ---
     email_list = [email.strip() for email in correo_cliente.split(',') if email.strip()]
@@ -121,7 +120,7 @@ def enviar_email_lamentamos(nombre_cliente, correo_cliente, numero_consulta, tip
         for domain in forbidden_domains:
             if email.lower().endswith(domain):
                 print(f"🚫 Email de lamentamos NO enviado a dominio interno: {email}")
-                return {'status': 'ok', 'message': 'No se envió email de lamentamos para correos internos'}, 200
+                return None, ({'status': 'ok', 'message': 'No se envió email de lamentamos para correos internos'}, 200)
 
     # --- FILTRO DE TESTING: Solo enviar emails a gfxjef@gmail.com ---
     # EMAIL_TESTING = "gfxjef@gmail.com"
@@ -138,50 +137,48 @@ def enviar_email_lamentamos(nombre_cliente, correo_cliente, numero_consulta, tip
     unique_id = numero_consulta.replace("CONS-", "")
     base_url = "https://feedback-califcacion.onrender.com"
     
-    # Importar templates de lamentamos
-    try:
-        from app.templates_email import get_email_template_lamentamos_ventas, get_email_template_lamentamos_operaciones
-    except ImportError:
-        from templates_email import get_email_template_lamentamos_ventas, get_email_template_lamentamos_operaciones
-    
     # Determinar qué template de lamentamos usar según el tipo - NUEVA LÓGICA CORREGIDA
     if tipo in ["Ventas", "Ventas (OT)"]:
-        html_body = get_email_template_lamentamos_ventas(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("lamentamos_ventas", nombre_cliente, documento, base_url, unique_id, tipo)
         tipo_email = "Ventas"
     elif tipo in ["Ventas (OC)", "Coordinador (Conformidad)", "Operaciones", "Entregado"]:
-        html_body = get_email_template_lamentamos_operaciones(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("lamentamos_operaciones", nombre_cliente, documento, base_url, unique_id, tipo)
         tipo_email = "Operaciones"
     else:
         # Por defecto usar operaciones
-        html_body = get_email_template_lamentamos_operaciones(nombre_cliente, documento, base_url, unique_id, tipo)
+        html_body = renderizar_encuesta("lamentamos_operaciones", nombre_cliente, documento, base_url, unique_id, tipo)
         tipo_email = "Operaciones (por defecto)"
 
     print(f"📧 Preparando email de lamentamos tipo {tipo_email} para {correo_cliente}")
 
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f"Queremos mejorar nuestro servicio - Consulta #{numero_consulta}"
+    msg['From'] = "Kossodo S.A.C. <jcamacho@kossodo.com>"
+    msg['To'] = ", ".join(email_list)
+
+    part_html = MIMEText(html_body, 'html', 'utf-8')
+    msg.attach(part_html)
+
+    return (msg, email_list), None
+
+
+def enviar_email_lamentamos(nombre_cliente, correo_cliente, numero_consulta, tipo, documento=None):
+    """
+    Envía un email de lamentamos cuando la calificación es baja (1-3).
+    /encuesta lo encola con preparar_email_lamentamos; esta versión envía en el momento.
+    """
     try:
-        # Configuración SMTP
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        sender_email = os.environ.get('EMAIL_USER')
-        sender_password = os.environ.get('EMAIL_PASSWORD')
-
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"Queremos mejorar nuestro servicio - Consulta #{numero_consulta}"
-        msg['From'] = "Kossodo S.A.C. <jcamacho@kossodo.com>"
-        msg['To'] = ", ".join(email_list)
-
-        part_html = MIMEText(html_body, 'html', 'utf-8')
-        msg.attach(part_html)
-
-        # Enviar correo
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, email_list, msg.as_string())
-        server.quit()
+        mensaje, respuesta = preparar_email_lamentamos(
+            nombre_cliente, correo_cliente, numero_consulta, tipo, documento
+        )
+        if mensaje is None:
+            return respuesta
+
+        # Enviar correo usando el pool SMTP compartido
+        enviar_correo(*mensaje)
 
         print(f"✅ Email de lamentamos enviado correctamente a {correo_cliente}")
-        return {'status': 'ok', 'message': f'Email de lamentamos {tipo_email} enviado correctamente'}, 200
+        return {'status': 'ok', 'message': 'Email de lamentamos enviado correctamente'}, 200
 
     except Exception as e:
         print(f"❌ Error enviando email de lamentamos: {e}")
@@ -0,0 +1,477 @@
+"""
+Backfill - Reanalisis masivo de leads de WIX
+
+Procesa por lotes los leads sin analisis (ia_procesado NULL) o con un
+analisis antiguo, usando el flujo determinista de service.py:
+    - Los RUC (o nombres de empresa sin RUC) repetidos dentro de un lote se
+      consultan una sola vez en SIEK / buscar_info_empresa
+    - Concurrencia acotada y limite de llamadas por minuto hacia Gemini
+    - Los resultados del lote se guardan con un UPDATE por lote (una conexion)
+    - El avance (ultimo id procesado) queda en backfill_checkpoint, asi una
+      ejecucion interrumpida continua donde quedo. No pasa del primer lead
+      que fallo en la ejecucion: la siguiente lo reintenta, y los ya
+      analizados se saltan porque ya tienen ia_procesado
+
+Uso:
+    python -m app.gemini.backfill [--lote 50] [--concurrencia 4] [--por-minuto 60]
+                                  [--max-leads N] [--reprocesar-dias D]
+                                  [--reiniciar] [--nombre gemini]
+    POST /gemini/backfill (en segundo plano), GET /gemini/backfill (avance)
+
+Una sola ejecucion por checkpoint entre todos los procesos (workers de
+gunicorn, CLI): se toma GET_LOCK('backfill:<nombre>') durante toda la corrida.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    from app.db import get_db_connection
+    from app.gemini.gateways.leads.gateway import GatewayLeads
+    from app.gemini.gateways.leads.tools.buscar_info_empresa import normalizar_nombre_empresa
+    from app.gemini.service import (
+        llamar_funcion, buscar_datos_cliente, args_requerimiento, respuesta_determinista,
+        procesar_resultados_gemini, debe_guardarse, actualizar_leads_en_bd
+    )
+except ImportError:
+    from db import get_db_connection
+    from gemini.gateways.leads.gateway import GatewayLeads
+    from gemini.gateways.leads.tools.buscar_info_empresa import normalizar_nombre_empresa
+    from gemini.service import (
+        llamar_funcion, buscar_datos_cliente, args_requerimiento, respuesta_determinista,
+        procesar_resultados_gemini, debe_guardarse, actualizar_leads_en_bd
+    )
+
+
+BACKFILL_LOTE = int(os.getenv("BACKFILL_LOTE", 50))
+BACKFILL_CONCURRENCIA = int(os.getenv("BACKFILL_CONCURRENCIA", 4))
+# Llamadas a funciones que pueden usar Gemini, por minuto (cuota de la API)
+BACKFILL_POR_MINUTO = int(os.getenv("BACKFILL_POR_MINUTO", 60))
+
+# Funciones del gateway que consumen cuota de Gemini
+ACCIONES_GEMINI = {"buscar_info_empresa", "analizar_requerimiento"}
+
+_en_curso = threading.Lock()
+_detener = threading.Event()
+
+
+def _nombre_lock(nombre: str) -> str:
+    return f"backfill:{nombre}"
+
+
+class _LimitadorTasa:
+    """Token bucket: como maximo `por_minuto` adquisiciones por minuto."""
+
+    def __init__(self, por_minuto: int):
+        self.capacidad = max(1, por_minuto)
+        self.tokens = float(self.capacidad)
+        self.por_segundo = self.capacidad / 60.0
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.por_segundo)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.por_segundo
+            time.sleep(espera)
+
+
+class _GatewayLimitado:
+    """GatewayLeads que respeta el limite de tasa en las acciones de Gemini."""
+
+    def __init__(self, gateway: GatewayLeads, limitador: _LimitadorTasa):
+        self.gateway = gateway
+        self.limitador = limitador
+
+    def get_gateway_name(self) -> str:
+        return self.gateway.get_gateway_name()
+
+    def execute(self, action: str, params: Dict[str, Any]) -> Any:
+        if action in ACCIONES_GEMINI:
+            self.limitador.adquirir()
+        return self.gateway.execute(action, params)
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+
+def leer_checkpoint(nombre: str = "gemini") -> Optional[Dict[str, Any]]:
+    """Avance guardado de una ejecucion (None si nunca se ejecuto)."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return None
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM backfill_checkpoint WHERE nombre = %s", (nombre,))
+        row = cursor.fetchone()
+        if row:
+            # En curso en cualquier proceso, no solo en este
+            cursor.execute("SELECT IS_USED_LOCK(%s) AS sesion", (_nombre_lock(nombre),))
+            row["en_curso"] = cursor.fetchone()["sesion"] is not None
+        cursor.close()
+        return row
+    finally:
+        cnx.close()
+
+
+def _iniciar_checkpoint(nombre: str, reiniciar: bool, parametros: Dict[str, Any]) -> int:
+    """Crea o retoma el checkpoint. Retorna el ultimo id ya procesado."""
+    cnx = get_db_connection()
+    if cnx is None:
+        raise RuntimeError("No se pudo conectar a la BD")
+    try:
+        cursor = cnx.cursor()
+        cursor.execute("""
+            INSERT INTO backfill_checkpoint (nombre, estado, parametros, iniciado_en)
+            VALUES (%s, 'en_curso', %s, NOW())
+            ON DUPLICATE KEY UPDATE estado = 'en_curso', parametros = VALUES(parametros), iniciado_en = NOW()
+        """, (nombre, json.dumps(parametros)))
+        if reiniciar:
+            cursor.execute("""
+                UPDATE backfill_checkpoint
+                SET ultimo_id = 0, procesados = 0, actualizados = 0, errores = 0
+                WHERE nombre = %s
+            """, (nombre,))
+        cursor.execute("SELECT ultimo_id FROM backfill_checkpoint WHERE nombre = %s", (nombre,))
+        ultimo_id = cursor.fetchone()[0]
+        cnx.commit()
+        cursor.close()
+        return ultimo_id
+    finally:
+        cnx.close()
+
+
+def _avanzar_checkpoint(nombre: str, ultimo_id: int, procesados: int, actualizados: int,
+                        errores: int, estado: Optional[str] = None) -> None:
+    cnx = get_db_connection()
+    if cnx is None:
+        print(f"[Backfill] ERROR: no se pudo guardar el checkpoint en id {ultimo_id}")
+        return
+    try:
+        cursor = cnx.cursor()
+        cursor.execute("""
+            UPDATE backfill_checkpoint
+            SET ultimo_id = GREATEST(ultimo_id, %s),
+                procesados = procesados + %s,
+                actualizados = actualizados + %s,
+                errores = errores + %s,
+                estado = COALESCE(%s, estado)
+            WHERE nombre = %s
+        """, (ultimo_id, procesados, actualizados, errores, estado, nombre))
+        cnx.commit()
+        cursor.close()
+    finally:
+        cnx.close()
+
+
+# ============================================================================
+# LOTES
+# ============================================================================
+
+def _seleccionar_lote(desde_id: int, lote: int, reprocesar_dias: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Leads con id > desde_id sin analisis (o con analisis mas antiguo que
+    reprocesar_dias). Se excluyen los que tienen su job gemini pendiente.
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        raise RuntimeError("No se pudo conectar a la BD")
+
+    condicion = "ia_procesado IS NULL"
+    params: List[Any] = [desde_id]
+    if reprocesar_dias is not None:
+        condicion = "(ia_procesado IS NULL OR ia_procesado < NOW() - INTERVAL %s DAY)"
+        params.append(int(reprocesar_dias))
+    params.append(lote)
+
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT id, empresa, ruc_dni, treq_requerimiento, origen
+            FROM WIX
+            WHERE id > %s
+              AND {condicion}
+              AND NOT EXISTS (
+                  SELECT 1 FROM lead_jobs j
+                  WHERE j.record_id = WIX.id
+                    AND j.etapa = 'gemini'
+                    AND j.estado IN ('pendiente', 'en_proceso')
+              )
+            ORDER BY id
+            LIMIT %s
+        """, tuple(params))
+        leads = cursor.fetchall()
+        cursor.close()
+        return leads
+    finally:
+        cnx.close()
+
+
+def _clave_cliente(lead: Dict[str, Any]) -> Optional[str]:
+    """Clave de deduplicacion: RUC/DNI si es valido, si no el nombre normalizado."""
+    ruc = re.sub(r"\D", "", str(lead.get("ruc_dni") or ""))
+    if len(ruc) in (8, 11):
+        return f"ruc:{ruc}"
+    empresa = (lead.get("empresa") or "").strip()
+    if empresa:
+        return f"empresa:{normalizar_nombre_empresa(empresa)}"
+    return None
+
+
+def procesar_lote(leads: List[Dict[str, Any]], gateway, executor: ThreadPoolExecutor) -> Dict[str, Any]:
+    """
+    Analiza un lote: una consulta de cliente por clave unica y un
+    analizar_requerimiento por lead, todo en el executor. Guarda con un UPDATE por lote.
+    """
+    start_time = time.time()
+
+    # Primer lead de cada clave: sus datos se usan para la consulta compartida
+    representantes: Dict[str, Dict[str, Any]] = {}
+    for lead in leads:
+        clave = _clave_cliente(lead)
+        if clave and clave not in representantes:
+            representantes[clave] = lead
+
+    futuros_cliente = {
+        clave: executor.submit(
+            buscar_datos_cliente, gateway,
+            (lead.get("empresa") or "").strip(), (lead.get("ruc_dni") or "").strip()
+        )
+        for clave, lead in representantes.items()
+    }
+    futuros_requerimiento = {}
+    for lead in leads:
+        args = args_requerimiento(lead)
+        if args:
+            futuros_requerimiento[lead["id"]] = executor.submit(
+                llamar_funcion, gateway, "analizar_requerimiento", args
+            )
+
+    resultados = []
+    omitidos = 0
+    fallidos: List[int] = []
+    for lead in leads:
+        clave = _clave_cliente(lead)
+        if clave is None and lead["id"] not in futuros_requerimiento:
+            omitidos += 1
+            continue
+
+        try:
+            functions_called = list(futuros_cliente[clave].result()) if clave else []
+            if lead["id"] in futuros_requerimiento:
+                functions_called.append(futuros_requerimiento[lead["id"]].result())
+        except Exception as e:
+            print(f"[Backfill] ERROR analizando lead {lead['id']}: {e}")
+            fallidos.append(lead["id"])
+            continue
+
+        response = respuesta_determinista(functions_called, gateway.get_gateway_name(), start_time)
+        resultado = procesar_resultados_gemini(response)
+        if debe_guardarse(resultado):
+            resultados.append((lead["id"], resultado))
+        else:
+            fallidos.append(lead["id"])
+
+    actualizados = actualizar_leads_en_bd(resultados)
+    if resultados and not actualizados:
+        fallidos.extend(lead_id for lead_id, _ in resultados)
+
+    return {
+        "procesados": len(leads),
+        "actualizados": actualizados,
+        "omitidos": omitidos,
+        "errores": len(fallidos),
+        "ids_fallidos": sorted(fallidos),
+        "consultas_cliente": len(representantes),
+        "ruc_deduplicados": sum(1 for lead in leads if _clave_cliente(lead)) - len(representantes),
+        "tiempo_ms": int((time.time() - start_time) * 1000)
+    }
+
+
+def ejecutar_backfill(nombre: str = "gemini", lote: int = BACKFILL_LOTE,
+                      concurrencia: int = BACKFILL_CONCURRENCIA, por_minuto: int = BACKFILL_POR_MINUTO,
+                      max_leads: Optional[int] = None, reprocesar_dias: Optional[int] = None,
+                      reiniciar: bool = False) -> Dict[str, Any]:
+    """
+    Recorre los leads pendientes por lotes desde el ultimo checkpoint.
+
+    Returns:
+        Dict con los totales de esta ejecucion
+    """
+    if not _en_curso.acquire(blocking=False):
+        return {"success": False, "error": "Ya hay un backfill en curso en este proceso"}
+
+    # GET_LOCK vive en la sesion: la conexion queda tomada durante la corrida
+    cnx_lock = get_db_connection()
+    try:
+        if cnx_lock is None:
+            raise RuntimeError("No se pudo conectar a la BD")
+        cursor_lock = cnx_lock.cursor()
+        cursor_lock.execute("SELECT GET_LOCK(%s, 0)", (_nombre_lock(nombre),))
+        obtenido = cursor_lock.fetchone()[0] == 1
+    except Exception as e:
+        if cnx_lock is not None:
+            cnx_lock.close()
+        _en_curso.release()
+        return {"success": False, "error": f"No se pudo tomar el lock del backfill: {e}"}
+    if not obtenido:
+        cnx_lock.close()
+        _en_curso.release()
+        return {"success": False, "error": f"Ya hay un backfill '{nombre}' en curso en otro proceso"}
+
+    try:
+        return _ejecutar_con_lock(nombre, lote, concurrencia, por_minuto, max_leads, reprocesar_dias, reiniciar)
+    finally:
+        try:
+            cursor_lock.execute("SELECT RELEASE_LOCK(%s)", (_nombre_lock(nombre),))
+            cursor_lock.fetchone()
+            cursor_lock.close()
+        except Exception as e:
+            print(f"[Backfill] No se pudo liberar el lock de {nombre}: {e}")
+        cnx_lock.close()
+        _en_curso.release()
+
+
+def _ejecutar_con_lock(nombre: str, lote: int, concurrencia: int, por_minuto: int,
+                       max_leads: Optional[int], reprocesar_dias: Optional[int],
+                       reiniciar: bool) -> Dict[str, Any]:
+    _detener.clear()
+    parametros = {
+        "lote": lote, "concurrencia": concurrencia, "por_minuto": por_minuto,
+        "max_leads": max_leads, "reprocesar_dias": reprocesar_dias
+    }
+    totales = {"procesados": 0, "actualizados": 0, "omitidos": 0, "errores": 0,
+               "consultas_cliente": 0, "ruc_deduplicados": 0, "lotes": 0}
+    estado_final = "completado"
+
+    try:
+        ultimo_id = _iniciar_checkpoint(nombre, reiniciar, parametros)
+        print(f"[Backfill] {nombre}: iniciando desde id {ultimo_id} {parametros}")
+        # La ejecucion sigue avanzando, pero el checkpoint se queda antes del primer fallo
+        posicion = ultimo_id
+        primer_fallido: Optional[int] = None
+
+        gateway = _GatewayLimitado(GatewayLeads(), _LimitadorTasa(por_minuto))
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrencia), thread_name_prefix="backfill") as executor:
+            while True:
+                if _detener.is_set():
+                    estado_final = "detenido"
+                    break
+
+                restantes = None if max_leads is None else max_leads - totales["procesados"]
+                if restantes is not None and restantes <= 0:
+                    estado_final = "detenido"
+                    break
+
+                leads = _seleccionar_lote(posicion, min(lote, restantes) if restantes else lote, reprocesar_dias)
+                if not leads:
+                    break
+
+                resumen = procesar_lote(leads, gateway, executor)
+                posicion = leads[-1]["id"]
+                if primer_fallido is None and resumen["ids_fallidos"]:
+                    primer_fallido = resumen["ids_fallidos"][0]
+                ultimo_id = posicion if primer_fallido is None else primer_fallido - 1
+                _avanzar_checkpoint(nombre, ultimo_id, resumen["procesados"],
+                                    resumen["actualizados"], resumen["errores"])
+
+                totales["lotes"] += 1
+                for campo in ("procesados", "actualizados", "omitidos", "errores",
+                              "consultas_cliente", "ruc_deduplicados"):
+                    totales[campo] += resumen[campo]
+
+                print(f"[Backfill] {nombre}: lote hasta id {posicion} (checkpoint {ultimo_id}) -> {resumen}")
+
+        _avanzar_checkpoint(nombre, ultimo_id, 0, 0, 0, estado=estado_final)
+        print(f"[Backfill] {nombre}: {estado_final} {totales}")
+        return {"success": True, "estado": estado_final, "ultimo_id": ultimo_id, **totales}
+
+    except Exception as e:
+        print(f"[Backfill] ERROR en {nombre}: {e}")
+        try:
+            _avanzar_checkpoint(nombre, 0, 0, 0, 0, estado="error")
+        except Exception:
+            pass
+        return {"success": False, "error": str(e), **totales}
+
+
+def backfill_en_curso(nombre: str = "gemini") -> bool:
+    """True si algun proceso tiene el lock del backfill `nombre`."""
+    if _en_curso.locked():
+        return True
+    cnx = get_db_connection()
+    if cnx is None:
+        return False
+    try:
+        cursor = cnx.cursor()
+        cursor.execute("SELECT IS_USED_LOCK(%s)", (_nombre_lock(nombre),))
+        en_uso = cursor.fetchone()[0] is not None
+        cursor.close()
+        return en_uso
+    finally:
+        cnx.close()
+
+
+def iniciar_backfill_en_segundo_plano(**kwargs) -> bool:
+    """
+    Lanza ejecutar_backfill en un hilo daemon. False si ya hay uno en curso
+    (en cualquier proceso); el GET_LOCK de la corrida decide si dos llegan a la vez.
+    """
+    if backfill_en_curso(kwargs.get("nombre", "gemini")):
+        return False
+    hilo = threading.Thread(target=ejecutar_backfill, kwargs=kwargs, name="backfill-gemini", daemon=True)
+    hilo.start()
+    return True
+
+
+def detener_backfill() -> bool:
+    """Pide detener la ejecucion en curso al terminar el lote actual."""
+    if not _en_curso.locked():
+        return False
+    _detener.set()
+    return True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Reanalisis masivo de leads de WIX")
+    parser.add_argument("--nombre", default="gemini", help="Nombre del checkpoint")
+    parser.add_argument("--lote", type=int, default=BACKFILL_LOTE)
+    parser.add_argument("--concurrencia", type=int, default=BACKFILL_CONCURRENCIA)
+    parser.add_argument("--por-minuto", type=int, default=BACKFILL_POR_MINUTO,
+                        help="Maximo de llamadas a funciones con Gemini por minuto")
+    parser.add_argument("--max-leads", type=int, default=None)
+    parser.add_argument("--reprocesar-dias", type=int, default=None,
+                        help="Incluye leads analizados hace mas de N dias")
+    parser.add_argument("--reiniciar", action="store_true", help="Empieza desde el primer lead")
+
+    args = parser.parse_args(argv)
+    resultado = ejecutar_backfill(
+        nombre=args.nombre,
+        lote=args.lote,
+        concurrencia=args.concurrencia,
+        por_minuto=args.por_minuto,
+        max_leads=args.max_leads,
+        reprocesar_dias=args.reprocesar_dias,
+        reiniciar=args.reiniciar
+    )
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    return 0 if resultado.get("success") else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
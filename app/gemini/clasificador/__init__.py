@@ -0,0 +1,39 @@
+"""
+Clasificador local de requerimientos (compra_producto / servicio_tecnico)
+
+Modelo lineal de pesos por palabra y bigrama que se consulta antes de Gemini
+en analizar_requerimiento. Solo los textos ambiguos (por debajo del umbral
+de confianza) se envian a Gemini.
+
+Entrenamiento y evaluacion offline:
+    python -m app.gemini.clasificador.entrenamiento entrenar
+    python -m app.gemini.clasificador.entrenamiento evaluar
+"""
+
+try:
+    from app.gemini.clasificador.modelo import (
+        ModeloRequerimientos,
+        clasificar_requerimiento,
+        obtener_modelo,
+        recargar_modelo,
+        obtener_estadisticas_clasificador,
+        CLASIFICADOR_UMBRAL
+    )
+except ImportError:
+    from gemini.clasificador.modelo import (
+        ModeloRequerimientos,
+        clasificar_requerimiento,
+        obtener_modelo,
+        recargar_modelo,
+        obtener_estadisticas_clasificador,
+        CLASIFICADOR_UMBRAL
+    )
+
+__all__ = [
+    'ModeloRequerimientos',
+    'clasificar_requerimiento',
+    'obtener_modelo',
+    'recargar_modelo',
+    'obtener_estadisticas_clasificador',
+    'CLASIFICADOR_UMBRAL'
+]
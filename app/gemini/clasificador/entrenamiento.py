@@ -0,0 +1,191 @@
+"""
+Entrenamiento y evaluacion offline del clasificador local de requerimientos
+
+Usa como etiquetas las clasificaciones de Gemini guardadas en WIX
+(ia_tipo_requerimiento con ia_tipo_fuente NULL o 'gemini'; las etiquetas
+puestas por el propio clasificador local se excluyen).
+
+Uso:
+    python -m app.gemini.clasificador.entrenamiento entrenar [--salida RUTA] [--min-frecuencia 2]
+    python -m app.gemini.clasificador.entrenamiento evaluar [--pliegues 5] [--umbral 0.85]
+                                                           [--latencia-gemini-ms 1800]
+                                                           [--costo-llamada 0.00015]
+                                                           [--modelo-actual]
+"""
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+try:
+    from app.db import get_db_connection
+    from app.gemini.clasificador.modelo import (
+        ModeloRequerimientos, RUTA_MODELO, CLASIFICADOR_UMBRAL, SERVICIO, COMPRA
+    )
+except ImportError:
+    from db import get_db_connection
+    from gemini.clasificador.modelo import (
+        ModeloRequerimientos, RUTA_MODELO, CLASIFICADOR_UMBRAL, SERVICIO, COMPRA
+    )
+
+
+# Latencia y costo estimados de una llamada de clasificacion a Gemini
+# (prompt de ~250 tokens y respuesta de ~80); se pueden ajustar por parametro
+LATENCIA_GEMINI_MS = 1800
+COSTO_LLAMADA_USD = 0.00015
+
+UMBRALES_BARRIDO = [0.70, 0.80, 0.85, 0.90, 0.95]
+
+
+def cargar_ejemplos() -> List[Tuple[str, str]]:
+    """Pares (treq_requerimiento, ia_tipo_requerimiento) etiquetados por Gemini."""
+    cnx = get_db_connection()
+    if cnx is None:
+        raise RuntimeError("No se pudo conectar a la BD")
+
+    try:
+        cursor = cnx.cursor()
+        cursor.execute("""
+            SELECT treq_requerimiento, ia_tipo_requerimiento
+            FROM WIX
+            WHERE ia_tipo_requerimiento IN (%s, %s)
+              AND (ia_tipo_fuente IS NULL OR ia_tipo_fuente = 'gemini')
+              AND treq_requerimiento IS NOT NULL
+              AND treq_requerimiento <> ''
+            ORDER BY id
+        """, (SERVICIO, COMPRA))
+        ejemplos = [(row[0], row[1]) for row in cursor.fetchall()]
+        cursor.close()
+        return ejemplos
+    finally:
+        cnx.close()
+
+
+def _evaluar_predicciones(ejemplos, predicciones, umbral, latencia_gemini_ms, costo_llamada) -> Dict[str, Any]:
+    total = len(ejemplos)
+    cubiertos = 0
+    acuerdos = 0
+    matriz = {SERVICIO: {SERVICIO: 0, COMPRA: 0}, COMPRA: {SERVICIO: 0, COMPRA: 0}}
+
+    for (_, etiqueta), prediccion in zip(ejemplos, predicciones):
+        if not prediccion["features"] or prediccion["probabilidad"] < umbral:
+            continue
+        cubiertos += 1
+        matriz[etiqueta][prediccion["tipo"]] += 1
+        if prediccion["tipo"] == etiqueta:
+            acuerdos += 1
+
+    return {
+        "umbral": umbral,
+        "total": total,
+        "resueltos_localmente": cubiertos,
+        "cobertura": round(cubiertos / total, 4) if total else 0.0,
+        # Acuerdo con Gemini solo sobre lo que se resolveria localmente
+        "acuerdo_local": round(acuerdos / cubiertos, 4) if cubiertos else 0.0,
+        # Acuerdo del flujo hibrido (lo no cubierto sigue yendo a Gemini)
+        "acuerdo_hibrido": round((acuerdos + total - cubiertos) / total, 4) if total else 0.0,
+        "matriz_confusion": matriz,
+        "llamadas_gemini_evitadas": cubiertos,
+        "latencia_ahorrada_s": round(cubiertos * latencia_gemini_ms / 1000, 1),
+        "costo_ahorrado_usd": round(cubiertos * costo_llamada, 4),
+    }
+
+
+def evaluar(ejemplos: List[Tuple[str, str]], pliegues: int = 5, umbral: float = CLASIFICADOR_UMBRAL,
+            latencia_gemini_ms: float = LATENCIA_GEMINI_MS, costo_llamada: float = COSTO_LLAMADA_USD,
+            modelo_actual: bool = False, min_frecuencia: int = 2) -> Dict[str, Any]:
+    """
+    Validacion cruzada por pliegues (o evaluacion del modelo guardado con
+    modelo_actual=True). Reporta acuerdo con Gemini, cobertura y ahorro.
+    """
+    predicciones: List[Dict[str, Any]] = [None] * len(ejemplos)
+
+    if modelo_actual:
+        modelo = ModeloRequerimientos.cargar(RUTA_MODELO)
+        for i, (texto, _) in enumerate(ejemplos):
+            predicciones[i] = modelo.predecir(texto)
+    else:
+        for pliegue in range(pliegues):
+            entrenamiento = [e for i, e in enumerate(ejemplos) if i % pliegues != pliegue]
+            modelo = ModeloRequerimientos.entrenar(entrenamiento, min_frecuencia=min_frecuencia)
+            for i, (texto, _) in enumerate(ejemplos):
+                if i % pliegues == pliegue:
+                    predicciones[i] = modelo.predecir(texto)
+
+    # Latencia de prediccion medida sobre una pasada completa del ultimo modelo
+    inicio = time.perf_counter()
+    for texto, _ in ejemplos:
+        modelo.predecir(texto)
+    latencia_local_ms = (time.perf_counter() - inicio) * 1000 / len(ejemplos) if ejemplos else 0.0
+
+    resultado = _evaluar_predicciones(ejemplos, predicciones, umbral, latencia_gemini_ms, costo_llamada)
+    resultado["latencia_local_ms"] = round(latencia_local_ms, 4)
+    resultado["latencia_gemini_ms_estimada"] = latencia_gemini_ms
+    resultado["barrido_umbral"] = [
+        {k: v for k, v in _evaluar_predicciones(ejemplos, predicciones, u, latencia_gemini_ms, costo_llamada).items()
+         if k in ("umbral", "cobertura", "acuerdo_local", "acuerdo_hibrido")}
+        for u in UMBRALES_BARRIDO
+    ]
+    return resultado
+
+
+def _imprimir_evaluacion(r: Dict[str, Any]) -> None:
+    print(f"Ejemplos etiquetados por Gemini: {r['total']}")
+    print(f"Umbral: {r['umbral']}")
+    print(f"Resueltos localmente: {r['resueltos_localmente']} ({r['cobertura'] * 100:.1f}%)")
+    print(f"Acuerdo con Gemini (resueltos localmente): {r['acuerdo_local'] * 100:.1f}%")
+    print(f"Acuerdo con Gemini (flujo hibrido): {r['acuerdo_hibrido'] * 100:.1f}%")
+    print(f"Matriz (fila=Gemini, columna=local): {r['matriz_confusion']}")
+    print(f"Latencia local: {r['latencia_local_ms']} ms vs Gemini ~{r['latencia_gemini_ms_estimada']} ms")
+    print(f"Llamadas a Gemini evitadas: {r['llamadas_gemini_evitadas']}")
+    print(f"Latencia ahorrada: {r['latencia_ahorrada_s']} s | Costo ahorrado: ${r['costo_ahorrado_usd']}")
+    print("Barrido de umbral:")
+    for fila in r["barrido_umbral"]:
+        print(f"  {fila['umbral']:.2f}  cobertura={fila['cobertura'] * 100:5.1f}%  "
+              f"acuerdo_local={fila['acuerdo_local'] * 100:5.1f}%  acuerdo_hibrido={fila['acuerdo_hibrido'] * 100:5.1f}%")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Clasificador local de requerimientos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_entrenar = sub.add_parser("entrenar", help="Entrena con el historico de WIX y guarda el modelo")
+    p_entrenar.add_argument("--salida", default=RUTA_MODELO)
+    p_entrenar.add_argument("--min-frecuencia", type=int, default=2)
+
+    p_evaluar = sub.add_parser("evaluar", help="Evalua contra las etiquetas de Gemini")
+    p_evaluar.add_argument("--pliegues", type=int, default=5)
+    p_evaluar.add_argument("--umbral", type=float, default=CLASIFICADOR_UMBRAL)
+    p_evaluar.add_argument("--latencia-gemini-ms", type=float, default=LATENCIA_GEMINI_MS)
+    p_evaluar.add_argument("--costo-llamada", type=float, default=COSTO_LLAMADA_USD)
+    p_evaluar.add_argument("--min-frecuencia", type=int, default=2)
+    p_evaluar.add_argument("--modelo-actual", action="store_true",
+                           help="Evalua el modelo guardado en lugar de validacion cruzada")
+
+    args = parser.parse_args(argv)
+    ejemplos = cargar_ejemplos()
+    if not ejemplos:
+        print("No hay leads etiquetados por Gemini en WIX")
+        return 1
+
+    if args.comando == "entrenar":
+        modelo = ModeloRequerimientos.entrenar(ejemplos, min_frecuencia=args.min_frecuencia)
+        modelo.guardar(args.salida)
+        print(f"Modelo guardado en {args.salida}: {modelo.meta}")
+        return 0
+
+    _imprimir_evaluacion(evaluar(
+        ejemplos,
+        pliegues=args.pliegues,
+        umbral=args.umbral,
+        latencia_gemini_ms=args.latencia_gemini_ms,
+        costo_llamada=args.costo_llamada,
+        modelo_actual=args.modelo_actual,
+        min_frecuencia=args.min_frecuencia
+    ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Modelo de clasificacion local de requerimientos
+
+Cada texto se convierte en palabras normalizadas y bigramas; cada feature
+tiene un peso (positivo = servicio_tecnico, negativo = compra_producto).
+La suma de pesos mas el sesgo pasa por una sigmoide y da la probabilidad
+de servicio_tecnico. Los pesos se aprenden offline como log-ratios de
+frecuencias (Naive Bayes) sobre las etiquetas que Gemini guardo en WIX.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+import unicodedata
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from app.gemini.core.types import AnalizarRequerimientoResult
+except ImportError:
+    from gemini.core.types import AnalizarRequerimientoResult
+
+
+RUTA_MODELO_DEFECTO = os.path.join(os.path.dirname(__file__), "modelo_requerimientos.json")
+RUTA_MODELO = os.getenv("CLASIFICADOR_MODELO", RUTA_MODELO_DEFECTO)
+CLASIFICADOR_HABILITADO = os.getenv("CLASIFICADOR_HABILITADO", "true").lower() == "true"
+# Probabilidad minima de la clase ganadora para no consultar a Gemini
+CLASIFICADOR_UMBRAL = float(os.getenv("CLASIFICADOR_UMBRAL", 0.85))
+
+SERVICIO = "servicio_tecnico"
+COMPRA = "compra_producto"
+
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los",
+    "me", "mi", "para", "por", "que", "se", "su", "sus", "un", "una", "unos",
+    "unas", "y", "o", "u", "e", "le", "les", "nos", "yo", "tu", "favor", "hola",
+    "buenos", "buenas", "dias", "tardes", "noches", "saludos", "gracias",
+    "quisiera", "solicito", "necesito", "requiero", "deseo", "quiero",
+    "muy", "mas", "este", "esta", "estos", "estas", "como", "sobre",
+}
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minusculas, sin tildes y solo letras/numeros separados por espacio."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", texto).strip()
+
+
+def _raiz(palabra: str) -> str:
+    # Plurales simples: calibraciones -> calibracion, balanzas -> balanza
+    if palabra.endswith("ciones"):
+        return palabra[:-6] + "cion"
+    if len(palabra) > 4 and palabra.endswith("s") and not palabra.endswith("ss"):
+        return palabra[:-1]
+    return palabra
+
+
+def extraer_features(texto: str) -> List[str]:
+    """Palabras (sin stopwords) y bigramas de palabras consecutivas."""
+    palabras = [
+        _raiz(p) for p in normalizar_texto(texto).split()
+        if len(p) > 1 and p not in STOPWORDS and not p.isdigit()
+    ]
+    bigramas = [f"{a}_{b}" for a, b in zip(palabras, palabras[1:])]
+    return palabras + bigramas
+
+
+def _sigmoide(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class ModeloRequerimientos:
+    """Pesos por feature + sesgo. Score > 0 favorece servicio_tecnico."""
+
+    def __init__(self, pesos: Dict[str, float], sesgo: float = 0.0, meta: Optional[Dict[str, Any]] = None):
+        self.pesos = pesos
+        self.sesgo = sesgo
+        self.meta = meta or {}
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_MODELO) -> "ModeloRequerimientos":
+        with open(ruta, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("pesos", {}), data.get("sesgo", 0.0), data.get("meta", {}))
+
+    def guardar(self, ruta: str = RUTA_MODELO) -> None:
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": self.meta,
+                "sesgo": round(self.sesgo, 6),
+                "pesos": {k: round(v, 6) for k, v in sorted(self.pesos.items())}
+            }, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def entrenar(cls, ejemplos: List[Tuple[str, str]], alpha: float = 1.0,
+                 min_frecuencia: int = 2) -> "ModeloRequerimientos":
+        """
+        Entrena con (texto, etiqueta). Peso = log-ratio suavizado de la
+        frecuencia de la feature en servicio_tecnico vs compra_producto.
+        """
+        conteo = {SERVICIO: Counter(), COMPRA: Counter()}
+        documentos = Counter()
+
+        for texto, etiqueta in ejemplos:
+            if etiqueta not in conteo:
+                continue
+            documentos[etiqueta] += 1
+            # Presencia por documento (no frecuencia): textos cortos y repetitivos
+            conteo[etiqueta].update(set(extraer_features(texto)))
+
+        total_por_feature = conteo[SERVICIO] + conteo[COMPRA]
+        vocabulario = [f for f, n in total_por_feature.items() if n >= min_frecuencia]
+
+        n_servicio = documentos[SERVICIO]
+        n_compra = documentos[COMPRA]
+        pesos = {}
+        for feature in vocabulario:
+            p_servicio = (conteo[SERVICIO][feature] + alpha) / (n_servicio + 2 * alpha)
+            p_compra = (conteo[COMPRA][feature] + alpha) / (n_compra + 2 * alpha)
+            peso = math.log(p_servicio / p_compra)
+            if abs(peso) >= 0.05:
+                pesos[feature] = peso
+
+        sesgo = math.log((n_servicio + alpha) / (n_compra + alpha))
+
+        return cls(pesos, sesgo, {
+            "version": time.strftime("%Y%m%d%H%M%S"),
+            "ejemplos": {SERVICIO: n_servicio, COMPRA: n_compra},
+            "alpha": alpha,
+            "min_frecuencia": min_frecuencia,
+            "features": len(pesos)
+        })
+
+    def predecir(self, texto: str) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict con tipo, probabilidad (de la clase ganadora),
+            features reconocidas ordenadas por aporte
+        """
+        usadas = [(f, self.pesos[f]) for f in set(extraer_features(texto)) if f in self.pesos]
+        score = self.sesgo + sum(peso for _, peso in usadas)
+        p_servicio = _sigmoide(score)
+        tipo = SERVICIO if p_servicio >= 0.5 else COMPRA
+        usadas.sort(key=lambda x: abs(x[1]), reverse=True)
+        return {
+            "tipo": tipo,
+            "probabilidad": p_servicio if tipo == SERVICIO else 1.0 - p_servicio,
+            "features": [f for f, _ in usadas]
+        }
+
+
+_modelo: Optional[ModeloRequerimientos] = None
+_modelo_lock = threading.Lock()
+_contadores = {"locales": 0, "derivados_gemini": 0, "sin_modelo": 0}
+
+
+def obtener_modelo() -> Optional[ModeloRequerimientos]:
+    """Modelo cargado una vez por proceso (None si el archivo no existe o es invalido)."""
+    global _modelo
+    if _modelo is None:
+        with _modelo_lock:
+            if _modelo is None:
+                try:
+                    _modelo = ModeloRequerimientos.cargar(RUTA_MODELO)
+                except Exception as e:
+                    print(f"[Clasificador] No se pudo cargar el modelo {RUTA_MODELO}: {e}")
+                    return None
+    return _modelo
+
+
+def recargar_modelo() -> Optional[ModeloRequerimientos]:
+    global _modelo
+    with _modelo_lock:
+        _modelo = None
+    return obtener_modelo()
+
+
+def clasificar_requerimiento(texto: str, umbral: Optional[float] = None) -> Optional[AnalizarRequerimientoResult]:
+    """
+    Clasifica localmente si la confianza supera el umbral.
+
+    Returns:
+        AnalizarRequerimientoResult (fuente="local") o None si el texto es
+        ambiguo y debe consultarse a Gemini
+    """
+    if not CLASIFICADOR_HABILITADO:
+        return None
+
+    modelo = obtener_modelo()
+    if modelo is None:
+        _contadores["sin_modelo"] += 1
+        return None
+
+    umbral = CLASIFICADOR_UMBRAL if umbral is None else umbral
+    prediccion = modelo.predecir(texto)
+
+    if not prediccion["features"] or prediccion["probabilidad"] < umbral:
+        _contadores["derivados_gemini"] += 1
+        return None
+
+    _contadores["locales"] += 1
+    probabilidad = prediccion["probabilidad"]
+    keywords = prediccion["features"][:5]
+
+    return {
+        "success": True,
+        "tipo_requerimiento": prediccion["tipo"],
+        "confianza": "alta" if probabilidad >= 0.95 else "media",
+        "keywords": keywords,
+        "razonamiento": f"Clasificador local (p={probabilidad:.2f}): {', '.join(keywords)}",
+        "fuente": "local"
+    }
+
+
+def obtener_estadisticas_clasificador() -> Dict[str, Any]:
+    modelo = obtener_modelo()
+    total = _contadores["locales"] + _contadores["derivados_gemini"]
+    return {
+        **_contadores,
+        "habilitado": CLASIFICADOR_HABILITADO,
+        "umbral": CLASIFICADOR_UMBRAL,
+        "tasa_local": round(_contadores["locales"] / total, 4) if total else 0.0,
+        "modelo": modelo.meta if modelo else None
+    }
@@ -13,8 +13,17 @@ GEMINI_CONFIG = {
     "max_output_tokens": 2048,
     "top_p": 0.95,
     "top_k": 40,
+    # Llamadas a funciones de un mismo turno que se ejecutan en paralelo
+    "tool_workers": int(os.getenv("GEMINI_TOOL_WORKERS", 4)),
+    # Segundos maximos por llamada a funcion dentro de un turno
+    "tool_timeout": float(os.getenv("GEMINI_TOOL_TIMEOUT", 45)),
 }
 
+# Modo por defecto de analizar_lead_automatico:
+#   - determinista: el flujo de SYSTEM_INSTRUCTION se ejecuta en codigo (sin rondas LLM)
+#   - llm: Gemini decide que funciones llamar (GatewayOrchestrator.chat)
+GEMINI_MODO_ANALISIS = os.getenv("GEMINI_MODO_ANALISIS", "determinista").lower()
+
 # Configuracion especial para clasificacion (temperatura baja)
 GEMINI_CONFIG_CLASIFICACION = {
     "temperature": 0.3,
@@ -29,6 +38,27 @@ SIEK_CONFIG = {
     "base_url": "https://apisiek.grupokossodo.com/mkt"
 }
 
+# Cache de consultas SIEK por RUC/DNI (memoria + tabla siek_cache)
+SIEK_CACHE_CONFIG = {
+    "ttl_encontrado": int(os.getenv("SIEK_CACHE_TTL", 7 * 24 * 3600)),
+    "ttl_no_encontrado": int(os.getenv("SIEK_CACHE_TTL_NEGATIVO", 24 * 3600)),
+    "max_items": int(os.getenv("SIEK_CACHE_MAX_ITEMS", 2000)),
+    "persistente": os.getenv("SIEK_CACHE_PERSISTENTE", "true").lower() == "true",
+}
+
+# Cache de buscar_info_empresa por nombre normalizado (memoria + tabla empresa_cache)
+# TTL en segundos segun la confianza del resultado
+EMPRESA_CACHE_CONFIG = {
+    "ttl_por_confianza": {
+        "alta": int(os.getenv("EMPRESA_CACHE_TTL_ALTA", 30 * 24 * 3600)),
+        "media": int(os.getenv("EMPRESA_CACHE_TTL_MEDIA", 7 * 24 * 3600)),
+        "baja": int(os.getenv("EMPRESA_CACHE_TTL_BAJA", 24 * 3600)),
+    },
+    "ttl_no_encontrado": int(os.getenv("EMPRESA_CACHE_TTL_NO_ENCONTRADO", 12 * 3600)),
+    "max_items": int(os.getenv("EMPRESA_CACHE_MAX_ITEMS", 2000)),
+    "persistente": os.getenv("EMPRESA_CACHE_PERSISTENTE", "true").lower() == "true",
+}
+
 # URL de Gemini API
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
 
@@ -0,0 +1,257 @@
+"""
+Cache para los tools del gateway de leads
+
+Dos capas:
+    - Memoria: LRU por proceso con TTL por entrada
+    - MySQL (opcional): tabla clave/valor compartida entre workers y reinicios
+
+Las consultas concurrentes por la misma clave se agrupan: solo una llama
+a la fuente (API SIEK, Gemini...) y las demas esperan su resultado.
+Cada cache lleva contadores de aciertos y fallos (ver obtener_estadisticas_caches).
+"""
+
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from app.db import get_db_connection
+except ImportError:
+    from db import get_db_connection
+
+
+# Registro de caches por nombre (para estadisticas e invalidacion)
+_CACHES: Dict[str, "CacheTTL"] = {}
+
+
+class TablaCacheMySQL:
+    """
+    Capa persistente sobre una tabla con columnas
+    (clave, valor JSON, expira_en, actualizado_en).
+    Los errores de BD se registran y se tratan como fallo de cache.
+    """
+
+    def __init__(self, tabla: str):
+        self.tabla = tabla
+
+    def leer(self, clave: str) -> Optional[Tuple[Any, int]]:
+        """Retorna (valor, segundos_restantes) o None si no existe o expiro."""
+        cnx = get_db_connection()
+        if cnx is None:
+            return None
+        try:
+            cursor = cnx.cursor()
+            cursor.execute(f"""
+                SELECT valor, TIMESTAMPDIFF(SECOND, NOW(), expira_en)
+                FROM {self.tabla}
+                WHERE clave = %s AND expira_en > NOW()
+            """, (clave,))
+            row = cursor.fetchone()
+            cursor.close()
+            if not row:
+                return None
+            return json.loads(row[0]), int(row[1])
+        except Exception as e:
+            print(f"[Cache] Error leyendo {self.tabla}: {e}")
+            return None
+        finally:
+            cnx.close()
+
+    def guardar(self, clave: str, valor: Any, ttl: int) -> None:
+        cnx = get_db_connection()
+        if cnx is None:
+            return
+        try:
+            cursor = cnx.cursor()
+            cursor.execute(f"""
+                INSERT INTO {self.tabla} (clave, valor, expira_en)
+                VALUES (%s, %s, DATE_ADD(NOW(), INTERVAL %s SECOND))
+                ON DUPLICATE KEY UPDATE valor = VALUES(valor), expira_en = VALUES(expira_en)
+            """, (clave, json.dumps(valor, ensure_ascii=False, default=str), int(ttl)))
+            cnx.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"[Cache] Error guardando en {self.tabla}: {e}")
+        finally:
+            cnx.close()
+
+    def borrar(self, clave: Optional[str] = None) -> int:
+        """Borra una clave (o todas si clave es None). Retorna filas borradas."""
+        cnx = get_db_connection()
+        if cnx is None:
+            return 0
+        try:
+            cursor = cnx.cursor()
+            if clave is None:
+                cursor.execute(f"DELETE FROM {self.tabla}")
+            else:
+                cursor.execute(f"DELETE FROM {self.tabla} WHERE clave = %s", (clave,))
+            borradas = cursor.rowcount
+            cnx.commit()
+            cursor.close()
+            return borradas
+        except Exception as e:
+            print(f"[Cache] Error borrando en {self.tabla}: {e}")
+            return 0
+        finally:
+            cnx.close()
+
+
+class _Vuelo:
+    """Carga en curso para una clave (agrupa llamadas concurrentes)."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.error: Optional[BaseException] = None
+        self.listo = False
+
+
+class CacheTTL:
+    """LRU en memoria con TTL por entrada, capa persistente opcional y singleflight."""
+
+    def __init__(self, nombre: str, max_items: int = 1000,
+                 persistencia: Optional[TablaCacheMySQL] = None, espera_maxima: int = 60,
+                 normalizar_clave: Optional[Callable[[str], str]] = None):
+        self.nombre = nombre
+        # Convierte el texto recibido por el endpoint de invalidacion en la clave interna
+        self.normalizar_clave = normalizar_clave or (lambda clave: clave)
+        self.max_items = max_items
+        self.persistencia = persistencia
+        self.espera_maxima = espera_maxima
+        self._items: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._en_vuelo: Dict[str, _Vuelo] = {}
+        self._lock = threading.Lock()
+        self._contadores = {
+            "hits_memoria": 0,
+            "hits_bd": 0,
+            "misses": 0,
+            "cargas": 0,
+            "esperas_agrupadas": 0,
+            "errores": 0,
+        }
+        _CACHES[nombre] = self
+
+    def _contar(self, contador: str) -> None:
+        with self._lock:
+            self._contadores[contador] += 1
+
+    def _get_memoria(self, clave: str) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._items.get(clave)
+            if item is None:
+                return False, None
+            valor, expira = item
+            if expira <= time.time():
+                del self._items[clave]
+                return False, None
+            self._items.move_to_end(clave)
+        # Copia: quien consulta puede modificar el resultado sin alterar el cache
+        return True, copy.deepcopy(valor)
+
+    def _set_memoria(self, clave: str, valor: Any, ttl: float) -> None:
+        valor = copy.deepcopy(valor)
+        with self._lock:
+            self._items[clave] = (valor, time.time() + ttl)
+            self._items.move_to_end(clave)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def obtener_o_calcular(self, clave: str, cargar: Callable[[], Tuple[Any, Optional[int]]]) -> Any:
+        """
+        Retorna el valor cacheado de `clave` o lo obtiene con `cargar`.
+
+        Args:
+            clave: clave ya normalizada
+            cargar: funcion sin argumentos que retorna (valor, ttl_segundos);
+                    ttl None o 0 significa "no cachear" (p. ej. errores o timeouts)
+        """
+        hit, valor = self._get_memoria(clave)
+        if hit:
+            self._contar("hits_memoria")
+            return valor
+
+        with self._lock:
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = _Vuelo()
+                self._en_vuelo[clave] = vuelo
+
+        if not lider:
+            self._contar("esperas_agrupadas")
+            vuelo.evento.wait(self.espera_maxima)
+            if vuelo.listo:
+                if vuelo.error is not None:
+                    raise vuelo.error
+                return copy.deepcopy(vuelo.valor)
+            # La carga del lider se demoro demasiado: consultar por cuenta propia
+            return cargar()[0]
+
+        try:
+            vuelo.valor = self._cargar_como_lider(clave, cargar)
+            return vuelo.valor
+        except BaseException as e:
+            vuelo.error = e
+            self._contar("errores")
+            raise
+        finally:
+            vuelo.listo = True
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            vuelo.evento.set()
+
+    def _cargar_como_lider(self, clave: str, cargar: Callable[[], Tuple[Any, Optional[int]]]) -> Any:
+        if self.persistencia is not None:
+            guardado = self.persistencia.leer(clave)
+            if guardado is not None:
+                valor, restante = guardado
+                self._contar("hits_bd")
+                self._set_memoria(clave, valor, restante)
+                return valor
+
+        self._contar("misses")
+        valor, ttl = cargar()
+        self._contar("cargas")
+
+        if ttl:
+            self._set_memoria(clave, valor, ttl)
+            if self.persistencia is not None:
+                self.persistencia.guardar(clave, valor, ttl)
+        return valor
+
+    def invalidar(self, clave: Optional[str] = None) -> Dict[str, Any]:
+        """Borra una clave (o todo el cache si clave es None) en ambas capas."""
+        with self._lock:
+            if clave is None:
+                en_memoria = len(self._items)
+                self._items.clear()
+            else:
+                en_memoria = 1 if self._items.pop(clave, None) is not None else 0
+
+        en_bd = self.persistencia.borrar(clave) if self.persistencia is not None else 0
+        return {"memoria": en_memoria, "bd": en_bd}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._contadores)
+            stats["items_memoria"] = len(self._items)
+            stats["max_items"] = self.max_items
+            stats["en_vuelo"] = len(self._en_vuelo)
+
+        consultas = stats["hits_memoria"] + stats["hits_bd"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits_memoria"] + stats["hits_bd"]) / consultas, 4) if consultas else 0.0
+        stats["persistente"] = self.persistencia.tabla if self.persistencia is not None else None
+        return stats
+
+
+def obtener_cache(nombre: str) -> Optional[CacheTTL]:
+    return _CACHES.get(nombre)
+
+
+def obtener_estadisticas_caches() -> Dict[str, Dict[str, Any]]:
+    """Contadores de todos los caches registrados en este proceso."""
+    return {nombre: cache.stats() for nombre, cache in _CACHES.items()}
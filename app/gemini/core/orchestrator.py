@@ -7,24 +7,48 @@ Implementa el patron Orchestrator para sistemas multi-dominio
 Basado en la arquitectura del sistema original TypeScript
 """
 
+import os
 import time
-import requests
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
 
 try:
     from app.gemini.core.base_gateway import BaseGateway
     from app.gemini.core.types import (
         Content, FunctionCall, FunctionResponse,
-        OrchestratorResponse, OrchestratorInfo, GeminiConfig
+        OrchestratorResponse, OrchestratorInfo, GeminiConfig, TurnMetadata
     )
     from app.gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION
+    from app.http_client import http_post
 except ImportError:
     from gemini.core.base_gateway import BaseGateway
     from gemini.core.types import (
         Content, FunctionCall, FunctionResponse,
-        OrchestratorResponse, OrchestratorInfo, GeminiConfig
+        OrchestratorResponse, OrchestratorInfo, GeminiConfig, TurnMetadata
     )
     from gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION
+    from http_client import http_post
+
+
+# Pool compartido por proceso para las llamadas a funciones de cada turno.
+# Una llamada que supera el timeout sigue ocupando su hilo hasta terminar,
+# pero el turno no la espera.
+_tool_executor: Optional[ThreadPoolExecutor] = None
+_tool_executor_pid: Optional[int] = None
+_tool_executor_lock = threading.Lock()
+
+
+def _get_tool_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _tool_executor, _tool_executor_pid
+    with _tool_executor_lock:
+        if _tool_executor is None or _tool_executor_pid != os.getpid():
+            _tool_executor = ThreadPoolExecutor(
+                max_workers=max(1, max_workers),
+                thread_name_prefix="gemini-tool"
+            )
+            _tool_executor_pid = os.getpid()
+        return _tool_executor
 
 
 class GatewayOrchestrator:
@@ -120,6 +144,7 @@ class GatewayOrchestrator:
 
             functions_called: List[FunctionCall] = []
             gateways_called: List[str] = []
+            turns: List[TurnMetadata] = []
             iterations = 0
 
             # Loop de Function Calling (maximo max_iterations iteraciones)
@@ -165,65 +190,34 @@ class GatewayOrchestrator:
                         "metadata": {
                             "executionTime": execution_time,
                             "iterations": iterations,
-                            "totalTokens": response.get("usageMetadata", {}).get("totalTokenCount")
+                            "totalTokens": response.get("usageMetadata", {}).get("totalTokenCount"),
+                            "toolTime": sum(t["wallTimeMs"] for t in turns),
+                            "turns": turns
                         }
                     }
 
-                # Ejecutar todas las llamadas a funciones
-                function_responses: List[Dict] = []
-
-                for fc in function_calls:
-                    function_name = fc.get("name", "")
-                    function_args = fc.get("args", {})
-
-                    print(f"[Orchestrator] Ejecutando funcion: {function_name}", function_args)
-
-                    try:
-                        # Buscar el gateway que tiene esta funcion
-                        gateway = self._find_gateway_for_function(function_name)
-
-                        if not gateway:
-                            raise Exception(f"No se encontro gateway para la funcion: {function_name}")
+                # Ejecutar las llamadas a funciones del turno en paralelo
+                # (functionResponse conserva el orden en que Gemini las pidio)
+                turn_results, turn_metadata = self._execute_function_calls(function_calls, iterations)
+                turns.append(turn_metadata)
 
-                        gateway_name = gateway.get_gateway_name()
-                        if gateway_name not in gateways_called:
-                            gateways_called.append(gateway_name)
-
-                        # Ejecutar la funcion
-                        result = gateway.execute(function_name, function_args)
-
-                        # Guardar la llamada con su resultado
-                        functions_called.append({
-                            "name": function_name,
-                            "args": function_args,
-                            "result": result
-                        })
-
-                        function_responses.append({
-                            "name": function_name,
-                            "response": result
-                        })
-
-                    except Exception as e:
-                        error_message = str(e)
-                        print(f"[Orchestrator] ERROR ejecutando {function_name}: {error_message}")
+                function_responses: List[Dict] = []
 
-                        error_result = {
-                            "success": False,
-                            "error": error_message
-                        }
+                for fc, (gateway_name, result) in zip(function_calls, turn_results):
+                    if gateway_name and gateway_name not in gateways_called:
+                        gateways_called.append(gateway_name)
 
-                        # Guardar la llamada fallida con su error
-                        functions_called.append({
-                            "name": function_name,
-                            "args": function_args,
-                            "result": error_result
-                        })
+                    # Guardar la llamada con su resultado (o su error)
+                    functions_called.append({
+                        "name": fc.get("name", ""),
+                        "args": fc.get("args", {}),
+                        "result": result
+                    })
 
-                        function_responses.append({
-                            "name": function_name,
-                            "response": error_result
-                        })
+                    function_responses.append({
+                        "name": fc.get("name", ""),
+                        "response": result
+                    })
 
                 # Agregar respuestas de funciones al historial
                 contents.append({
@@ -250,6 +244,87 @@ class GatewayOrchestrator:
                 "conversationHistory": []
             }
 
+    def _run_function(self, function_name: str, function_args: Dict[str, Any]) -> Tuple[Optional[str], Any, int]:
+        """Ejecuta una funcion en su gateway. Retorna (gateway, resultado, duracion_ms)"""
+        start = time.time()
+        gateway_name = None
+
+        print(f"[Orchestrator] Ejecutando funcion: {function_name}", function_args)
+
+        try:
+            # Buscar el gateway que tiene esta funcion
+            gateway = self._find_gateway_for_function(function_name)
+
+            if not gateway:
+                raise Exception(f"No se encontro gateway para la funcion: {function_name}")
+
+            gateway_name = gateway.get_gateway_name()
+            result = gateway.execute(function_name, function_args)
+
+        except Exception as e:
+            error_message = str(e)
+            print(f"[Orchestrator] ERROR ejecutando {function_name}: {error_message}")
+            result = {
+                "success": False,
+                "error": error_message
+            }
+
+        return gateway_name, result, int((time.time() - start) * 1000)
+
+    def _execute_function_calls(
+        self,
+        function_calls: List[FunctionCall],
+        iteration: int
+    ) -> Tuple[List[Tuple[Optional[str], Any]], TurnMetadata]:
+        """
+        Ejecuta las llamadas de un turno de forma concurrente (pool acotado)
+        con timeout por llamada. Los resultados respetan el orden de entrada.
+        """
+        turn_start = time.time()
+        timeout = self.config.get("tool_timeout", 45)
+        executor = _get_tool_executor(self.config.get("tool_workers", 4))
+
+        futures = [
+            executor.submit(self._run_function, fc.get("name", ""), fc.get("args", {}))
+            for fc in function_calls
+        ]
+        # Todas se envian a la vez: el limite de cada una se cuenta desde el inicio del turno
+        deadline = turn_start + timeout
+
+        results: List[Tuple[Optional[str], Any]] = []
+        calls = []
+
+        for fc, future in zip(function_calls, futures):
+            function_name = fc.get("name", "")
+            try:
+                gateway_name, result, duration_ms = future.result(timeout=max(0.0, deadline - time.time()))
+                calls.append({"name": function_name, "durationMs": duration_ms, "timedOut": False})
+            except FuturesTimeoutError:
+                future.cancel()
+                error_message = f"Timeout ejecutando {function_name} ({timeout}s)"
+                print(f"[Orchestrator] ERROR: {error_message}")
+                gateway_name = None
+                result = {"success": False, "error": error_message}
+                calls.append({
+                    "name": function_name,
+                    "durationMs": int((time.time() - turn_start) * 1000),
+                    "timedOut": True
+                })
+            results.append((gateway_name, result))
+
+        wall_time_ms = int((time.time() - turn_start) * 1000)
+        sum_calls_ms = sum(c["durationMs"] for c in calls)
+        print(f"[Orchestrator] Turno {iteration}: {len(function_calls)} funcion(es) en {wall_time_ms}ms "
+              f"(secuencial: {sum_calls_ms}ms)")
+
+        return results, {
+            "iteration": iteration,
+            "functions": len(function_calls),
+            "wallTimeMs": wall_time_ms,
+            "sumCallsMs": sum_calls_ms,
+            "calls": calls
+        }
+
     def _call_gemini_api(self, contents: List[Content], system_instruction: str) -> Dict:
         """Llama a la API de Gemini"""
         model = self.config.get("model", "gemini-2.0-flash-exp")
@@ -276,11 +351,11 @@ class GatewayOrchestrator:
                 "parts": [{"text": system_instruction}]
             }
 
-        response = requests.post(
+        response = http_post(
+            "gemini",
             url,
             json=request_body,
-            headers={"Content-Type": "application/json"},
-            timeout=30
+            headers={"Content-Type": "application/json"}
         )
 
         if not response.ok:
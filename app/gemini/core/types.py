@@ -94,11 +94,29 @@ class ChatOptions(TypedDict, total=False):
     systemInstruction: Optional[str]
 
 
+class ToolCallTiming(TypedDict, total=False):
+    """Duracion de una llamada a funcion dentro de un turno"""
+    name: str
+    durationMs: int
+    timedOut: bool
+
+
+class TurnMetadata(TypedDict, total=False):
+    """Tiempos de un turno con llamadas a funciones"""
+    iteration: int
+    functions: int
+    wallTimeMs: int
+    sumCallsMs: int
+    calls: List[ToolCallTiming]
+
+
 class OrchestratorMetadata(TypedDict, total=False):
     """Metadata de la respuesta del orchestrator"""
     totalTokens: Optional[int]
     executionTime: Optional[int]
     iterations: Optional[int]
+    toolTime: Optional[int]
+    turns: Optional[List[TurnMetadata]]
 
 
 class OrchestratorResponse(TypedDict, total=False):
@@ -124,6 +142,8 @@ class GeminiConfig(TypedDict, total=False):
     max_output_tokens: Optional[int]
     top_p: Optional[float]
     top_k: Optional[int]
+    tool_workers: Optional[int]
+    tool_timeout: Optional[float]
 
 
 class GenerationConfig(TypedDict, total=False):
@@ -168,6 +188,7 @@ class AnalizarRequerimientoResult(TypedDict, total=False):
     confianza: Literal["alta", "media", "baja"]
     keywords: List[str]
     razonamiento: str
+    fuente: Literal["local", "gemini"]
     error: Optional[str]
 
 
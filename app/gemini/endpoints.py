@@ -0,0 +1,199 @@
+"""
+Gemini Endpoints - Blueprint de administracion de los tools de leads
+
+- GET  /gemini/cache/stats               - Aciertos/fallos de cada cache de tools
+- POST /gemini/cache/{nombre}/invalidar  - Borra una clave (o todo) de un cache
+- GET  /gemini/clasificador/stats        - Requerimientos resueltos localmente vs derivados a Gemini
+- POST /gemini/clasificador/recargar     - Recarga el modelo tras reentrenarlo
+- POST /gemini/backfill                  - Inicia el reanalisis masivo de leads pendientes
+- GET  /gemini/backfill                  - Avance del reanalisis (checkpoint)
+- POST /gemini/backfill/detener          - Detiene el reanalisis al terminar el lote actual
+"""
+
+from flask import Blueprint, request, jsonify
+
+try:
+    # Importar los tools registra sus caches
+    import app.gemini.gateways.leads.tools  # noqa: F401
+    from app.gemini.core.cache import obtener_cache, obtener_estadisticas_caches
+    from app.gemini.clasificador import obtener_estadisticas_clasificador, recargar_modelo
+    from app.gemini.backfill import (
+        iniciar_backfill_en_segundo_plano, detener_backfill, leer_checkpoint,
+        BACKFILL_LOTE, BACKFILL_CONCURRENCIA, BACKFILL_POR_MINUTO
+    )
+except ImportError:
+    import gemini.gateways.leads.tools  # noqa: F401
+    from gemini.core.cache import obtener_cache, obtener_estadisticas_caches
+    from gemini.clasificador import obtener_estadisticas_clasificador, recargar_modelo
+    from gemini.backfill import (
+        iniciar_backfill_en_segundo_plano, detener_backfill, leer_checkpoint,
+        BACKFILL_LOTE, BACKFILL_CONCURRENCIA, BACKFILL_POR_MINUTO
+    )
+
+
+gemini_bp = Blueprint('gemini_bp', __name__)
+
+
+@gemini_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    GET /gemini/cache/stats
+
+    Contadores por cache (del proceso que atiende la peticion).
+    """
+    return jsonify({
+        'status': 'success',
+        'caches': obtener_estadisticas_caches()
+    }), 200
+
+
+@gemini_bp.route('/cache/<nombre>/invalidar', methods=['POST'])
+def invalidar_cache(nombre: str):
+    """
+    POST /gemini/cache/{nombre}/invalidar
+
+    Body JSON opcional:
+        - clave: clave a borrar (sin clave se vacia el cache completo).
+                 Se normaliza igual que en la consulta: para "empresa" basta
+                 el nombre tal como llega en el lead ("Acme S.A.C.")
+    """
+    cache = obtener_cache(nombre)
+    if cache is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cache {nombre} no existe'
+        }), 404
+
+    data = request.get_json(silent=True) or {}
+    clave = data.get('clave')
+
+    borradas = cache.invalidar(cache.normalizar_clave(str(clave)) if clave else None)
+
+    return jsonify({
+        'status': 'success',
+        'cache': nombre,
+        'clave': clave,
+        'borradas': borradas
+    }), 200
+
+
+@gemini_bp.route('/clasificador/stats', methods=['GET'])
+def get_clasificador_stats():
+    """
+    GET /gemini/clasificador/stats
+
+    Requerimientos clasificados localmente y derivados a Gemini (por proceso).
+    """
+    return jsonify({
+        'status': 'success',
+        'clasificador': obtener_estadisticas_clasificador()
+    }), 200
+
+
+@gemini_bp.route('/clasificador/recargar', methods=['POST'])
+def recargar_clasificador():
+    """
+    POST /gemini/clasificador/recargar
+
+    Vuelve a leer el archivo del modelo (tras `entrenamiento entrenar`).
+    """
+    modelo = recargar_modelo()
+    if modelo is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No se pudo cargar el modelo'
+        }), 500
+
+    return jsonify({
+        'status': 'success',
+        'modelo': modelo.meta
+    }), 200
+
+
+@gemini_bp.route('/backfill', methods=['POST'])
+def iniciar_backfill():
+    """
+    POST /gemini/backfill
+
+    Body JSON opcional:
+        - lote, concurrencia, por_minuto, max_leads, reprocesar_dias (enteros)
+        - reiniciar: true para empezar desde el primer lead
+        - nombre: nombre del checkpoint (por defecto "gemini")
+
+    Se ejecuta en segundo plano en este proceso; el avance se consulta con GET.
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        parametros = {
+            'nombre': str(data.get('nombre') or 'gemini')[:50],
+            'lote': int(data.get('lote', BACKFILL_LOTE)),
+            'concurrencia': int(data.get('concurrencia', BACKFILL_CONCURRENCIA)),
+            'por_minuto': int(data.get('por_minuto', BACKFILL_POR_MINUTO)),
+            'max_leads': int(data['max_leads']) if data.get('max_leads') is not None else None,
+            'reprocesar_dias': int(data['reprocesar_dias']) if data.get('reprocesar_dias') is not None else None,
+            'reiniciar': bool(data.get('reiniciar', False))
+        }
+    except (TypeError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'lote, concurrencia, por_minuto, max_leads y reprocesar_dias deben ser enteros'
+        }), 400
+
+    if parametros['lote'] < 1 or parametros['concurrencia'] < 1 or parametros['por_minuto'] < 1:
+        return jsonify({
+            'status': 'error',
+            'message': 'lote, concurrencia y por_minuto deben ser mayores que 0'
+        }), 400
+
+    if not iniciar_backfill_en_segundo_plano(**parametros):
+        return jsonify({
+            'status': 'error',
+            'message': 'Ya hay un backfill en curso'
+        }), 409
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Backfill iniciado',
+        'parametros': parametros,
+        'estado_url': '/gemini/backfill'
+    }), 202
+
+
+@gemini_bp.route('/backfill', methods=['GET'])
+def get_backfill():
+    """
+    GET /gemini/backfill?nombre=gemini
+
+    Checkpoint del reanalisis: ultimo id, procesados, actualizados, errores y estado.
+    """
+    checkpoint = leer_checkpoint(request.args.get('nombre', 'gemini'))
+    if checkpoint is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No hay registro de backfill'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'backfill': checkpoint
+    }), 200
+
+
+@gemini_bp.route('/backfill/detener', methods=['POST'])
+def post_detener_backfill():
+    """
+    POST /gemini/backfill/detener
+
+    El backfill termina el lote actual, guarda el checkpoint y se detiene.
+    """
+    if not detener_backfill():
+        return jsonify({
+            'status': 'error',
+            'message': 'No hay un backfill en curso en este proceso'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'message': 'Se detendra al terminar el lote actual'
+    }), 200
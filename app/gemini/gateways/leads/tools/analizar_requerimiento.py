@@ -5,7 +5,8 @@ Analiza el texto del requerimiento usando Gemini IA
 - compra_producto: El cliente quiere comprar productos/equipos
 - servicio_tecnico: El cliente necesita calibracion, mantenimiento, reparacion
 
-Usa Gemini para analisis contextual inteligente (no keywords)
+Primero consulta el clasificador local (gemini/clasificador); solo los textos
+ambiguos se envian a Gemini para analisis contextual.
 
 Basado en el codigo original TypeScript
 """
@@ -18,9 +19,13 @@ from typing import Optional
 try:
     from app.gemini.core.types import AnalizarRequerimientoResult
     from app.gemini.config import GEMINI_CONFIG, GEMINI_CONFIG_CLASIFICACION
+    from app.gemini.clasificador import clasificar_requerimiento
+    from app.http_client import http_post
 except ImportError:
     from gemini.core.types import AnalizarRequerimientoResult
     from gemini.config import GEMINI_CONFIG, GEMINI_CONFIG_CLASIFICACION
+    from gemini.clasificador import clasificar_requerimiento
+    from http_client import http_post
 
 
 def analizar_requerimiento(
@@ -29,7 +34,7 @@ def analizar_requerimiento(
     origen: Optional[str] = None
 ) -> AnalizarRequerimientoResult:
     """
-    Analiza el requerimiento usando Gemini
+    Analiza el requerimiento con el clasificador local y, si es ambiguo, con Gemini
 
     Args:
         texto_requerimiento: Texto del requerimiento a analizar
@@ -39,7 +44,7 @@ def analizar_requerimiento(
     Returns:
         AnalizarRequerimientoResult con la clasificacion
     """
-    print(f"[analizar_requerimiento] Analizando con Gemini: {texto_requerimiento[:100]}...")
+    print(f"[analizar_requerimiento] Analizando: {(texto_requerimiento or '')[:100]}...")
 
     try:
         # Validar que hay texto
@@ -53,6 +58,13 @@ def analizar_requerimiento(
                 "error": "Texto de requerimiento vacio"
             }
 
+        # Clasificador local: si la confianza supera el umbral no se llama a Gemini
+        resultado_local = clasificar_requerimiento(texto_requerimiento)
+        if resultado_local:
+            print(f"[analizar_requerimiento] Clasificado localmente como: "
+                  f"{resultado_local['tipo_requerimiento']} ({resultado_local['confianza']})")
+            return resultado_local
+
         # Construir prompt para Gemini
         prompt = f"""Analiza el siguiente requerimiento de un cliente y clasifícalo como:
 - "compra_producto": si el cliente quiere COMPRAR, COTIZAR, o ADQUIRIR productos/equipos
@@ -109,11 +121,11 @@ Responde ÚNICAMENTE con un JSON (sin markdown, sin bloques de código):
             }
         }
 
-        response = requests.post(
+        response = http_post(
+            "gemini",
             gemini_url,
             json=gemini_payload,
-            headers={"Content-Type": "application/json"},
-            timeout=30
+            headers={"Content-Type": "application/json"}
         )
 
         if not response.ok:
@@ -189,7 +201,8 @@ Responde ÚNICAMENTE con un JSON (sin markdown, sin bloques de código):
             "tipo_requerimiento": tipo_requerimiento,
             "confianza": confianza,
             "keywords": [],  # Ya no usamos keywords
-            "razonamiento": parsed_data.get("razonamiento", "Analisis completado con IA")
+            "razonamiento": parsed_data.get("razonamiento", "Analisis completado con IA"),
+            "fuente": "gemini"
         }
 
     except requests.exceptions.Timeout:
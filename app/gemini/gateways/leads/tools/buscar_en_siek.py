@@ -2,7 +2,9 @@
 Tool: buscar_en_siek
 
 Busca informacion de un cliente en la base de datos SIEK por RUC/DNI
-Hace una llamada HTTP directa a la API externa de SIEK
+Hace una llamada HTTP directa a la API externa de SIEK, con cache por RUC/DNI
+(memoria + tabla siek_cache). Solo se cachean clientes encontrados y
+no encontrados (404); los errores y timeouts siempre se reintentan.
 
 Basado en el codigo original TypeScript
 """
@@ -14,10 +16,21 @@ from typing import Dict
 
 try:
     from app.gemini.core.types import BuscarEnSIEKResult
-    from app.gemini.config import SIEK_CONFIG
+    from app.gemini.core.cache import CacheTTL, TablaCacheMySQL
+    from app.gemini.config import SIEK_CONFIG, SIEK_CACHE_CONFIG
+    from app.http_client import http_get
 except ImportError:
     from gemini.core.types import BuscarEnSIEKResult
-    from gemini.config import SIEK_CONFIG
+    from gemini.core.cache import CacheTTL, TablaCacheMySQL
+    from gemini.config import SIEK_CONFIG, SIEK_CACHE_CONFIG
+    from http_client import http_get
+
+
+_cache_siek = CacheTTL(
+    "siek",
+    max_items=SIEK_CACHE_CONFIG["max_items"],
+    persistencia=TablaCacheMySQL("siek_cache") if SIEK_CACHE_CONFIG["persistente"] else None
+)
 
 
 def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
@@ -62,17 +75,39 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
                 "mensaje": "Error de configuracion: API Key SIEK no disponible"
             }
 
+        return _cache_siek.obtener_o_calcular(
+            ruc_limpio, lambda: _consultar_siek(ruc_limpio, api_key)
+        )
+
+    except Exception as e:
+        print(f"[buscar_en_siek] Error inesperado: {e}")
+
+        return {
+            "success": False,
+            "encontrado": False,
+            "mensaje": str(e)
+        }
+
+
+def _consultar_siek(ruc_limpio: str, api_key: str):
+    """
+    Llama a la API SIEK.
+
+    Returns:
+        (resultado, ttl): segundos que se puede cachear el resultado (None = no cachear)
+    """
+    try:
         # Llamar a API SIEK externa
         base_url = SIEK_CONFIG.get("base_url", "https://apisiek.grupokossodo.com/mkt")
         url = f"{base_url}/obtener-cliente/{ruc_limpio}"
 
-        response = requests.get(
+        response = http_get(
+            "siek",
             url,
             headers={
                 "Accept": "application/json",
                 "API-Key": api_key
-            },
-            timeout=15
+            }
         )
 
         # Manejar 404 (no encontrado)
@@ -82,9 +117,9 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
                 "success": True,
                 "encontrado": False,
                 "mensaje": f"Cliente con RUC/DNI {ruc_limpio} no encontrado en base SIEK"
-            }
+            }, SIEK_CACHE_CONFIG["ttl_no_encontrado"]
 
-        # Manejar otros errores
+        # Manejar otros errores (no se cachean)
         if not response.ok:
             try:
                 error_data = response.json()
@@ -97,7 +132,7 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
                 "success": False,
                 "encontrado": False,
                 "mensaje": error_data.get("error", f"Error al consultar SIEK: HTTP {response.status_code}")
-            }
+            }, None
 
         # Procesar respuesta
         data = response.json()
@@ -112,7 +147,7 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
                 "success": True,
                 "encontrado": False,
                 "mensaje": f"Cliente con RUC/DNI {ruc_limpio} no encontrado en base SIEK"
-            }
+            }, SIEK_CACHE_CONFIG["ttl_no_encontrado"]
 
         print(f"[buscar_en_siek] Cliente encontrado: {cliente_data.get('RazonSocial', '')}")
 
@@ -121,7 +156,7 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
             "encontrado": True,
             "data": cliente_data,
             "mensaje": f"Cliente encontrado: {cliente_data.get('RazonSocial', '')}"
-        }
+        }, SIEK_CACHE_CONFIG["ttl_encontrado"]
 
     except requests.exceptions.Timeout:
         print("[buscar_en_siek] Timeout al conectar con API SIEK")
@@ -129,13 +164,4 @@ def buscar_en_siek(ruc: str) -> BuscarEnSIEKResult:
             "success": False,
             "encontrado": False,
             "mensaje": "Timeout al conectar con API SIEK"
-        }
-
-    except Exception as e:
-        print(f"[buscar_en_siek] Error inesperado: {e}")
-
-        return {
-            "success": False,
-            "encontrado": False,
-            "mensaje": str(e)
-        }
+        }, None
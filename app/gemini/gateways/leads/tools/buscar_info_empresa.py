@@ -5,22 +5,93 @@ Busca informacion de una empresa usando IA (Gemini)
 - RUC (numero de identificacion tributaria)
 - Sector/Rubro al que pertenece
 
-Usa Google Gemini con google_search para busqueda web e inferencia
+Usa Google Gemini con google_search para busqueda web e inferencia.
+Antes de llamar a Gemini consulta un cache por nombre normalizado
+(memoria + tabla empresa_cache) con TTL segun la confianza del resultado.
 
 Basado en el codigo original TypeScript
 """
 
 import os
+import re
 import json
+import unicodedata
+import hashlib
 import requests
 from typing import Optional
 
 try:
     from app.gemini.core.types import BuscarInfoEmpresaResult
-    from app.gemini.config import GEMINI_CONFIG
+    from app.gemini.core.cache import CacheTTL, TablaCacheMySQL
+    from app.gemini.config import GEMINI_CONFIG, EMPRESA_CACHE_CONFIG
+    from app.http_client import http_post
 except ImportError:
     from gemini.core.types import BuscarInfoEmpresaResult
-    from gemini.config import GEMINI_CONFIG
+    from gemini.core.cache import CacheTTL, TablaCacheMySQL
+    from gemini.config import GEMINI_CONFIG, EMPRESA_CACHE_CONFIG
+    from http_client import http_post
+
+
+# Sufijos societarios que se ignoran al comparar nombres (ya sin puntos ni tildes)
+SUFIJOS_SOCIETARIOS = [
+    "sociedad anonima cerrada",
+    "sociedad anonima abierta",
+    "sociedad anonima",
+    "sociedad comercial de responsabilidad limitada",
+    "sociedad de responsabilidad limitada",
+    "empresa individual de responsabilidad limitada",
+    "sacs", "sac", "saa", "sa", "eirl", "scrl", "srl", "ltda", "y cia", "cia",
+]
+
+
+def normalizar_nombre_empresa(nombre: str) -> str:
+    """
+    Clave de cache para un nombre de empresa:
+    minusculas, sin tildes, sin puntuacion y sin sufijos societarios.
+    "Minera Los Andes S.A.C." y "MINERA LOS ANDES SAC" -> "minera los andes"
+    """
+    texto = unicodedata.normalize("NFKD", nombre or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = texto.replace("&", " y ")
+    # "S.A.C." -> "sac"; el resto de signos separa palabras
+    texto = texto.replace(".", "")
+    texto = re.sub(r"[^a-z0-9]+", " ", texto)
+
+    # Unir letras sueltas consecutivas ("s a c" -> "sac")
+    palabras = []
+    sueltas = ""
+    for palabra in texto.split():
+        if len(palabra) == 1 and palabra.isalpha():
+            sueltas += palabra
+            continue
+        if sueltas:
+            palabras.append(sueltas)
+            sueltas = ""
+        palabras.append(palabra)
+    if sueltas:
+        palabras.append(sueltas)
+    clave = " ".join(palabras)
+
+    # Quitar sufijos societarios al final (puede haber mas de uno)
+    cambiado = True
+    while cambiado:
+        cambiado = False
+        for sufijo in SUFIJOS_SOCIETARIOS:
+            if clave.endswith(" " + sufijo):
+                clave = clave[: -len(sufijo) - 1].rstrip()
+                cambiado = True
+
+    if len(clave) > 180:
+        clave = clave[:140] + "#" + hashlib.sha1(clave.encode()).hexdigest()
+    return clave
+
+
+_cache_empresa = CacheTTL(
+    "empresa",
+    max_items=EMPRESA_CACHE_CONFIG["max_items"],
+    persistencia=TablaCacheMySQL("empresa_cache") if EMPRESA_CACHE_CONFIG["persistente"] else None,
+    normalizar_clave=normalizar_nombre_empresa
+)
 
 
 def buscar_info_empresa(
@@ -54,6 +125,71 @@ def buscar_info_empresa(
                 "error": "Nombre de empresa no proporcionado"
             }
 
+        # Validar API Key
+        api_key = GEMINI_CONFIG.get("api_key") or os.getenv("GOOGLE_API", "")
+
+        if not api_key:
+            print("[buscar_info_empresa] ERROR: API Key de Gemini no configurada")
+            return {
+                "success": False,
+                "ruc": None,
+                "sector_rubro": None,
+                "razon_social_completa": None,
+                "confianza": "baja",
+                "fuente": "no_encontrado",
+                "error": "API Key de Gemini no configurada"
+            }
+
+        clave = normalizar_nombre_empresa(nombre_empresa)
+        if not clave:
+            clave = nombre_empresa.strip().lower()
+
+        return _cache_empresa.obtener_o_calcular(
+            clave, lambda: _consultar_gemini(nombre_empresa, departamento, contexto, api_key)
+        )
+
+    except Exception as e:
+        print(f"[buscar_info_empresa] Error inesperado: {e}")
+
+        return {
+            "success": False,
+            "ruc": None,
+            "sector_rubro": None,
+            "razon_social_completa": None,
+            "confianza": "baja",
+            "fuente": "no_encontrado",
+            "error": str(e)
+        }
+
+
+def _ttl_resultado(resultado) -> Optional[int]:
+    """
+    Segundos que se puede cachear un resultado:
+    segun su confianza si se encontro la empresa, ttl_no_encontrado si Gemini
+    respondio sin datos, y None (no cachear) para errores de API o de parseo.
+    """
+    if resultado.get("success"):
+        return EMPRESA_CACHE_CONFIG["ttl_por_confianza"].get(resultado.get("confianza"), 0) or None
+    if resultado.get("error"):
+        return None
+    return EMPRESA_CACHE_CONFIG["ttl_no_encontrado"]
+
+
+def _consultar_gemini(nombre_empresa: str, departamento: Optional[str],
+                      contexto: Optional[str], api_key: str):
+    """
+    Llama a Gemini con google_search.
+
+    Returns:
+        (resultado, ttl) para el cache
+    """
+    resultado = _llamar_gemini(nombre_empresa, departamento, contexto, api_key)
+    return resultado, _ttl_resultado(resultado)
+
+
+def _llamar_gemini(nombre_empresa: str, departamento: Optional[str],
+                   contexto: Optional[str], api_key: str) -> BuscarInfoEmpresaResult:
+    try:
         # Construir prompt para Gemini
         prompt = f'Encuentra el numero de RUC de la empresa "{nombre_empresa}"'
 
@@ -70,21 +206,6 @@ def buscar_info_empresa(
         prompt += ' Responde ÚNICAMENTE con formato JSON puro sin markdown, sin bloques de código, sin explicaciones adicionales.'
         prompt += ' Formato exacto: {"ruc": "numero_ruc_o_null", "sector_rubro": "sector_o_null", "razon_social": "razon_social_completa_o_null"}'
 
-        # Validar API Key
-        api_key = GEMINI_CONFIG.get("api_key") or os.getenv("GOOGLE_API", "")
-
-        if not api_key:
-            print("[buscar_info_empresa] ERROR: API Key de Gemini no configurada")
-            return {
-                "success": False,
-                "ruc": None,
-                "sector_rubro": None,
-                "razon_social_completa": None,
-                "confianza": "baja",
-                "fuente": "no_encontrado",
-                "error": "API Key de Gemini no configurada"
-            }
-
         # Llamar a Gemini API con google_search
         model = GEMINI_CONFIG.get("model", "gemini-2.0-flash-exp")
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
@@ -105,11 +226,11 @@ def buscar_info_empresa(
             ]
         }
 
-        response = requests.post(
+        response = http_post(
+            "gemini",
             url,
             json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=30
+            headers={"Content-Type": "application/json"}
         )
 
         if not response.ok:
@@ -6,20 +6,29 @@ el sistema de orquestacion Gemini con los endpoints de leads.
 
 Proporciona una funcion simple: analizar_lead_automatico()
 que toma los datos de un lead y retorna el analisis completo.
+
+Dos modos de ejecucion (GEMINI_MODO_ANALISIS o parametro modo):
+    - determinista: ejecuta en codigo el flujo fijo de SYSTEM_INSTRUCTION
+    - llm: Gemini decide el orden de las funciones (GatewayOrchestrator.chat)
+Ambos producen una respuesta con la misma forma que el orchestrator,
+asi procesar_resultados_gemini no cambia.
 """
 
-from typing import Dict, Any, Optional
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 try:
     from app.gemini.core.orchestrator import GatewayOrchestrator
     from app.gemini.gateways.leads.gateway import GatewayLeads
-    from app.gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION
+    from app.gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION, GEMINI_MODO_ANALISIS
     from app.db import get_db_connection
 except ImportError:
     from gemini.core.orchestrator import GatewayOrchestrator
     from gemini.gateways.leads.gateway import GatewayLeads
-    from gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION
+    from gemini.config import GEMINI_CONFIG, SYSTEM_INSTRUCTION, GEMINI_MODO_ANALISIS
     from db import get_db_connection
 
 
@@ -67,6 +76,187 @@ def construir_mensaje_lead(lead_data: Dict[str, Any]) -> str:
     return "\n".join(partes)
 
 
+MODOS_ANALISIS = ("determinista", "llm")
+
+
+def _texto(lead_data: Dict[str, Any], campo: str) -> str:
+    valor = lead_data.get(campo)
+    return str(valor).strip() if valor else ""
+
+
+def _resumen_determinista(functions_called: List[Dict[str, Any]]) -> str:
+    """Texto final equivalente al que redacta Gemini en modo llm"""
+    lineas = []
+    for fc in functions_called:
+        result = fc.get("result") or {}
+        if fc["name"] == "buscar_en_siek":
+            lineas.append(f"SIEK ({fc['args'].get('ruc')}): {result.get('mensaje', '')}")
+        elif fc["name"] == "buscar_info_empresa":
+            if result.get("success"):
+                lineas.append(
+                    f"Empresa: {result.get('razon_social_completa') or fc['args'].get('nombre_empresa')}"
+                    f" | RUC: {result.get('ruc') or '-'} | Sector: {result.get('sector_rubro') or '-'}"
+                    f" | Confianza: {result.get('confianza') or '-'}"
+                )
+            else:
+                lineas.append(f"Empresa: sin informacion ({result.get('error', 'no encontrada')})")
+        elif fc["name"] == "analizar_requerimiento":
+            if result.get("success"):
+                lineas.append(
+                    f"Requerimiento: {result.get('tipo_requerimiento')} (confianza {result.get('confianza')})"
+                )
+            else:
+                lineas.append(f"Requerimiento: no clasificado ({result.get('error', '')})")
+    return "\n".join(lineas)
+
+
+def llamar_funcion(gateway: GatewayLeads, nombre: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Ejecuta una funcion del gateway y la registra como en functionsCalled"""
+    print(f"[GeminiService] Ejecutando funcion: {nombre}", args)
+    try:
+        result = gateway.execute(nombre, args)
+    except Exception as e:
+        print(f"[GeminiService] ERROR ejecutando {nombre}: {e}")
+        result = {"success": False, "error": str(e)}
+    return {"name": nombre, "args": args, "result": result}
+
+
+def buscar_datos_cliente(gateway: GatewayLeads, empresa: str, ruc_dni: str) -> List[Dict[str, Any]]:
+    """
+    Reglas 1-4 de SYSTEM_INSTRUCTION: SIEK por RUC, busqueda de la empresa como
+    respaldo y SIEK de nuevo con el RUC que encuentre. Retorna las llamadas en orden.
+    """
+    functions_called: List[Dict[str, Any]] = []
+    rucs_consultados = set()
+    encontrado_siek = False
+
+    if ruc_dni:
+        ruc_limpio = re.sub(r"\D", "", ruc_dni) or ruc_dni
+        rucs_consultados.add(ruc_limpio)
+        fc = llamar_funcion(gateway, "buscar_en_siek", {"ruc": ruc_limpio})
+        functions_called.append(fc)
+        encontrado_siek = bool(fc["result"].get("encontrado"))
+
+    if not encontrado_siek and empresa:
+        args_empresa = {"nombre_empresa": empresa}
+        if ruc_dni:
+            args_empresa["contexto"] = f"RUC conocido: {ruc_dni}"
+        fc = llamar_funcion(gateway, "buscar_info_empresa", args_empresa)
+        functions_called.append(fc)
+
+        ruc_encontrado = re.sub(r"\D", "", str(fc["result"].get("ruc") or ""))
+        if fc["result"].get("success") and len(ruc_encontrado) in (8, 11) \
+                and ruc_encontrado not in rucs_consultados:
+            functions_called.append(llamar_funcion(gateway, "buscar_en_siek", {"ruc": ruc_encontrado}))
+
+    return functions_called
+
+
+def args_requerimiento(lead_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Argumentos de analizar_requerimiento para el lead (None si no hay requerimiento)"""
+    requerimiento = _texto(lead_data, "treq_requerimiento")
+    if not requerimiento:
+        return None
+    args = {"texto_requerimiento": requerimiento}
+    if _texto(lead_data, "empresa"):
+        args["empresa_nombre"] = _texto(lead_data, "empresa")
+    if _texto(lead_data, "origen"):
+        args["origen"] = _texto(lead_data, "origen")
+    return args
+
+
+def _fallo_llamada(fc: Dict[str, Any]) -> bool:
+    """
+    True si la herramienta fallo (API caida, timeout, configuracion), no si
+    respondio sin datos: buscar_info_empresa sin "error" es empresa no
+    encontrada y SIEK solo valida el RUC antes de consultar.
+    """
+    result = fc.get("result") or {}
+    if result.get("success"):
+        return False
+    if fc["name"] == "buscar_en_siek":
+        return len(re.sub(r"\D", "", str(fc["args"].get("ruc") or ""))) in (8, 11)
+    return bool(result.get("error"))
+
+
+def _errores_deterministas(functions_called: List[Dict[str, Any]]) -> List[str]:
+    """
+    Errores que impiden dar el analisis por terminado: la busqueda del cliente
+    fallo sin que ninguna llamada trajera datos, o analizar_requerimiento fallo.
+    Asi una caida de SIEK o Gemini se reintenta en vez de guardar campos vacios.
+    """
+    clientes = [fc for fc in functions_called if fc["name"] != "analizar_requerimiento"]
+    con_datos = any(
+        (fc["result"] or {}).get("encontrado") if fc["name"] == "buscar_en_siek"
+        else (fc["result"] or {}).get("success")
+        for fc in clientes
+    )
+    fallidas = [fc for fc in functions_called if _fallo_llamada(fc)]
+    if con_datos:
+        fallidas = [fc for fc in fallidas if fc["name"] == "analizar_requerimiento"]
+    return [
+        f"{fc['name']}: {(fc['result'] or {}).get('error') or (fc['result'] or {}).get('mensaje') or 'error'}"
+        for fc in fallidas
+    ]
+
+
+def respuesta_determinista(functions_called: List[Dict[str, Any]], gateway_name: str,
+                           start_time: float) -> Dict[str, Any]:
+    """Arma la respuesta con la forma de OrchestratorResponse"""
+    errores = _errores_deterministas(functions_called)
+    respuesta = {
+        "success": not errores,
+        "response": _resumen_determinista(functions_called),
+        "gatewaysCalled": [gateway_name] if functions_called else [],
+        "functionsCalled": functions_called,
+        "conversationHistory": [],
+        "metadata": {
+            "executionTime": int((time.time() - start_time) * 1000),
+            "iterations": 0,
+            "totalTokens": None
+        }
+    }
+    if errores:
+        respuesta["error"] = "; ".join(errores)
+    return respuesta
+
+
+def ejecutar_flujo_determinista(lead_data: Dict[str, Any],
+                                gateway: Optional[GatewayLeads] = None) -> Dict[str, Any]:
+    """
+    Ejecuta en codigo las reglas de SYSTEM_INSTRUCTION, sin rondas de Gemini:
+
+        1. Con RUC -> buscar_en_siek(RUC)
+        2. Sin RUC, o SIEK no lo encuentra -> buscar_info_empresa(empresa),
+           con "RUC conocido: X" como contexto si hay RUC
+        3. Si buscar_info_empresa obtiene un RUC nuevo -> buscar_en_siek(ese RUC)
+        4. Con requerimiento -> analizar_requerimiento, en paralelo a 1-3
+
+    Returns:
+        Dict con la forma de OrchestratorResponse (functionsCalled en orden
+        de ejecucion, analizar_requerimiento al final)
+    """
+    start_time = time.time()
+    gateway = gateway or GatewayLeads()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        args_req = args_requerimiento(lead_data)
+        futuro_requerimiento = None
+        if args_req:
+            futuro_requerimiento = executor.submit(llamar_funcion, gateway, "analizar_requerimiento", args_req)
+
+        functions_called = buscar_datos_cliente(
+            gateway, _texto(lead_data, "empresa"), _texto(lead_data, "ruc_dni")
+        )
+
+        if futuro_requerimiento is not None:
+            functions_called.append(futuro_requerimiento.result())
+
+    response = respuesta_determinista(functions_called, gateway.get_gateway_name(), start_time)
+    print(f"[GeminiService] Flujo determinista completado en {response['metadata']['executionTime']}ms")
+    return response
+
+
 def procesar_resultados_gemini(response: Dict[str, Any]) -> Dict[str, Any]:
     """
     Procesa los resultados del orchestrator y extrae los datos relevantes
@@ -83,6 +273,7 @@ def procesar_resultados_gemini(response: Dict[str, Any]) -> Dict[str, Any]:
         "ia_cliente_sector": None,
         "ia_cliente_razon_social": None,
         "ia_tipo_requerimiento": None,
+        "ia_tipo_fuente": None,
         "ia_confianza": None,
         "gemini_response": response.get("response", ""),
         "success": response.get("success", False)
@@ -121,6 +312,7 @@ def procesar_resultados_gemini(response: Dict[str, Any]) -> Dict[str, Any]:
         elif name == "analizar_requerimiento":
             if result.get("success"):
                 resultado["ia_tipo_requerimiento"] = result.get("tipo_requerimiento")
+                resultado["ia_tipo_fuente"] = result.get("fuente", "gemini")
                 # Solo actualizar confianza si no hay de buscar_info_empresa
                 if not resultado["ia_confianza"]:
                     resultado["ia_confianza"] = result.get("confianza")
@@ -128,6 +320,43 @@ def procesar_resultados_gemini(response: Dict[str, Any]) -> Dict[str, Any]:
     return resultado
 
 
+UPDATE_LEAD_QUERY = """
+    UPDATE WIX SET
+        siek_cliente = %s,
+        ia_cliente_doc = %s,
+        ia_cliente_sector = %s,
+        ia_cliente_razon_social = %s,
+        ia_tipo_requerimiento = %s,
+        ia_tipo_fuente = %s,
+        ia_confianza = %s,
+        ia_procesado = %s
+    WHERE id = %s
+"""
+
+
+def _valores_update(lead_id: int, datos: Dict[str, Any], procesado: datetime) -> tuple:
+    return (
+        datos.get("siek_cliente", 0),
+        datos.get("ia_cliente_doc"),
+        datos.get("ia_cliente_sector"),
+        datos.get("ia_cliente_razon_social"),
+        datos.get("ia_tipo_requerimiento"),
+        datos.get("ia_tipo_fuente"),
+        datos.get("ia_confianza"),
+        procesado,
+        lead_id
+    )
+
+
+def debe_guardarse(resultado: Dict[str, Any]) -> bool:
+    """
+    Solo se persiste (y se marca ia_procesado) un analisis completo. Con datos
+    de cliente pero sin requerimiento analizado el lead queda pendiente, para
+    que el siguiente analisis o el backfill lo reintenten.
+    """
+    return bool(resultado.get("success")) and not resultado.get("error")
+
+
 def actualizar_lead_en_bd(lead_id: int, datos: Dict[str, Any]) -> bool:
     """
     Actualiza el lead en la base de datos con los resultados del analisis
@@ -147,47 +376,8 @@ def actualizar_lead_en_bd(lead_id: int, datos: Dict[str, Any]) -> bool:
     try:
         cursor = cnx.cursor()
 
-        # Verificar/agregar columnas si no existen
-        columnas_nuevas = [
-            ("ia_tipo_requerimiento", "VARCHAR(50)"),
-            ("ia_confianza", "VARCHAR(20)"),
-            ("ia_procesado", "DATETIME")
-        ]
-
-        for col_name, col_type in columnas_nuevas:
-            try:
-                cursor.execute(f"ALTER TABLE WIX ADD COLUMN {col_name} {col_type} NULL")
-                cnx.commit()
-                print(f"[GeminiService] Columna {col_name} agregada a tabla WIX")
-            except Exception:
-                # La columna ya existe
-                pass
-
         # Actualizar el lead
-        update_query = """
-            UPDATE WIX SET
-                siek_cliente = %s,
-                ia_cliente_doc = %s,
-                ia_cliente_sector = %s,
-                ia_cliente_razon_social = %s,
-                ia_tipo_requerimiento = %s,
-                ia_confianza = %s,
-                ia_procesado = %s
-            WHERE id = %s
-        """
-
-        values = (
-            datos.get("siek_cliente", 0),
-            datos.get("ia_cliente_doc"),
-            datos.get("ia_cliente_sector"),
-            datos.get("ia_cliente_razon_social"),
-            datos.get("ia_tipo_requerimiento"),
-            datos.get("ia_confianza"),
-            datetime.now(),
-            lead_id
-        )
-
-        cursor.execute(update_query, values)
+        cursor.execute(UPDATE_LEAD_QUERY, _valores_update(lead_id, datos, datetime.now()))
         cnx.commit()
 
         print(f"[GeminiService] Lead {lead_id} actualizado con datos de IA")
@@ -202,7 +392,48 @@ def actualizar_lead_en_bd(lead_id: int, datos: Dict[str, Any]) -> bool:
         cnx.close()
 
 
-def analizar_lead_automatico(lead_data: Dict[str, Any], lead_id: int) -> Dict[str, Any]:
+def actualizar_leads_en_bd(resultados: List[Tuple[int, Dict[str, Any]]]) -> int:
+    """
+    Actualiza varios leads en una sola conexion y transaccion
+
+    Args:
+        resultados: lista de (lead_id, datos)
+
+    Returns:
+        Cantidad de leads actualizados (0 si la transaccion falla)
+    """
+    if not resultados:
+        return 0
+
+    cnx = get_db_connection()
+    if cnx is None:
+        print(f"[GeminiService] ERROR: No se pudo conectar a la BD para actualizar {len(resultados)} leads")
+        return 0
+
+    cursor = None
+    try:
+        cursor = cnx.cursor()
+        procesado = datetime.now()
+        cursor.executemany(UPDATE_LEAD_QUERY, [
+            _valores_update(lead_id, datos, procesado) for lead_id, datos in resultados
+        ])
+        cnx.commit()
+        print(f"[GeminiService] {len(resultados)} leads actualizados con datos de IA")
+        return len(resultados)
+
+    except Exception as e:
+        cnx.rollback()
+        print(f"[GeminiService] ERROR al actualizar {len(resultados)} leads: {e}")
+        return 0
+
+    finally:
+        if cursor is not None:
+            cursor.close()
+        cnx.close()
+
+
+def analizar_lead_automatico(lead_data: Dict[str, Any], lead_id: int,
+                             modo: Optional[str] = None) -> Dict[str, Any]:
     """
     Analiza un lead automaticamente usando Gemini y actualiza la BD
 
@@ -216,6 +447,7 @@ def analizar_lead_automatico(lead_data: Dict[str, Any], lead_id: int) -> Dict[st
             - treq_requerimiento: Texto del requerimiento (opcional)
             - origen: Origen del lead (WIX, etc.)
         lead_id: ID del registro en la tabla WIX
+        modo: "determinista" o "llm" (por defecto GEMINI_MODO_ANALISIS)
 
     Returns:
         Dict con:
@@ -245,28 +477,37 @@ def analizar_lead_automatico(lead_data: Dict[str, Any], lead_id: int) -> Dict[st
                 "error": "Sin datos suficientes para analizar (empresa, ruc_dni o requerimiento requeridos)"
             }
 
-        # Crear orchestrator
-        orchestrator = crear_orchestrator()
+        modo = (modo or GEMINI_MODO_ANALISIS).lower()
+        if modo not in MODOS_ANALISIS:
+            raise ValueError(f"Modo de analisis desconocido: {modo}. Modos: {', '.join(MODOS_ANALISIS)}")
 
-        # Construir mensaje
-        mensaje = construir_mensaje_lead(lead_data)
-        print(f"[GeminiService] Mensaje para Gemini: {mensaje}")
+        if modo == "determinista":
+            response = ejecutar_flujo_determinista(lead_data)
+        else:
+            # Crear orchestrator
+            orchestrator = crear_orchestrator()
 
-        # Ejecutar analisis
-        response = orchestrator.chat(
-            message=mensaje,
-            system_instruction=SYSTEM_INSTRUCTION,
-            max_iterations=10
-        )
+            # Construir mensaje
+            mensaje = construir_mensaje_lead(lead_data)
+            print(f"[GeminiService] Mensaje para Gemini: {mensaje}")
+
+            # Ejecutar analisis
+            response = orchestrator.chat(
+                message=mensaje,
+                system_instruction=SYSTEM_INSTRUCTION,
+                max_iterations=10
+            )
 
-        print(f"[GeminiService] Respuesta del orchestrator: success={response.get('success')}")
+        print(f"[GeminiService] Respuesta ({modo}): success={response.get('success')}")
 
         # Procesar resultados
         resultado = procesar_resultados_gemini(response)
 
         # Actualizar BD
-        if resultado.get("success") or resultado.get("siek_cliente") > 0:
+        if debe_guardarse(resultado):
             actualizar_lead_en_bd(lead_id, resultado)
+        else:
+            print(f"[GeminiService] Lead {lead_id} queda sin ia_procesado: {resultado.get('error')}")
 
         print(f"[GeminiService] Analisis completado para lead {lead_id}: siek_cliente={resultado.get('siek_cliente')}")
 
@@ -0,0 +1,312 @@
+"""
+Cliente HTTP compartido para todas las llamadas salientes.
+
+En lugar de requests.post/requests.get sueltos (una conexión TCP + TLS nueva
+por llamada), mantiene una requests.Session por host con pool de conexiones
+keep-alive. Cada servicio externo tiene:
+- timeouts propios (conexión y lectura)
+- reintentos con backoff exponencial y jitter ante 429 y fallos al conectar;
+  5xx, timeouts de lectura y conexiones cortadas solo se reintentan en
+  llamadas idempotentes
+  (GET/HEAD, o servicios/llamadas marcados con idempotente=True), porque el
+  servidor pudo haber procesado la petición
+- circuit breaker: tras N fallos seguidos se deja de llamar al servicio durante
+  un tiempo y se responde de inmediato con CircuitoAbiertoError
+
+Uso:
+    from app.http_client import http_post
+    response = http_post("gemini", url, json=payload)
+"""
+
+import os
+import time
+import random
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Conexiones keep-alive por host y proceso
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))
+# Backoff entre reintentos: base * 2^intento (con jitter completo), hasta el máximo
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', 8))
+# Circuit breaker: fallos consecutivos para abrir y segundos que permanece abierto
+HTTP_CB_UMBRAL = int(os.environ.get('HTTP_CB_UMBRAL', 5))
+HTTP_CB_ENFRIAMIENTO = int(os.environ.get('HTTP_CB_ENFRIAMIENTO', 30))
+
+STATUS_REINTENTABLES = {429, 500, 502, 503, 504}
+METODOS_IDEMPOTENTES = ("GET", "HEAD")
+
+
+def _servicio(nombre: str, timeout_conexion: float, timeout_lectura: float, reintentos: int,
+              idempotente: bool = False) -> Dict[str, Any]:
+    prefijo = f"HTTP_{nombre.upper()}"
+    return {
+        "timeout": (
+            float(os.environ.get(f"{prefijo}_TIMEOUT_CONEXION", timeout_conexion)),
+            float(os.environ.get(f"{prefijo}_TIMEOUT", timeout_lectura)),
+        ),
+        "reintentos": int(os.environ.get(f"{prefijo}_REINTENTOS", reintentos)),
+        # True si sus POST no tienen efectos (se reintentan ante 5xx y timeouts de lectura)
+        "idempotente": idempotente,
+    }
+
+
+# Configuración por servicio (sobrescribible con HTTP_<SERVICIO>_TIMEOUT, etc.)
+SERVICIOS: Dict[str, Dict[str, Any]] = {
+    # generateContent no modifica nada: repetirlo es seguro
+    "gemini": _servicio("gemini", 5, 30, 2, idempotente=True),
+    "siek": _servicio("siek", 5, 15, 2),
+    "octopus": _servicio("octopus", 5, 15, 1),
+    "sync": _servicio("sync", 5, 30, 1),
+}
+SERVICIO_DEFECTO = {"timeout": (5.0, 30.0), "reintentos": 0, "idempotente": False}
+
+
+class CircuitoAbiertoError(requests.exceptions.ConnectionError):
+    """El servicio acumuló demasiados fallos seguidos; no se intenta la llamada."""
+
+
+class _Circuito:
+    """Circuit breaker de un servicio (cerrado -> abierto -> semiabierto)."""
+
+    def __init__(self, umbral: int, enfriamiento: int):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.prueba_en_curso = False
+        self.aperturas = 0
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.fallos < self.umbral:
+                return True
+            if time.time() < self.abierto_hasta or self.prueba_en_curso:
+                return False
+            # Semiabierto: se deja pasar una sola llamada de prueba
+            self.prueba_en_curso = True
+            return True
+
+    def liberar_prueba(self) -> None:
+        """La llamada fallo por un error ajeno al servicio: no cuenta, pero libera el semiabierto."""
+        with self._lock:
+            self.prueba_en_curso = False
+
+    def exito(self) -> None:
+        with self._lock:
+            self.fallos = 0
+            self.prueba_en_curso = False
+
+    def fallo(self) -> None:
+        with self._lock:
+            self.fallos += 1
+            self.prueba_en_curso = False
+            if self.fallos >= self.umbral:
+                if time.time() >= self.abierto_hasta:
+                    self.aperturas += 1
+                self.abierto_hasta = time.time() + self.enfriamiento
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.fallos < self.umbral:
+                estado = "cerrado"
+            elif time.time() < self.abierto_hasta:
+                estado = "abierto"
+            else:
+                estado = "semiabierto"
+            return {
+                "estado": estado,
+                "fallos_consecutivos": self.fallos,
+                "aperturas": self.aperturas,
+                "reabre_en_s": max(0, round(self.abierto_hasta - time.time(), 1)) if estado == "abierto" else 0,
+            }
+
+
+_sesiones: Dict[str, requests.Session] = {}
+_circuitos: Dict[str, _Circuito] = {}
+_contadores: Dict[str, Dict[str, int]] = {}
+_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _reiniciar_si_fork() -> None:
+    # Las sesiones no se comparten entre procesos (gunicorn hace fork tras importar)
+    global _pid
+    if _pid != os.getpid():
+        _sesiones.clear()
+        _circuitos.clear()
+        _contadores.clear()
+        _pid = os.getpid()
+
+
+def _obtener_sesion(url: str) -> requests.Session:
+    partes = urlsplit(url)
+    host = f"{partes.scheme}://{partes.netloc}"
+    with _lock:
+        _reiniciar_si_fork()
+        sesion = _sesiones.get(host)
+        if sesion is None:
+            sesion = requests.Session()
+            # Los reintentos los maneja request() para aplicar backoff y circuit breaker
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+            sesion.mount(f"{partes.scheme}://", adapter)
+            _sesiones[host] = sesion
+        return sesion
+
+
+def _obtener_circuito(servicio: str) -> _Circuito:
+    with _lock:
+        _reiniciar_si_fork()
+        circuito = _circuitos.get(servicio)
+        if circuito is None:
+            circuito = _Circuito(HTTP_CB_UMBRAL, HTTP_CB_ENFRIAMIENTO)
+            _circuitos[servicio] = circuito
+            _contadores[servicio] = {"llamadas": 0, "reintentos": 0, "errores": 0, "rechazadas_circuito": 0}
+        return circuito
+
+
+def _contar(servicio: str, contador: str) -> None:
+    with _lock:
+        if servicio in _contadores:
+            _contadores[servicio][contador] += 1
+
+
+def _espera(intento: int, response: Optional[requests.Response]) -> float:
+    """Segundos antes del siguiente intento (respeta Retry-After numérico)."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** intento)))
+
+
+def _sin_conectar(error: requests.exceptions.ConnectionError) -> bool:
+    """True si la petición no llegó a salir: timeout o fallo al abrir la conexión."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    causa = error.args[0] if error.args else None
+    # MaxRetryError envuelve la causa real en .reason
+    causa = getattr(causa, "reason", causa)
+    return isinstance(causa, NewConnectionError)
+
+
+def request(servicio: str, metodo: str, url: str, timeout: Optional[Any] = None,
+            reintentos: Optional[int] = None, idempotente: Optional[bool] = None,
+            **kwargs) -> requests.Response:
+    """
+    Llamada HTTP por la sesión compartida del host.
+
+    Args:
+        servicio: nombre en SERVICIOS (define timeouts, reintentos y circuito)
+        metodo: GET, POST...
+        url: URL completa
+        timeout / reintentos: sobrescriben la configuración del servicio
+        idempotente: si la llamada se puede repetir ante 5xx o timeout de lectura
+            (por defecto: GET/HEAD, o el valor del servicio)
+        **kwargs: se pasan a requests.Session.request (json, headers, params...)
+
+    Returns:
+        requests.Response (también para respuestas 4xx/5xx tras agotar reintentos)
+
+    Raises:
+        CircuitoAbiertoError si el circuito del servicio está abierto;
+        requests.exceptions.Timeout / ConnectionError si fallan todos los intentos;
+        otras requests.RequestException sin reintentar
+    """
+    config = SERVICIOS.get(servicio, SERVICIO_DEFECTO)
+    timeout = config["timeout"] if timeout is None else timeout
+    reintentos = config["reintentos"] if reintentos is None else reintentos
+    metodo = metodo.upper()
+    if idempotente is None:
+        idempotente = metodo in METODOS_IDEMPOTENTES or config["idempotente"]
+
+    circuito = _obtener_circuito(servicio)
+    sesion = _obtener_sesion(url)
+
+    intento = 0
+    anterior: Optional[requests.Response] = None
+    while True:
+        if not circuito.permitir():
+            _contar(servicio, "rechazadas_circuito")
+            if anterior is not None:
+                # El circuito se abrió durante los reintentos: se entrega la última respuesta
+                return anterior
+            raise CircuitoAbiertoError(f"Circuito abierto para {servicio}: demasiados fallos consecutivos")
+
+        _contar(servicio, "llamadas")
+        response = None
+        try:
+            response = sesion.request(metodo, url, timeout=timeout, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            # Una conexión cortada tras enviar el cuerpo (RemoteDisconnected, ProtocolError)
+            # también llega como ConnectionError: solo se repite si es idempotente o si
+            # no se llegó a conectar
+            circuito.fallo()
+            _contar(servicio, "errores")
+            if intento >= reintentos or not (idempotente or _sin_conectar(e)):
+                raise
+        except requests.exceptions.Timeout:
+            # Timeout de lectura: solo se repiten llamadas idempotentes
+            circuito.fallo()
+            _contar(servicio, "errores")
+            if intento >= reintentos or not idempotente:
+                raise
+        except requests.exceptions.RequestException:
+            # Respuesta cortada, demasiadas redirecciones, etc.: fallo sin reintento
+            circuito.fallo()
+            _contar(servicio, "errores")
+            raise
+        except Exception:
+            # Error de quien llama (p.ej. json= no serializable): no es fallo del servicio
+            circuito.liberar_prueba()
+            raise
+        else:
+            if response.status_code not in STATUS_REINTENTABLES:
+                circuito.exito()
+                return response
+            # 429 es limitación de cuota, no caída del servicio: el servidor no la procesó
+            if response.status_code == 429:
+                circuito.exito()
+            else:
+                circuito.fallo()
+            # Un 5xx puede llegar después de que el servidor procesó la petición
+            if intento >= reintentos or (response.status_code != 429 and not idempotente):
+                return response
+
+        espera = _espera(intento, response)
+        print(f"[HTTP] {servicio} {metodo} {urlsplit(url).netloc}: reintento {intento + 1}/{reintentos} "
+              f"en {espera:.1f}s ({response.status_code if response is not None else 'error de red'})")
+        _contar(servicio, "reintentos")
+        anterior = response
+        time.sleep(espera)
+        intento += 1
+
+
+def http_get(servicio: str, url: str, **kwargs) -> requests.Response:
+    return request(servicio, "GET", url, **kwargs)
+
+
+def http_post(servicio: str, url: str, **kwargs) -> requests.Response:
+    return request(servicio, "POST", url, **kwargs)
+
+
+def estado_http() -> Dict[str, Any]:
+    """Sesiones abiertas, contadores y estado del circuito por servicio (de este proceso)."""
+    with _lock:
+        contadores = {s: dict(c) for s, c in _contadores.items()}
+        circuitos = dict(_circuitos)
+        hosts = list(_sesiones.keys())
+    return {
+        "hosts": hosts,
+        "pool_maxsize": HTTP_POOL_MAXSIZE,
+        "servicios": {
+            s: {**contadores.get(s, {}), "circuito": c.estado()}
+            for s, c in circuitos.items()
+        },
+    }
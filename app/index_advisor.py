@@ -0,0 +1,360 @@
+"""
+Index Advisor - EXPLAIN de las consultas que emite el servicio
+
+Ejecuta EXPLAIN sobre un catalogo de las consultas de /sync/*, del outbox,
+de lead_jobs, del backfill y de envio_de_encuestas, y marca:
+    - escaneo_completo: type=ALL (recorre la tabla entera)
+    - escaneo_indice:   type=index (recorre un indice entero)
+    - filesort / temporal: ordenamiento o tabla temporal extra
+Tambien compara los indices existentes con INDICES_GESTIONADOS (los que
+crean las migraciones) y reporta faltantes o con columnas distintas.
+
+El plan depende de las estadisticas de la tabla: en una base casi vacia
+MySQL puede preferir un escaneo completo aunque el indice exista, por lo
+que conviene ejecutarlo contra una copia con datos reales.
+
+Uso:
+    python -m app.index_advisor            (reporte legible; exit 1 si hay escaneos completos)
+    python -m app.index_advisor --json
+"""
+
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+try:
+    from app.db import get_db_connection
+    from app.cache_respuestas import MARCADORES
+    from app.sync_service import (
+        consulta_leads, CONDICION_NO_CONFIRMADO, COLUMNAS_PENDIENTES, _CONDICION_OUTBOX
+    )
+except ImportError:
+    from db import get_db_connection
+    from cache_respuestas import MARCADORES
+    from sync_service import (
+        consulta_leads, CONDICION_NO_CONFIRMADO, COLUMNAS_PENDIENTES, _CONDICION_OUTBOX
+    )
+
+
+# Indices que crean las migraciones (nombre -> columnas en orden)
+INDICES_GESTIONADOS: Dict[str, Dict[str, tuple]] = {
+    "WIX": {
+        "idx_wix_sync_outbox": ("sync_status", "sync_proximo_intento"),
+        "idx_wix_submission": ("submission_time",),
+        "idx_wix_asignado": ("lead_asignado", "submission_time"),
+        "idx_wix_asesor": ("asesor_in", "submission_time"),
+        "idx_wix_origen": ("origen", "submission_time"),
+        "idx_wix_sync_submission": ("sync_status", "submission_time"),
+        "idx_wix_sync_enviado": ("sync_status", "sync_sent_at"),
+        "idx_wix_sync_bloqueado": ("sync_bloqueado_por",),
+        "idx_wix_actualizado": ("actualizado_en",),
+    },
+    "lead_jobs": {
+        "idx_lead_jobs_cola": ("estado", "disponible_en"),
+        "idx_lead_jobs_record": ("record_id",),
+    },
+    # Sus consultas van por la clave primaria (idcalificacion); el indice
+    # de actualizado_en sirve al marcador del cache de respuestas
+    "envio_de_encuestas": {
+        "idx_encuestas_actualizado": ("actualizado_en",),
+        "idx_encuestas_timestamp": ("timestamp",),
+    },
+}
+
+# Alertas que cuentan como escaneo completo (las demas son advertencias)
+ALERTAS_GRAVES = {"escaneo_completo"}
+
+
+def consultas_del_servicio() -> List[Dict[str, Any]]:
+    """
+    Catalogo de consultas con parametros representativos.
+    escaneo_esperado=True marca las que recorren toda la tabla a proposito
+    (agregados globales).
+    """
+    hoy = datetime.now().date()
+    desde = (hoy - timedelta(days=30)).isoformat()
+
+    consultas: List[Dict[str, Any]] = []
+
+    filtros_leads = {
+        "sync.leads": {},
+        "sync.leads.asignados": {"asignado": True},
+        "sync.leads.sin_asignar": {"asignado": False},
+        "sync.leads.asesor": {"asesor": "ASESOR"},
+        "sync.leads.fechas": {"fecha_desde": desde, "fecha_hasta": hoy.isoformat()},
+        "sync.leads.origen": {"origen": "WIX"},
+    }
+    for nombre, filtros in filtros_leads.items():
+        query, count_query, params = consulta_leads(**filtros)
+        consultas.append({"nombre": nombre, "sql": query, "params": params + [100, 0]})
+        consultas.append({
+            "nombre": f"{nombre}.conteo",
+            "sql": count_query,
+            "params": params,
+            # Sin filtros el conteo recorre la tabla completa
+            "escaneo_esperado": not filtros
+        })
+
+    # Pagina siguiente por cursor (keyset): debe costar lo mismo que la primera
+    query, _, params = consulta_leads(despues_de=(datetime.now() - timedelta(days=365), 1))
+    consultas.append({"nombre": "sync.leads.siguiente_pagina", "sql": query, "params": params + [100, 0]})
+
+    consultas += [
+        {
+            "nombre": "sync.pendientes.estado",
+            "sql": f"SELECT {COLUMNAS_PENDIENTES} FROM WIX WHERE sync_status = %s ORDER BY submission_time DESC LIMIT %s",
+            "params": ["error", 100]
+        },
+        {
+            "nombre": "sync.pendientes.no_confirmados",
+            "sql": f"SELECT {COLUMNAS_PENDIENTES} FROM WIX WHERE {CONDICION_NO_CONFIRMADO} ORDER BY submission_time DESC LIMIT %s",
+            "params": [100]
+        },
+        {
+            "nombre": "sync.asesores",
+            "sql": "SELECT DISTINCT asesor_in FROM WIX WHERE asesor_in IS NOT NULL AND asesor_in != '' ORDER BY asesor_in",
+            "params": []
+        },
+        {
+            "nombre": "sync.timeouts",
+            "sql": "UPDATE WIX SET sync_status = 'timeout' WHERE sync_status = 'enviado' AND sync_sent_at < DATE_SUB(NOW(), INTERVAL %s HOUR)",
+            "params": [24]
+        },
+        {
+            "nombre": "sync.outbox.reclamar",
+            "sql": f"SELECT id FROM WIX WHERE {_CONDICION_OUTBOX} ORDER BY id LIMIT %s",
+            "params": [50]
+        },
+        {
+            "nombre": "sync.outbox.bloqueados",
+            "sql": "SELECT * FROM WIX WHERE sync_bloqueado_por = %s AND sync_status = 'enviando' ORDER BY id",
+            "params": ["despachador"]
+        },
+        {
+            "nombre": "wix_stats.agregado",
+            "sql": """
+                SELECT origen, NULLIF(asesor_in, '') AS asesor,
+                       (asesor_in IS NOT NULL AND asesor_in != '' AND fecha_asignacion IS NOT NULL) AS asignado,
+                       sync_status, COUNT(*) AS cantidad
+                FROM WIX GROUP BY origen, asesor, asignado, sync_status
+            """,
+            "params": [],
+            "escaneo_esperado": True
+        },
+        {
+            "nombre": "backfill.lote",
+            "sql": """
+                SELECT id FROM WIX
+                WHERE id > %s AND ia_procesado IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM lead_jobs j
+                      WHERE j.record_id = WIX.id AND j.etapa = 'gemini'
+                        AND j.estado IN ('pendiente', 'en_proceso')
+                  )
+                ORDER BY id LIMIT %s
+            """,
+            "params": [0, 50]
+        },
+        {
+            "nombre": "jobs.reclamar",
+            "sql": "SELECT id FROM lead_jobs WHERE estado = 'pendiente' AND disponible_en <= NOW() ORDER BY id LIMIT 10",
+            "params": []
+        },
+        {
+            "nombre": "jobs.por_record",
+            "sql": "SELECT * FROM lead_jobs WHERE record_id = %s ORDER BY id",
+            "params": [1]
+        },
+        {
+            "nombre": "cache.marcador.wix",
+            "sql": MARCADORES["WIX"],
+            "params": []
+        },
+        {
+            "nombre": "cache.marcador.encuestas",
+            "sql": MARCADORES["envio_de_encuestas"],
+            "params": []
+        },
+        {
+            "nombre": "encuestas.por_id",
+            "sql": "SELECT calificacion FROM envio_de_encuestas WHERE idcalificacion = %s",
+            "params": [1]
+        },
+        {
+            "nombre": "analytics.dias_tocados",
+            "sql": "SELECT DISTINCT DATE(timestamp) FROM envio_de_encuestas WHERE actualizado_en >= %s",
+            "params": [desde]
+        },
+        {
+            "nombre": "analytics.recalculo_rango",
+            "sql": "SELECT COUNT(*) FROM envio_de_encuestas WHERE timestamp >= %s AND timestamp < %s",
+            "params": [desde, hoy.isoformat()]
+        },
+        {
+            "nombre": "analytics.rollup",
+            "sql": "SELECT asesor, SUM(enviadas) FROM encuestas_rollup_diario "
+                   "WHERE dia >= %s AND dia <= %s GROUP BY asesor",
+            "params": [desde, hoy.isoformat()]
+        },
+        {
+            "nombre": "encuestas.listado",
+            "sql": "SELECT * FROM `envio_de_encuestas` WHERE `idcalificacion` > %s ORDER BY `idcalificacion` LIMIT %s",
+            "params": [0, 100]
+        },
+    ]
+    return consultas
+
+
+def _alertas_plan(fila: Dict[str, Any]) -> List[str]:
+    tipo = (fila.get("type") or "").upper()
+    extra = fila.get("Extra") or ""
+    alertas = []
+
+    if tipo == "ALL":
+        alertas.append("escaneo_completo")
+    elif tipo == "INDEX":
+        alertas.append("escaneo_indice")
+    if "Using filesort" in extra:
+        alertas.append("filesort")
+    if "Using temporary" in extra:
+        alertas.append("temporal")
+    return alertas
+
+
+def explicar(cursor, consulta: Dict[str, Any]) -> Dict[str, Any]:
+    """EXPLAIN de una consulta del catalogo con sus alertas por tabla."""
+    try:
+        cursor.execute("EXPLAIN " + consulta["sql"], tuple(consulta["params"]))
+        plan = cursor.fetchall()
+    except Exception as e:
+        return {"nombre": consulta["nombre"], "error": str(e), "plan": [], "alertas": []}
+
+    alertas = []
+    for fila in plan:
+        for alerta in _alertas_plan(fila):
+            alertas.append({
+                "tabla": fila.get("table"),
+                "alerta": alerta,
+                "filas_estimadas": fila.get("rows")
+            })
+
+    esperado = consulta.get("escaneo_esperado", False)
+    return {
+        "nombre": consulta["nombre"],
+        "plan": [
+            {k: fila.get(k) for k in ("table", "type", "possible_keys", "key", "rows", "Extra")}
+            for fila in plan
+        ],
+        "alertas": alertas,
+        "escaneo_esperado": esperado,
+        "escaneo_completo": not esperado and any(a["alerta"] in ALERTAS_GRAVES for a in alertas)
+    }
+
+
+def verificar_indices(cursor) -> Dict[str, Any]:
+    """Compara los indices existentes con INDICES_GESTIONADOS."""
+    resultado: Dict[str, Any] = {}
+    for tabla, esperados in INDICES_GESTIONADOS.items():
+        try:
+            cursor.execute(f"SHOW INDEX FROM `{tabla}`")
+            filas = cursor.fetchall()
+        except Exception as e:
+            resultado[tabla] = {"error": str(e)}
+            continue
+
+        existentes: Dict[str, List[str]] = {}
+        for fila in sorted(filas, key=lambda f: (f["Key_name"], f["Seq_in_index"])):
+            existentes.setdefault(fila["Key_name"], []).append(fila["Column_name"])
+
+        resultado[tabla] = {
+            "faltantes": [nombre for nombre in esperados if nombre not in existentes],
+            "distintos": {
+                nombre: existentes[nombre]
+                for nombre, columnas in esperados.items()
+                if nombre in existentes and tuple(existentes[nombre]) != columnas
+            },
+            "no_gestionados": {
+                nombre: columnas for nombre, columnas in existentes.items()
+                if nombre != "PRIMARY" and nombre not in esperados
+            }
+        }
+    return resultado
+
+
+def auditar() -> Dict[str, Any]:
+    """
+    EXPLAIN de todo el catalogo y estado de los indices gestionados.
+
+    Returns:
+        Dict con consultas, indices y la lista de consultas con escaneo completo
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        return {"error": "No se pudo conectar a la BD"}
+
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        consultas = [explicar(cursor, consulta) for consulta in consultas_del_servicio()]
+        indices = verificar_indices(cursor)
+        cursor.close()
+    finally:
+        cnx.close()
+
+    return {
+        "consultas": consultas,
+        "indices": indices,
+        "escaneos_completos": [c["nombre"] for c in consultas if c.get("escaneo_completo")]
+    }
+
+
+def _imprimir_reporte(reporte: Dict[str, Any]) -> None:
+    for consulta in reporte["consultas"]:
+        if consulta.get("error"):
+            estado = f"ERROR: {consulta['error']}"
+        elif consulta["escaneo_completo"]:
+            estado = "ESCANEO COMPLETO"
+        elif consulta["alertas"]:
+            estado = "advertencia"
+        else:
+            estado = "ok"
+        print(f"{consulta['nombre']:<36} {estado}")
+        for fila in consulta["plan"]:
+            print(f"    {fila['table']}: type={fila['type']} key={fila['key']} "
+                  f"rows={fila['rows']} {fila['Extra'] or ''}")
+        for alerta in consulta["alertas"]:
+            print(f"    ! {alerta['tabla']}: {alerta['alerta']} (~{alerta['filas_estimadas']} filas)")
+
+    print("\nIndices gestionados:")
+    for tabla, estado in reporte["indices"].items():
+        if estado.get("error"):
+            print(f"  {tabla}: ERROR {estado['error']}")
+            continue
+        print(f"  {tabla}: faltantes={estado['faltantes']} distintos={estado['distintos']} "
+              f"no_gestionados={list(estado['no_gestionados'])}")
+
+    print(f"\nConsultas con escaneo completo: {reporte['escaneos_completos'] or 'ninguna'}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN de las consultas del servicio")
+    parser.add_argument("--json", action="store_true", help="Imprime el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    reporte = auditar()
+    if "error" in reporte:
+        print(f"[IndexAdvisor] ERROR: {reporte['error']}")
+        return 2
+
+    if args.json:
+        print(json.dumps(reporte, ensure_ascii=False, indent=2, default=str))
+    else:
+        _imprimir_reporte(reporte)
+
+    faltantes = any(estado.get("faltantes") for estado in reporte["indices"].values())
+    return 1 if reporte["escaneos_completos"] or faltantes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Jobs Endpoints - Blueprint para consultar el pipeline asincrono de leads
+
+- GET  /jobs/record/{id}  - Estado de cada etapa (octopus, notificacion, gemini, sync) de un lead
+- GET  /jobs/stats        - Conteo de jobs por etapa y estado
+- POST /jobs/retry/{id}   - Reencola un job en estado error
+"""
+
+from flask import Blueprint, jsonify
+
+try:
+    from app.jobs_service import (
+        obtener_jobs_por_record,
+        obtener_estadisticas_jobs,
+        reintentar_job
+    )
+except ImportError:
+    from jobs_service import (
+        obtener_jobs_por_record,
+        obtener_estadisticas_jobs,
+        reintentar_job
+    )
+
+
+jobs_bp = Blueprint('jobs_bp', __name__)
+
+
+@jobs_bp.route('/record/<int:record_id>', methods=['GET'])
+def get_record_jobs(record_id: int):
+    """
+    GET /jobs/record/{id}
+
+    Estado de las etapas post-insercion de un lead.
+
+    Returns:
+        JSON con la lista de jobs del lead
+    """
+    jobs = obtener_jobs_por_record(record_id)
+
+    if not jobs:
+        return jsonify({
+            'status': 'error',
+            'message': f'No hay jobs para el lead {record_id}'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'record_id': record_id,
+        'completado': all(job['estado'] in ('completado', 'error') for job in jobs),
+        'jobs': jobs
+    }), 200
+
+
+@jobs_bp.route('/stats', methods=['GET'])
+def get_jobs_stats():
+    """
+    GET /jobs/stats
+
+    Conteo de jobs por etapa y estado.
+    """
+    stats = obtener_estadisticas_jobs()
+
+    if 'error' in stats:
+        return jsonify({
+            'status': 'error',
+            'message': stats['error']
+        }), 500
+
+    return jsonify({
+        'status': 'success',
+        'statistics': stats
+    }), 200
+
+
+@jobs_bp.route('/retry/<int:job_id>', methods=['POST'])
+def retry_job(job_id: int):
+    """
+    POST /jobs/retry/{id}
+
+    Reencola un job que agoto sus reintentos.
+    """
+    if not reintentar_job(job_id):
+        return jsonify({
+            'status': 'error',
+            'message': f'Job {job_id} no encontrado o no esta en estado error'
+        }), 400
+
+    return jsonify({
+        'status': 'success',
+        'message': f'Job {job_id} reencolado',
+        'job_id': job_id
+    }), 200
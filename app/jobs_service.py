@@ -0,0 +1,578 @@
+"""
+Jobs Service - Pipeline asincrono post-insercion de leads
+
+Despues de insertar un lead en WIX, las tareas lentas (EmailOctopus,
+notificacion por email, analisis Gemini y sincronizacion externa) se
+registran como jobs en la tabla lead_jobs y se procesan en segundo plano
+por un pool de workers. Cada etapa tiene sus propios reintentos con backoff.
+
+Estados de un job: pendiente, en_proceso, completado, error
+
+Uso:
+    - Workers dentro de la app (JOBS_WORKERS_ENABLED=true, por defecto)
+    - Worker independiente: python -m app.jobs_service
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+try:
+    from app.db import get_db_connection
+    from app.Mailing.octopus import add_contact_to_octopus
+    from app.Mailing.send_lead_notification import (
+        send_lead_notification_email,
+        validate_lead_notification_config
+    )
+    from app.gemini.service import analizar_lead_automatico
+    from app.sync_service import enviar_lead_a_sistema_externo
+except ImportError:
+    from db import get_db_connection
+    from Mailing.octopus import add_contact_to_octopus
+    from Mailing.send_lead_notification import (
+        send_lead_notification_email,
+        validate_lead_notification_config
+    )
+    from gemini.service import analizar_lead_automatico
+    from sync_service import enviar_lead_a_sistema_externo
+
+
+# Configuracion
+JOBS_WORKERS_ENABLED = os.getenv("JOBS_WORKERS_ENABLED", "true").lower() == "true"
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "5"))
+# Segundos tras los cuales un job 'en_proceso' se considera huerfano (worker caido)
+JOBS_LOCK_TIMEOUT = int(os.getenv("JOBS_LOCK_TIMEOUT", "600"))
+
+TABLE_NAME = "lead_jobs"
+
+
+class JobPermanenteError(Exception):
+    """Error que no tiene sentido reintentar (configuracion, datos invalidos)"""
+    pass
+
+
+# ============================================================================
+# ETAPAS DEL PIPELINE
+# ============================================================================
+
+def _etapa_octopus(record_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Agrega el contacto a la lista de EmailOctopus"""
+    try:
+        response = add_contact_to_octopus(
+            email_address=payload["correo"],
+            nombre_apellido=payload["nombre_apellido"],
+            empresa=payload["empresa"],
+            ruc_dni=payload.get("ruc_dni") or ""
+        )
+    except ValueError as e:
+        # Credenciales de EmailOctopus no configuradas
+        raise JobPermanenteError(str(e))
+
+    if response.status_code in [200, 201]:
+        return {"status_code": response.status_code}
+
+    mensaje = f"HTTP {response.status_code}: {response.text[:200]}"
+    if response.status_code == 429 or response.status_code >= 500:
+        raise Exception(mensaje)
+    raise JobPermanenteError(mensaje)
+
+
+def _etapa_notificacion(record_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Envia el email de notificacion de nuevo lead"""
+    if not validate_lead_notification_config()["ready"]:
+        raise JobPermanenteError("Configuracion de email incompleta para notificaciones")
+
+    resultado, status_code = send_lead_notification_email(payload)
+
+    if resultado["status"] == "ok":
+        return {"message": resultado["message"]}
+    if status_code == 400:
+        raise JobPermanenteError(resultado["message"])
+    raise Exception(resultado["message"])
+
+
+def _etapa_gemini(record_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Analiza el lead con Gemini y guarda el resultado en WIX"""
+    resultado = analizar_lead_automatico(payload, record_id)
+
+    if resultado.get("success"):
+        return {"siek_cliente": resultado.get("siek_cliente")}
+
+    error = resultado.get("error") or "Sin datos suficientes"
+    if error.startswith("Sin datos suficientes"):
+        # No hay nada que analizar: no es un fallo
+        return {"omitido": True, "motivo": error}
+    raise Exception(error)
+
+
+def _etapa_sync(record_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Envia el lead al sistema externo"""
+    resultado = enviar_lead_a_sistema_externo(record_id)
+
+    if resultado.get("success"):
+        return {"status_code": resultado.get("status_code")}
+    if resultado.get("skipped"):
+        return {"omitido": True, "motivo": resultado.get("message")}
+    raise Exception(resultado.get("message", "Error desconocido"))
+
+
+# etapa -> handler, reintentos y backoff base (segundos)
+ETAPAS: Dict[str, Dict[str, Any]] = {
+    "octopus": {"handler": _etapa_octopus, "max_intentos": 5, "backoff": 30},
+    "notificacion": {"handler": _etapa_notificacion, "max_intentos": 5, "backoff": 60},
+    "gemini": {"handler": _etapa_gemini, "max_intentos": 3, "backoff": 120},
+    "sync": {"handler": _etapa_sync, "max_intentos": 5, "backoff": 60},
+}
+
+# Etapas que se encolan cuando otra termina (la sync debe llevar los datos de IA)
+ETAPAS_SIGUIENTES: Dict[str, List[str]] = {
+    "gemini": ["sync"],
+}
+
+
+# ============================================================================
+# ENCOLADO
+# ============================================================================
+
+def encolar_job(cursor, record_id: int, etapa: str, payload: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Inserta un job usando el cursor recibido (no hace commit).
+    Permite encolar en la misma transaccion que el INSERT del lead.
+
+    Returns:
+        ID del job creado
+    """
+    config = ETAPAS[etapa]
+    cursor.execute(f"""
+        INSERT INTO {TABLE_NAME} (record_id, etapa, estado, max_intentos, payload, disponible_en)
+        VALUES (%s, %s, 'pendiente', %s, %s, NOW())
+    """, (record_id, etapa, config["max_intentos"], json.dumps(payload or {}, default=str)))
+    return cursor.lastrowid
+
+
+def encolar_pipeline_lead(cursor, record_id: int, etapas: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Encola varias etapas para un lead (no hace commit).
+
+    Args:
+        cursor: Cursor de la transaccion del INSERT
+        record_id: ID del lead en WIX
+        etapas: {nombre_etapa: payload}
+
+    Returns:
+        {nombre_etapa: job_id}
+    """
+    return {
+        etapa: encolar_job(cursor, record_id, etapa, payload)
+        for etapa, payload in etapas.items()
+    }
+
+
+# ============================================================================
+# PROCESAMIENTO
+# ============================================================================
+
+def _reclamar_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """Toma un job disponible marcandolo como en_proceso (claim optimista)."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return None
+
+    try:
+        cursor = cnx.cursor(dictionary=True)
+
+        cursor.execute(f"""
+            SELECT id FROM {TABLE_NAME}
+            WHERE estado = 'pendiente' AND disponible_en <= NOW()
+            ORDER BY id
+            LIMIT 10
+        """)
+        candidatos = [row["id"] for row in cursor.fetchall()]
+        cnx.commit()
+
+        for job_id in candidatos:
+            cursor.execute(f"""
+                UPDATE {TABLE_NAME} SET
+                    estado = 'en_proceso',
+                    intentos = intentos + 1,
+                    bloqueado_por = %s,
+                    bloqueado_en = NOW()
+                WHERE id = %s AND estado = 'pendiente'
+            """, (worker_id, job_id))
+            reclamado = cursor.rowcount == 1
+            cnx.commit()
+
+            if reclamado:
+                cursor.execute(f"SELECT * FROM {TABLE_NAME} WHERE id = %s", (job_id,))
+                job = cursor.fetchone()
+                cnx.commit()
+                return job
+
+        return None
+
+    except Exception as e:
+        print(f"[JobsService] ERROR al reclamar job: {e}")
+        return None
+
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+def _finalizar_job(job: Dict[str, Any], resultado: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None, permanente: bool = False) -> str:
+    """
+    Registra el resultado de un job. Solo si este worker sigue siendo su
+    dueno: si _liberar_jobs_huerfanos lo devolvio a la cola (y quiza otro
+    worker lo tomo) el resultado se descarta y no se encolan etapas.
+
+    Returns:
+        Estado final del job ("reasignado" si ya no era de este worker)
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        # El job quedara huerfano y sera liberado por _liberar_jobs_huerfanos
+        return "en_proceso"
+
+    try:
+        cursor = cnx.cursor()
+
+        if error is None:
+            estado = "completado"
+            cursor.execute(f"""
+                UPDATE {TABLE_NAME} SET
+                    estado = 'completado',
+                    resultado = %s,
+                    ultimo_error = NULL,
+                    bloqueado_por = NULL
+                WHERE id = %s AND estado = 'en_proceso' AND bloqueado_por = %s
+            """, (json.dumps(resultado or {}, default=str), job["id"], job["bloqueado_por"]))
+
+        elif permanente or job["intentos"] >= job["max_intentos"]:
+            estado = "error"
+            cursor.execute(f"""
+                UPDATE {TABLE_NAME} SET
+                    estado = 'error',
+                    ultimo_error = %s,
+                    bloqueado_por = NULL
+                WHERE id = %s AND estado = 'en_proceso' AND bloqueado_por = %s
+            """, (error[:2000], job["id"], job["bloqueado_por"]))
+
+        else:
+            estado = "pendiente"
+            # Backoff exponencial: base, 2*base, 4*base...
+            backoff = ETAPAS[job["etapa"]]["backoff"] * (2 ** (job["intentos"] - 1))
+            cursor.execute(f"""
+                UPDATE {TABLE_NAME} SET
+                    estado = 'pendiente',
+                    ultimo_error = %s,
+                    bloqueado_por = NULL,
+                    disponible_en = DATE_ADD(NOW(), INTERVAL %s SECOND)
+                WHERE id = %s AND estado = 'en_proceso' AND bloqueado_por = %s
+            """, (error[:2000], backoff, job["id"], job["bloqueado_por"]))
+
+        if cursor.rowcount != 1:
+            cnx.rollback()
+            print(f"[JobsService] Job {job['id']} ya no pertenece a {job['bloqueado_por']}: se descarta su resultado")
+            return "reasignado"
+
+        # Encolar etapas dependientes cuando la etapa termina (con o sin exito)
+        if estado in ("completado", "error"):
+            for siguiente in ETAPAS_SIGUIENTES.get(job["etapa"], []):
+                encolar_job(cursor, job["record_id"], siguiente, json.loads(job["payload"] or "{}"))
+
+        cnx.commit()
+        return estado
+
+    except Exception as e:
+        print(f"[JobsService] ERROR al finalizar job {job['id']}: {e}")
+        return "en_proceso"
+
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+def procesar_siguiente_job(worker_id: str) -> bool:
+    """
+    Procesa un job disponible.
+
+    Returns:
+        True si se proceso un job, False si la cola estaba vacia
+    """
+    job = _reclamar_job(worker_id)
+    if not job:
+        return False
+
+    etapa = job["etapa"]
+    record_id = job["record_id"]
+    config = ETAPAS.get(etapa)
+
+    if config is None:
+        _finalizar_job(job, error=f"Etapa desconocida: {etapa}", permanente=True)
+        return True
+
+    print(f"[JobsService] {worker_id} ejecutando {etapa} para lead {record_id} (intento {job['intentos']})")
+
+    try:
+        payload = json.loads(job["payload"] or "{}")
+        resultado = config["handler"](record_id, payload)
+        estado = _finalizar_job(job, resultado=resultado)
+    except JobPermanenteError as e:
+        estado = _finalizar_job(job, error=str(e), permanente=True)
+    except Exception as e:
+        estado = _finalizar_job(job, error=str(e))
+
+    print(f"[JobsService] Job {job['id']} ({etapa}, lead {record_id}) -> {estado}")
+
+    if estado in ("completado", "error") and ETAPAS_SIGUIENTES.get(etapa):
+        notificar_workers()
+
+    return True
+
+
+def _liberar_jobs_huerfanos() -> int:
+    """
+    Devuelve a 'pendiente' los jobs bloqueados por workers que ya no responden.
+    Los que ya agotaron sus intentos pasan a 'error' (y encolan sus etapas
+    dependientes, como al fallar en _finalizar_job) en vez de reintentarse
+    sin limite.
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        return 0
+
+    cursor = None
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT id, record_id, etapa, payload FROM {TABLE_NAME}
+            WHERE estado = 'en_proceso'
+              AND bloqueado_en < DATE_SUB(NOW(), INTERVAL %s SECOND)
+              AND intentos >= max_intentos
+            FOR UPDATE
+        """, (JOBS_LOCK_TIMEOUT,))
+        agotados = cursor.fetchall()
+        if agotados:
+            cursor.execute(f"""
+                UPDATE {TABLE_NAME} SET
+                    estado = 'error',
+                    bloqueado_por = NULL,
+                    ultimo_error = 'Worker sin respuesta tras agotar los intentos'
+                WHERE id IN ({", ".join(["%s"] * len(agotados))}) AND estado = 'en_proceso'
+            """, [job["id"] for job in agotados])
+            for job in agotados:
+                for siguiente in ETAPAS_SIGUIENTES.get(job["etapa"], []):
+                    encolar_job(cursor, job["record_id"], siguiente, json.loads(job["payload"] or "{}"))
+
+        cursor.execute(f"""
+            UPDATE {TABLE_NAME} SET
+                estado = 'pendiente',
+                bloqueado_por = NULL,
+                ultimo_error = 'Liberado: worker sin respuesta'
+            WHERE estado = 'en_proceso'
+              AND bloqueado_en < DATE_SUB(NOW(), INTERVAL %s SECOND)
+              AND intentos < max_intentos
+        """, (JOBS_LOCK_TIMEOUT,))
+        liberados = cursor.rowcount
+        cnx.commit()
+
+        if agotados:
+            print(f"[JobsService] {len(agotados)} jobs huerfanos sin intentos pasan a 'error'")
+        if liberados > 0:
+            print(f"[JobsService] {liberados} jobs huerfanos devueltos a la cola")
+
+        return liberados
+
+    except Exception as e:
+        cnx.rollback()
+        print(f"[JobsService] ERROR al liberar jobs huerfanos: {e}")
+        return 0
+
+    finally:
+        if cursor is not None:
+            cursor.close()
+        cnx.close()
+
+
+# ============================================================================
+# POOL DE WORKERS
+# ============================================================================
+
+_despertar = threading.Event()
+_workers: List[threading.Thread] = []
+_workers_pid: Optional[int] = None
+_workers_lock = threading.Lock()
+
+
+def _loop_worker(worker_id: str) -> None:
+    ultima_limpieza = 0.0
+
+    while True:
+        try:
+            if time.time() - ultima_limpieza > JOBS_LOCK_TIMEOUT / 2:
+                _liberar_jobs_huerfanos()
+                ultima_limpieza = time.time()
+
+            if procesar_siguiente_job(worker_id):
+                continue
+        except Exception as e:
+            print(f"[JobsService] ERROR en worker {worker_id}: {e}")
+
+        # Cola vacia: esperar un aviso de nuevos jobs o el intervalo de sondeo
+        _despertar.wait(JOBS_POLL_INTERVAL)
+        _despertar.clear()
+
+
+def iniciar_workers(cantidad: int = JOBS_WORKERS) -> int:
+    """
+    Inicia el pool de workers en hilos daemon (una vez por proceso).
+
+    Returns:
+        Cantidad de workers activos
+    """
+    global _workers, _workers_pid
+
+    pid = os.getpid()
+    with _workers_lock:
+        if _workers_pid == pid and _workers:
+            return len(_workers)
+
+        _workers = []
+        _workers_pid = pid
+        host = socket.gethostname()
+
+        for i in range(max(0, cantidad)):
+            worker_id = f"{host}:{pid}:{i}"
+            hilo = threading.Thread(target=_loop_worker, args=(worker_id,), name=f"lead-job-{i}", daemon=True)
+            hilo.start()
+            _workers.append(hilo)
+
+    if _workers:
+        print(f"[JobsService] {len(_workers)} workers iniciados (pid {pid})")
+    return len(_workers)
+
+
+def notificar_workers() -> None:
+    """Despierta a los workers para que tomen jobs recien encolados."""
+    _despertar.set()
+
+
+# ============================================================================
+# CONSULTAS
+# ============================================================================
+
+def obtener_jobs_por_record(record_id: int) -> List[Dict[str, Any]]:
+    """Obtiene el estado de todas las etapas de un lead."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return []
+
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT id, record_id, etapa, estado, intentos, max_intentos,
+                   ultimo_error, resultado, disponible_en, creado_en, actualizado_en
+            FROM {TABLE_NAME}
+            WHERE record_id = %s
+            ORDER BY id
+        """, (record_id,))
+        jobs = cursor.fetchall()
+
+        for job in jobs:
+            for key, value in job.items():
+                if isinstance(value, datetime):
+                    job[key] = value.isoformat()
+            if job.get("resultado"):
+                try:
+                    job["resultado"] = json.loads(job["resultado"])
+                except ValueError:
+                    pass
+
+        return jobs
+
+    except Exception as e:
+        print(f"[JobsService] ERROR al obtener jobs de lead {record_id}: {e}")
+        return []
+
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+def obtener_estadisticas_jobs() -> Dict[str, Any]:
+    """Conteo de jobs por etapa y estado."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return {"error": "No se pudo conectar a la BD"}
+
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT etapa, estado, COUNT(*) as cantidad
+            FROM {TABLE_NAME}
+            GROUP BY etapa, estado
+        """)
+
+        stats: Dict[str, Dict[str, int]] = {}
+        for row in cursor.fetchall():
+            stats.setdefault(row["etapa"], {})[row["estado"]] = row["cantidad"]
+
+        return stats
+
+    except Exception as e:
+        print(f"[JobsService] ERROR al obtener estadisticas de jobs: {e}")
+        return {"error": str(e)}
+
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+def reintentar_job(job_id: int) -> bool:
+    """Vuelve a encolar un job en estado 'error' (reinicia sus intentos)."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return False
+
+    try:
+        cursor = cnx.cursor()
+        cursor.execute(f"""
+            UPDATE {TABLE_NAME} SET
+                estado = 'pendiente',
+                intentos = 0,
+                disponible_en = NOW()
+            WHERE id = %s AND estado = 'error'
+        """, (job_id,))
+        actualizado = cursor.rowcount == 1
+        cnx.commit()
+
+        if actualizado:
+            notificar_workers()
+
+        return actualizado
+
+    except Exception as e:
+        print(f"[JobsService] ERROR al reintentar job {job_id}: {e}")
+        return False
+
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+if __name__ == '__main__':
+    # Worker independiente (sin servidor web)
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else JOBS_WORKERS
+    iniciar_workers(cantidad)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print("\n[JobsService] Workers detenidos")
@@ -0,0 +1,54 @@
+"""
+Proveedor JSON de la app sobre orjson (opcional)
+
+Si orjson esta instalado y JSON_RAPIDO=true, jsonify y los listados
+serializan con orjson. La salida se mantiene igual a la de Flask:
+    - claves ordenadas y separadores compactos
+    - fechas como http_date, Decimal y UUID como texto (mismo `default`)
+Diferencias menores: los caracteres no ASCII van en UTF-8 en lugar de
+\\uXXXX (el JSON decodificado es identico) y NaN/Infinity se emiten como null.
+Con indent (modo debug) o si orjson no puede serializar un valor (p.ej.
+enteros de mas de 64 bits) se usa el proveedor por defecto.
+"""
+
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional
+    orjson = None
+
+
+JSON_RAPIDO = os.environ.get('JSON_RAPIDO', 'true').lower() == 'true'
+
+
+class ProveedorJSONRapido(DefaultJSONProvider):
+    """DefaultJSONProvider que serializa con orjson cuando la salida es compacta."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        compacto = kwargs.get("separators", (",", ":")) == (",", ":")
+        if not compacto or set(kwargs) - {"separators"}:
+            return super().dumps(obj, **kwargs)
+
+        opciones = (
+            orjson.OPT_PASSTHROUGH_DATETIME      # fechas al `default` de Flask (http_date)
+            | orjson.OPT_PASSTHROUGH_DATACLASS   # dataclasses.asdict como Flask
+            | orjson.OPT_NON_STR_KEYS
+        )
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+
+        try:
+            return orjson.dumps(obj, default=self.default, option=opciones).decode()
+        except (orjson.JSONEncodeError, TypeError):
+            return super().dumps(obj, **kwargs)
+
+
+def configurar_json(app) -> bool:
+    """Instala ProveedorJSONRapido en la app si corresponde. Retorna True si quedo activo."""
+    if not JSON_RAPIDO or orjson is None:
+        return False
+    app.json = ProveedorJSONRapido(app)
+    return True
@@ -0,0 +1,250 @@
+"""
+Listados - Respuesta común para los GET que devuelven tablas completas
+
+Usado por /records, /bd/records, /wix/records y /roles_menu.
+
+Parámetros opcionales (query string):
+    - fields:  columnas a devolver separadas por coma (validadas contra la tabla)
+    - limit:   tamaño de página; activa la paginación por cursor (keyset sobre la PK)
+    - cursor:  valor opaco devuelto en next_cursor de la página anterior
+    - format:  json (por defecto), ndjson (una fila JSON por línea; en modo
+               paginado el siguiente cursor va en la cabecera X-Next-Cursor)
+               o columnar ({"columns": [...], "rows": [[...], ...]}: los
+               nombres de columna una sola vez y cada fila como arreglo)
+
+Sin limit ni cursor se devuelve la tabla completa con el mismo documento de
+siempre ({"records": [...], "status": "success"}), pero generado fila a fila
+desde un cursor no bufferizado, así la memoria no crece con el tamaño de la tabla.
+"""
+
+import os
+import json
+import time
+import base64
+import binascii
+
+from flask import request, jsonify, current_app, Response
+
+try:
+    from app.db import get_db_connection
+except ImportError:
+    from db import get_db_connection
+
+
+LISTADOS_DEFAULT_LIMIT = int(os.environ.get('LISTADOS_DEFAULT_LIMIT', 100))
+LISTADOS_MAX_LIMIT = int(os.environ.get('LISTADOS_MAX_LIMIT', 1000))
+# Filas leídas del socket por cada fetchmany en modo streaming
+LISTADOS_FETCH_SIZE = int(os.environ.get('LISTADOS_FETCH_SIZE', 500))
+# Segundos que se recuerdan las columnas de cada tabla
+COLUMNAS_CACHE_TTL = 300
+
+_columnas_cache = {}
+
+
+class ListadoError(ValueError):
+    """Parámetro de listado inválido (se responde 400)."""
+
+
+def _columnas_tabla(cursor, tabla):
+    """Columnas reales de la tabla (cacheadas por proceso)."""
+    cache = _columnas_cache.get(tabla)
+    if cache and time.time() - cache[1] < COLUMNAS_CACHE_TTL:
+        return cache[0]
+
+    cursor.execute(f"SELECT * FROM `{tabla}` LIMIT 0")
+    cursor.fetchall()
+    columnas = list(cursor.column_names)
+    _columnas_cache[tabla] = (columnas, time.time())
+    return columnas
+
+
+def codificar_cursor(valor):
+    """Cursor opaco (base64 url-safe) a partir del último valor de la PK."""
+    return base64.urlsafe_b64encode(json.dumps({'k': valor}).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor_param):
+    try:
+        relleno = '=' * (-len(cursor_param) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor_param + relleno))['k']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ListadoError('Cursor inválido.')
+
+
+def _parsear_limit(valor):
+    try:
+        limit = int(valor)
+    except (TypeError, ValueError):
+        raise ListadoError('limit debe ser un número entero.')
+    if limit < 1:
+        raise ListadoError('limit debe ser mayor que 0.')
+    return min(limit, LISTADOS_MAX_LIMIT)
+
+
+def _parsear_fields(valor, columnas, pk):
+    if not valor:
+        return None
+    fields = [f.strip() for f in valor.split(',') if f.strip()]
+    invalidas = [f for f in fields if f not in columnas]
+    if invalidas:
+        raise ListadoError(f"Columnas no válidas: {', '.join(invalidas)}")
+    # La PK siempre se incluye: es la clave del cursor
+    if pk not in fields:
+        fields.insert(0, pk)
+    return fields
+
+
+def _json_dumps():
+    """
+    dumps con el mismo formato que jsonify (proveedor JSON de la app:
+    orden de claves, fechas, separadores compactos fuera de debug).
+    """
+    provider = current_app.json
+    compact = getattr(provider, 'compact', None)
+    if compact or (compact is None and not current_app.debug):
+        return lambda obj: provider.dumps(obj, separators=(',', ':'))
+    return lambda obj: provider.dumps(obj, indent=2)
+
+
+def _generar_filas(cursor):
+    """Lee filas del socket por bloques (cursor no bufferizado)."""
+    while True:
+        filas = cursor.fetchmany(LISTADOS_FETCH_SIZE)
+        if not filas:
+            break
+        for fila in filas:
+            yield fila
+
+
+def _cerrar(cnx, cursor):
+    """Devuelve la conexión al pool (descarta filas no leídas si el cliente cortó)."""
+    cnx.close()
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+
+def _stream_documento(filas, dumps):
+    """Genera {"records": [...], "status": "success"} por partes."""
+    # Mismo orden de claves que jsonify (sort_keys): records antes que status
+    yield '{"records":['
+    primera = True
+    for fila in filas:
+        yield dumps(fila) if primera else ',' + dumps(fila)
+        primera = False
+    yield '],"status":"success"}\n'
+
+
+def a_fila(registro, columnas):
+    """Valores de un registro (dict) en el orden de `columnas` (formato columnar)."""
+    return [registro[c] for c in columnas]
+
+
+def _stream_columnar(columnas, filas, dumps):
+    """Genera {"columns": [...], "rows": [[...], ...], "status": "success"} por partes."""
+    yield '{"columns":' + dumps(columnas) + ',"rows":['
+    primera = True
+    for fila in filas:
+        valores = dumps(a_fila(fila, columnas))
+        yield valores if primera else ',' + valores
+        primera = False
+    yield '],"status":"success"}\n'
+
+
+def _stream_ndjson(filas, dumps):
+    for fila in filas:
+        yield dumps(fila) + '\n'
+
+
+def responder_listado(tabla, pk):
+    """
+    Atiende un GET de listado de `tabla` usando `pk` (entera, autoincremental)
+    como clave del cursor. Retorna una respuesta Flask.
+    """
+    args = request.args
+    formato = (args.get('format') or 'json').lower()
+    if formato not in ('json', 'ndjson', 'columnar'):
+        return jsonify({'status': 'error', 'message': 'format debe ser json, ndjson o columnar.'}), 400
+
+    cnx = get_db_connection()
+    if cnx is None:
+        return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
+
+    cursor = None
+    streaming = False
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        columnas = _columnas_tabla(cursor, tabla)
+        fields = _parsear_fields(args.get('fields'), columnas, pk)
+        select = ', '.join(f"`{f}`" for f in fields) if fields else '*'
+
+        paginado = 'limit' in args or 'cursor' in args
+        limit = _parsear_limit(args.get('limit', LISTADOS_DEFAULT_LIMIT)) if paginado else None
+        desde = decodificar_cursor(args['cursor']) if args.get('cursor') else None
+
+        query = f"SELECT {select} FROM `{tabla}`"
+        params = []
+        if desde is not None:
+            query += f" WHERE `{pk}` > %s"
+            params.append(desde)
+        if paginado:
+            # Una fila extra para saber si hay página siguiente
+            query += f" ORDER BY `{pk}` LIMIT %s"
+            params.append(limit + 1)
+
+        cursor.execute(query, tuple(params))
+        dumps = _json_dumps()
+
+        if paginado:
+            # Página acotada por limit: se lee completa para calcular next_cursor
+            records = cursor.fetchall()
+            has_more = len(records) > limit
+            records = records[:limit]
+            next_cursor = codificar_cursor(records[-1][pk]) if has_more else None
+
+            if formato == 'ndjson':
+                response = Response(_stream_ndjson(records, dumps), mimetype='application/x-ndjson')
+                if next_cursor:
+                    response.headers['X-Next-Cursor'] = next_cursor
+                return response
+
+            if formato == 'columnar':
+                return jsonify({
+                    'status': 'success',
+                    'columns': fields or columnas,
+                    'rows': [a_fila(r, fields or columnas) for r in records],
+                    'has_more': has_more,
+                    'next_cursor': next_cursor
+                }), 200
+
+            return jsonify({
+                'status': 'success',
+                'records': records,
+                'has_more': has_more,
+                'next_cursor': next_cursor
+            }), 200
+
+        # Tabla completa en streaming: la conexión sigue prestada hasta que el
+        # servidor cierra la respuesta (fin del envío o desconexión del cliente)
+        filas = _generar_filas(cursor)
+        if formato == 'ndjson':
+            response = Response(_stream_ndjson(filas, dumps), mimetype='application/x-ndjson')
+        elif formato == 'columnar':
+            response = Response(_stream_columnar(fields or columnas, filas, dumps), mimetype='application/json')
+        else:
+            response = Response(_stream_documento(filas, dumps), mimetype='application/json')
+        response.call_on_close(lambda: _cerrar(cnx, cursor))
+        streaming = True
+        return response
+
+    except ListadoError as err:
+        return jsonify({'status': 'error', 'message': str(err)}), 400
+    except Exception as err:
+        return jsonify({'status': 'error', 'message': str(err)}), 500
+    finally:
+        if not streaming:
+            if cursor is not None:
+                cursor.close()
+            cnx.close()
+
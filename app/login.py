@@ -1,12 +1,18 @@
 from flask import Blueprint, request, jsonify
 import mysql.connector
-import os
 import logging
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde .env si es necesario
 load_dotenv()
 
+try:
+    # Importaciones del paquete app (para Render/producción)
+    from app.db import get_db_connection
+except ImportError:
+    # Importaciones relativas (para desarrollo con run_app.py)
+    from db import get_db_connection
+
 # Crear el blueprint para el endpoint de login
 login_bp = Blueprint('login_bp', __name__)
 
@@ -14,25 +20,6 @@ login_bp = Blueprint('login_bp', __name__)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Configuración de la base de datos desde variables de entorno
-DB_CONFIG = {
-    'user': os.getenv('MYSQL_USER'),
-    'password': os.getenv('MYSQL_PASSWORD'),
-    'host': os.getenv('MYSQL_HOST'),
-    'database': os.getenv('MYSQL_DATABASE'),
-    'port': int(os.getenv('MYSQL_PORT', 3306))
-}
-
-def get_db_connection():
-    """Establece conexión a la base de datos."""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        logger.info("Conexión exitosa a la BD")
-        return conn
-    except mysql.connector.Error as err:
-        logger.error(f"Error de conexión: {err}")
-        return None
-
 @login_bp.route('/login', methods=['POST'])
 def handle_login():
     # Validar que se reciba JSON
@@ -81,5 +68,6 @@ def handle_login():
     finally:
         if conn.is_connected():
             cursor.close()
-            conn.close()
+        # Siempre devolver la conexión al pool
+        conn.close()
 
@@ -1,17 +1,18 @@
 import os
 import re
+import time
 import requests
 import mysql.connector
 from mysql.connector import errorcode
 from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
-import ftplib
 
 # Importaciones del paquete app para compatibilidad con Gunicorn en producción
 try:
     # Intenta importaciones del paquete (para Render/producción)
     from app.db import get_db_connection
-    from app.enviar_encuesta import enviar_encuesta, enviar_email_lamentamos
+    from app.enviar_encuesta import enviar_encuesta, preparar_encuesta, preparar_email_lamentamos
+    from app.Mailing.smtp_transport import encolar_correo, estado_cola
     from app.login import login_bp
     from app.roles_menu import roles_menu_bp
     from app.Mailing.wix import wix_bp
@@ -19,10 +20,27 @@ try:
     from app.bd_endpoints import bd_bp
     from app.records import records_bp
     from app.sync_endpoints import sync_bp
+    from app.migrations import aplicar_migraciones, RUN_MIGRATIONS_ON_STARTUP
+    from app.jobs_endpoints import jobs_bp
+    from app.jobs_service import iniciar_workers, JOBS_WORKERS_ENABLED
+    from app.gemini.endpoints import gemini_bp
+    from app.analytics_endpoints import analytics_bp
+    from app.http_client import estado_http
+    from app.cache_respuestas import marcar_cambio, estado_cache_respuestas
+    from app.compresion import registrar_compresion
+    from app.json_rapido import configurar_json
+    from app.buffer_calificaciones import (
+        registrar_click, estado_encuesta, iniciar_flusher, estado_buffer, ENCUESTA_BUFFER_ENABLED
+    )
+    from app.catalogo_imagenes import (
+        obtener_imagenes, refrescar_catalogo, estado_catalogo, iniciar_refresco_catalogo,
+        CATALOGO_CARPETAS, CATALOGO_REFRESCO_ENABLED
+    )
 except ImportError:
     # Si falla, usa importaciones relativas (para desarrollo con run_app.py)
     from db import get_db_connection
-    from enviar_encuesta import enviar_encuesta, enviar_email_lamentamos
+    from enviar_encuesta import enviar_encuesta, preparar_encuesta, preparar_email_lamentamos
+    from Mailing.smtp_transport import encolar_correo, estado_cola
     from login import login_bp
     from roles_menu import roles_menu_bp
     from Mailing.wix import wix_bp
@@ -30,8 +48,26 @@ except ImportError:
     from bd_endpoints import bd_bp
     from records import records_bp
     from sync_endpoints import sync_bp
+    from migrations import aplicar_migraciones, RUN_MIGRATIONS_ON_STARTUP
+    from jobs_endpoints import jobs_bp
+    from jobs_service import iniciar_workers, JOBS_WORKERS_ENABLED
+    from gemini.endpoints import gemini_bp
+    from analytics_endpoints import analytics_bp
+    from http_client import estado_http
+    from cache_respuestas import marcar_cambio, estado_cache_respuestas
+    from compresion import registrar_compresion
+    from json_rapido import configurar_json
+    from buffer_calificaciones import (
+        registrar_click, estado_encuesta, iniciar_flusher, estado_buffer, ENCUESTA_BUFFER_ENABLED
+    )
+    from catalogo_imagenes import (
+        obtener_imagenes, refrescar_catalogo, estado_catalogo, iniciar_refresco_catalogo,
+        CATALOGO_CARPETAS, CATALOGO_REFRESCO_ENABLED
+    )
 
 app = Flask(__name__)
+configurar_json(app)
+registrar_compresion(app)
 
 # Configuración de CORS
 CORS(app, resources={r"/*": {"origins": [
@@ -43,99 +79,77 @@ CORS(app, resources={r"/*": {"origins": [
 
 TABLE_NAME = "envio_de_encuestas"
 
-def create_table_if_not_exists(cursor):
-    """
-    Crea la tabla envio_de_encuestas si no existe.
-    Incluye las columnas calificacion, segmento, tipo, grupo y, si es necesario,
-    agrega las columnas observaciones y documento.
-    También se agrega la columna fecha_califacion para registrar el momento de la calificación.
+# Límites de /submit/batch
+SUBMIT_BATCH_MAX_ROWS = int(os.environ.get('SUBMIT_BATCH_MAX_ROWS', 5000))
+SUBMIT_BATCH_CHUNK_SIZE = int(os.environ.get('SUBMIT_BATCH_CHUNK_SIZE', 500))
+# Segundos que se espera en total por espacio en la cola de correos; las filas que no
+# entren en ese plazo se registran con el correo "no encolado"
+SUBMIT_BATCH_QUEUE_TIMEOUT = int(os.environ.get('SUBMIT_BATCH_QUEUE_TIMEOUT', 30))
+
+
+def validar_encuesta(data):
     """
-    create_table_query = f"""
-    CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-        idcalificacion INT AUTO_INCREMENT PRIMARY KEY,
-        asesor VARCHAR(255) NOT NULL,
-        nombres VARCHAR(255) NOT NULL,
-        ruc VARCHAR(50) NOT NULL,
-        correo VARCHAR(255) NOT NULL,
-        documento VARCHAR(255) NULL,
-        segmento VARCHAR(255),
-        tipo VARCHAR(50),
-        grupo VARCHAR(255),
-        calificacion VARCHAR(50),
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        fecha_califacion DATETIME NULL
-    ) ENGINE=InnoDB;
+    Valida los campos de una encuesta (usado por /submit y /submit/batch).
+    Retorna (valores, None) si es válida o (None, mensaje_error) si no.
     """
-    cursor.execute(create_table_query)
+    if not isinstance(data, dict):
+        return None, 'Formato de fila inválido.'
 
-    # Agregar la columna observaciones si no existe
-    try:
-        add_observaciones_query = f"""
-        ALTER TABLE {TABLE_NAME}
-        ADD COLUMN observaciones TEXT NULL AFTER calificacion;
-        """
-        cursor.execute(add_observaciones_query)
-    except mysql.connector.Error as err:
-        if err.errno == 1060:  # Columna duplicada
-            pass
-        else:
-            raise
+    asesor = data.get('asesor')
+    nombres = data.get('nombres')
+    ruc = data.get('ruc')
+    correo = data.get('correo')
 
-    # Agregar la columna documento si no existe (en caso de que la tabla ya exista)
-    try:
-        add_documento_query = f"""
-        ALTER TABLE {TABLE_NAME}
-        ADD COLUMN documento VARCHAR(255) NULL AFTER correo;
-        """
-        cursor.execute(add_documento_query)
-    except mysql.connector.Error as err:
-        if err.errno == 1060:
-            pass
-        else:
-            raise
+    # Validación de campos requeridos (se omite "grupo" al no ser obligatorio)
+    if not all([asesor, nombres, ruc, correo]):
+        return None, 'Faltan campos por completar.'
 
-    # Agregar la columna tipo si no existe
-    try:
-        add_tipo_query = f"""
-        ALTER TABLE {TABLE_NAME}
-        ADD COLUMN tipo VARCHAR(50) NULL AFTER segmento;
-        """
-        cursor.execute(add_tipo_query)
-    except mysql.connector.Error as err:
-        if err.errno == 1060:
-            pass
-        else:
-            raise
+    # Validar formato del correo
+    if not re.match(r"[^@]+@[^@]+\.[^@]+", str(correo)):
+        return None, 'Correo electrónico inválido.'
 
-    # Agregar la columna grupo si no existe
-    try:
-        add_grupo_query = f"""
-        ALTER TABLE {TABLE_NAME}
-        ADD COLUMN grupo VARCHAR(255) NULL AFTER tipo;
-        """
-        cursor.execute(add_grupo_query)
-    except mysql.connector.Error as err:
-        if err.errno == 1060:
-            pass
-        else:
-            raise
+    # Validar RUC (debe ser numérico y tener 11 dígitos)
+    ruc = str(ruc)
+    if not ruc.isdigit() or len(ruc) != 11:
+        return None, 'RUC inválido. Debe contener 11 dígitos.'
+
+    return {
+        'asesor': asesor,
+        'nombres': nombres,
+        'ruc': ruc,
+        'correo': correo,
+        'documento': data.get('documento') or None,  # Campo opcional
+        'segmento': "Otros",  # Se asigna el segmento "Otros"
+        'tipo': data.get('tipo', ''),
+        'grupo': data.get('grupo')  # Campo "grupo" ahora es opcional
+    }, None
 
-    # Agregar la columna fecha_califacion si no existe
-    try:
-        add_fecha_califacion_query = f"""
-        ALTER TABLE {TABLE_NAME}
-        ADD COLUMN fecha_califacion DATETIME NULL AFTER timestamp;
-        """
-        cursor.execute(add_fecha_califacion_query)
-    except mysql.connector.Error as err:
-        if err.errno == 1060:
-            pass
-        else:
-            raise
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"}), 200
 
+@app.route('/health/http', methods=['GET'])
+def health_http():
+    """Sesiones HTTP salientes, reintentos y circuit breakers (de este proceso)."""
+    return jsonify({"status": "ok", "http": estado_http()}), 200
+
+@app.route('/health/cache', methods=['GET'])
+def health_cache():
+    """Cache de respuestas y GET condicional de este proceso (ver cache_respuestas.py)."""
+    return jsonify({"status": "ok", "cache": estado_cache_respuestas()}), 200
+
+
+@app.route('/health/smtp', methods=['GET'])
+def health_smtp():
+    """Cola de correos en segundo plano y sesiones SMTP del pool (de este proceso)."""
+    return jsonify({"status": "ok", "smtp": estado_cola()}), 200
+
+
+@app.route('/health/buffer_encuestas', methods=['GET'])
+def health_buffer_encuestas():
+    """Clics de /encuesta pendientes en el buffer y lag del flush."""
+    return jsonify(estado_buffer()), 200
+
 
 @app.route('/submit', methods=['POST'])
 def submit():
@@ -147,28 +161,18 @@ def submit():
     if not data:
         return jsonify({'status': 'error', 'message': 'Falta el body JSON'}), 400
 
-    asesor = data.get('asesor')
-    nombres = data.get('nombres')
-    ruc = data.get('ruc')
-    correo = data.get('correo')
-    tipo = data.get('tipo', '')
-    grupo = data.get('grupo')  # Campo "grupo" ahora es opcional
-    documento = data.get('documento') or None  # Campo opcional
-
-    # Validación de campos requeridos (se omite "grupo" al no ser obligatorio)
-    if not all([asesor, nombres, ruc, correo]):
-        return jsonify({'status': 'error', 'message': 'Faltan campos por completar.'}), 400
+    encuesta_data, error = validar_encuesta(data)
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
 
-    # Validar formato del correo
-    if not re.match(r"[^@]+@[^@]+\.[^@]+", correo):
-        return jsonify({'status': 'error', 'message': 'Correo electrónico inválido.'}), 400
-
-    # Validar RUC (debe ser numérico y tener 11 dígitos)
-    if not ruc.isdigit() or len(ruc) != 11:
-        return jsonify({'status': 'error', 'message': 'RUC inválido. Debe contener 11 dígitos.'}), 400
-
-    # Se asigna el segmento "Otros"
-    segmento = "Otros"
+    asesor = encuesta_data['asesor']
+    nombres = encuesta_data['nombres']
+    ruc = encuesta_data['ruc']
+    correo = encuesta_data['correo']
+    tipo = encuesta_data['tipo']
+    grupo = encuesta_data['grupo']
+    documento = encuesta_data['documento']
+    segmento = encuesta_data['segmento']
 
     # Insertar los datos en la BD
     cnx = get_db_connection()
@@ -177,16 +181,16 @@ def submit():
 
     try:
         cursor = cnx.cursor()
-        create_table_if_not_exists(cursor)
 
         insert_query = f"""
         INSERT INTO {TABLE_NAME} (asesor, nombres, ruc, correo, documento, segmento, tipo, grupo)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
         """
         cursor.execute(insert_query, (asesor, nombres, ruc, correo, documento, segmento, tipo, grupo))
+        idcalificacion = cursor.lastrowid
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
 
-        idcalificacion = cursor.lastrowid
         numero_consulta = f"CONS-{idcalificacion:06d}"
     except mysql.connector.Error as err:
         print(f"Error al insertar los datos en la base de datos: {err}")
@@ -211,6 +215,219 @@ def submit():
     return jsonify({'status': 'success', 'message': 'Datos guardados y encuesta enviada correctamente.'}), 200
 
 
+@app.route('/submit/batch', methods=['POST'])
+def submit_batch():
+    """
+    Registra muchas encuestas en una sola llamada (cierres diarios del ERP).
+    Acepta una lista de filas con el mismo formato de /submit, o {"encuestas": [...]}.
+    Inserta por bloques con un INSERT multi-fila y encola los correos para
+    envío en segundo plano, esperando por espacio en la cola como máximo
+    SUBMIT_BATCH_QUEUE_TIMEOUT segundos en total. Retorna el resultado de cada
+    fila en el mismo orden.
+    """
+    data = request.get_json(silent=True)
+    filas = data.get('encuestas') if isinstance(data, dict) else data
+    if not isinstance(filas, list) or not filas:
+        return jsonify({'status': 'error', 'message': 'Se espera una lista de encuestas.'}), 400
+
+    if len(filas) > SUBMIT_BATCH_MAX_ROWS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Máximo {SUBMIT_BATCH_MAX_ROWS} encuestas por lote.'
+        }), 400
+
+    resultados = [None] * len(filas)
+    validas = []  # (índice, valores)
+    for i, fila in enumerate(filas):
+        encuesta_data, error = validar_encuesta(fila)
+        if error:
+            resultados[i] = {'index': i, 'status': 'error', 'message': error}
+        else:
+            validas.append((i, encuesta_data))
+
+    if validas:
+        cnx = get_db_connection()
+        if cnx is None:
+            return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
+
+        try:
+            cursor = cnx.cursor()
+            limite_cola = time.monotonic() + SUBMIT_BATCH_QUEUE_TIMEOUT
+            insert_query = f"""
+            INSERT INTO {TABLE_NAME} (asesor, nombres, ruc, correo, documento, segmento, tipo, grupo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """
+
+            for inicio in range(0, len(validas), SUBMIT_BATCH_CHUNK_SIZE):
+                bloque = validas[inicio:inicio + SUBMIT_BATCH_CHUNK_SIZE]
+                try:
+                    cursor.executemany(insert_query, [
+                        (e['asesor'], e['nombres'], e['ruc'], e['correo'],
+                         e['documento'], e['segmento'], e['tipo'], e['grupo'])
+                        for _, e in bloque
+                    ])
+                    ids = _leer_ids_insertados(cursor, cursor.lastrowid, bloque)
+                    if ids is None:
+                        raise mysql.connector.Error(msg="No se pudieron leer los ids insertados")
+                    cnx.commit()
+                    marcar_cambio(TABLE_NAME, cnx)
+                except mysql.connector.Error as err:
+                    cnx.rollback()
+                    print(f"Error al insertar lote de encuestas: {err}")
+                    for i, _ in bloque:
+                        resultados[i] = {
+                            'index': i,
+                            'status': 'error',
+                            'message': 'Error al insertar los datos en la base de datos.'
+                        }
+                    continue
+
+                for (i, e), idcalificacion in zip(bloque, ids):
+                    numero_consulta = f"CONS-{idcalificacion:06d}"
+                    espera = max(0.0, limite_cola - time.monotonic())
+                    resultados[i] = _encolar_encuesta_lote(i, numero_consulta, e, espera)
+        finally:
+            cursor.close()
+            cnx.close()
+
+    errores = sum(1 for r in resultados if r['status'] == 'error')
+    return jsonify({
+        'status': 'success' if errores == 0 else 'partial',
+        'total': len(filas),
+        'insertadas': sum(1 for r in resultados if r.get('numero_consulta')),
+        'errores': errores,
+        'resultados': resultados
+    }), 200
+
+
+def _leer_ids_insertados(cursor, primer_id, bloque):
+    """
+    Ids de las filas de `bloque` recién insertadas (misma transacción), en orden.
+    No se asume que sean consecutivos: con innodb_autoinc_lock_mode=2 otra
+    sesión puede intercalar ids. Se leen las filas desde `primer_id` con los
+    mismos correos y se emparejan en orden (correo, ruc) con el bloque.
+    None si falta alguna.
+    """
+    def clave(correo, ruc):
+        return str(correo).strip().lower(), str(ruc).strip()
+
+    correos = sorted({e['correo'] for _, e in bloque})
+    cursor.execute(f"""
+        SELECT idcalificacion, correo, ruc FROM {TABLE_NAME}
+        WHERE idcalificacion >= %s AND correo IN ({", ".join(["%s"] * len(correos))})
+        ORDER BY idcalificacion
+    """, (primer_id, *correos))
+
+    claves = [clave(e['correo'], e['ruc']) for _, e in bloque]
+    ids = []
+    for idcalificacion, correo, ruc in cursor.fetchall():
+        if len(ids) < len(claves) and clave(correo, ruc) == claves[len(ids)]:
+            ids.append(idcalificacion)
+    return ids if len(ids) == len(claves) else None
+
+
+def _encolar_encuesta_lote(index, numero_consulta, encuesta_data, espera):
+    """
+    Prepara el correo de una fila ya insertada y lo encola para envío,
+    esperando a lo sumo `espera` segundos por espacio en la cola.
+    """
+    resultado = {'index': index, 'status': 'success', 'numero_consulta': numero_consulta}
+    try:
+        mensaje, respuesta = preparar_encuesta(
+            nombre_cliente=encuesta_data['nombres'],
+            correo_cliente=encuesta_data['correo'],
+            asesor=encuesta_data['asesor'],
+            numero_consulta=numero_consulta,
+            tipo=encuesta_data['tipo'],
+            documento=encuesta_data['documento']
+        )
+    except Exception as e:
+        resultado.update({'status': 'error', 'email': 'error', 'message': f'Error al preparar el correo: {e}'})
+        return resultado
+
+    if mensaje is None:
+        # Correos internos u otros casos en que no corresponde enviar
+        resultado['email'] = 'omitido'
+        resultado['message'] = respuesta[0]['message']
+    elif encolar_correo(mensaje, timeout=espera):
+        resultado['email'] = 'encolado'
+    else:
+        resultado.update({
+            'status': 'error',
+            'email': 'no encolado',
+            'message': 'Encuesta registrada, pero la cola de correos está llena: el correo no se envió.'
+        })
+    return resultado
+
+
+def _preparar_lamentamos(unique_id, tipo_param):
+    """Lee los datos del cliente y arma el email de lamentamos (corre en la cola SMTP)."""
+    cnx = get_db_connection()
+    if cnx is None:
+        print(f"⚠️  Sin conexión a BD para el email de lamentamos de unique_id: {unique_id}")
+        return None
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT nombres, correo, documento, tipo FROM {TABLE_NAME} WHERE idcalificacion = %s",
+            (unique_id,)
+        )
+        datos_cliente = cursor.fetchone()
+        cursor.close()
+    finally:
+        cnx.close()
+
+    if not datos_cliente:
+        print(f"⚠️  No se encontraron datos del cliente para unique_id: {unique_id}")
+        return None
+
+    # Generar número de consulta con validación
+    try:
+        numero_consulta = f"CONS-{int(unique_id):06d}"
+    except (ValueError, TypeError):
+        numero_consulta = f"CONS-{unique_id or 'UNKNOWN'}"
+
+    mensaje, respuesta = preparar_email_lamentamos(
+        nombre_cliente=datos_cliente['nombres'],
+        correo_cliente=datos_cliente['correo'],
+        numero_consulta=numero_consulta,
+        tipo=datos_cliente['tipo'] or tipo_param,
+        documento=datos_cliente['documento']
+    )
+    if mensaje is None:
+        print(f"⚠️  Email de lamentamos no enviado: {respuesta[0]['message']}")
+    return mensaje
+
+
+def _al_calificar(unique_id, calificacion_num, tipo_param):
+    """Tras registrar una calificación (modo directo o flush del buffer)."""
+    # Calificaciones 1-3: Insatisfecho (equivalente a "Malo") - Email de lamentamos.
+    # Los datos del cliente se leen y el correo se arma en el hilo de la cola SMTP,
+    # así la redirección no espera ni la consulta ni la sesión SMTP
+    if calificacion_num <= 3:
+        if not encolar_correo(lambda: _preparar_lamentamos(unique_id, tipo_param)):
+            print(f"⚠️  Email de lamentamos no encolado para unique_id: {unique_id}")
+
+
+def _redireccion_calificacion(calificacion_num, tipo, unique_id):
+    """Página a la que se redirige según la calificación y el tipo."""
+    tipo_param = (tipo or "").strip()
+    # Lógica de redirección según la nueva escala numérica
+    # Calificaciones 1-3: Insatisfecho - página de lamentación según el tipo
+    # Calificaciones 4-10: página de agradecimiento
+    if calificacion_num <= 3:
+        if tipo_param in ["Ventas", "Ventas (OT)", "Ventas (OC)"]:
+            # Redirige a la página de lamentación para Ventas
+            return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_ventas.html?unique_id={unique_id}")
+        elif tipo_param in ["Operaciones"]:
+            # Redirige a la página de lamentación para Operaciones
+            return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_operaciones.html?unique_id={unique_id}")
+        else:
+            # Para Coordinador (Conformidad) u otro, redirige a la página de lamentación de coordinación
+            return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_coordinacion.html?unique_id={unique_id}")
+    return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-gracias.html?unique_id={unique_id}")
+
+
 @app.route('/encuesta', methods=['GET'])
 def encuesta():
     unique_id = request.args.get('unique_id')
@@ -231,97 +448,49 @@ def encuesta():
     except ValueError:
         return jsonify({'status': 'error', 'message': 'Calificación debe ser un número del 1 al 10.'}), 400
 
+    # Modo buffer: se valida la encuesta, se anota el clic localmente y el flusher lo aplica en lote
+    if ENCUESTA_BUFFER_ENABLED and unique_id.isdigit():
+        unique_id = str(int(unique_id))
+        estado = estado_encuesta(unique_id)
+        if estado == "no_existe":
+            return jsonify({'status': 'error', 'message': 'No se encontró el registro con ese unique_id.'}), 404
+        if estado == "respondida":
+            return redirect("https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-ya-respondida.html")
+        anotado = registrar_click(unique_id, calificacion_num, (tipo or "").strip()) if estado else None
+        if anotado is False:
+            return redirect("https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-ya-respondida.html")
+        if anotado:
+            return _redireccion_calificacion(calificacion_num, tipo, unique_id)
+        # anotado None: validacion o buffer no disponibles, se sigue por el modo directo
+
     cnx = get_db_connection()
     if cnx is None:
         return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
 
     try:
-        cursor = cnx.cursor(dictionary=True)
-        select_query = f"SELECT calificacion FROM {TABLE_NAME} WHERE idcalificacion = %s"
-        cursor.execute(select_query, (unique_id,))
-        row = cursor.fetchone()
-
-        if not row:
-            return jsonify({'status': 'error', 'message': 'No se encontró el registro con ese unique_id.'}), 404
-
-        calificacion_actual = row['calificacion']
-        # Si ya hay una calificación previa, redirige a "ya respondida"
-        if calificacion_actual and str(calificacion_actual).strip():
-            return redirect("https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-ya-respondida.html")
-
+        cursor = cnx.cursor()
+        # Un solo UPDATE condicional: solo califica si aún no hay calificación.
+        # rowcount decide si se registró (evita el SELECT previo y la carrera entre clics).
         update_query = f"""
             UPDATE {TABLE_NAME}
             SET calificacion = %s, fecha_califacion = CURRENT_TIMESTAMP
-            WHERE idcalificacion = %s
+            WHERE idcalificacion = %s AND (calificacion IS NULL OR calificacion = '')
         """
         cursor.execute(update_query, (calificacion_num, unique_id))
+        calificada = cursor.rowcount == 1
         cnx.commit()
+        if calificada:
+            marcar_cambio(TABLE_NAME, cnx)
+
+        if not calificada:
+            # Solo en este caso se distingue "no existe" de "ya respondida"
+            cursor.execute(f"SELECT 1 FROM {TABLE_NAME} WHERE idcalificacion = %s", (unique_id,))
+            if not cursor.fetchone():
+                return jsonify({'status': 'error', 'message': 'No se encontró el registro con ese unique_id.'}), 404
+            return redirect("https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-ya-respondida.html")
 
-        # Lógica de redirección según la nueva escala numérica
-        # Calificaciones 1-3: Insatisfecho (equivalente a "Malo") - Email de lamentamos
-        # Calificaciones 4-7: Regular 
-        # Calificaciones 8-10: Satisfecho (equivalente a "Bueno")
-        
-        if calificacion_num <= 3:
-            # CALIFICACIÓN BAJA (1-3): Enviar email de lamentamos + redirigir
-            tipo_param = (tipo or "").strip()
-            
-            # --- ENVÍO AUTOMÁTICO DE EMAIL DE LAMENTAMOS ---
-            try:
-                # Obtener datos completos del cliente desde la base de datos
-                cursor_datos = cnx.cursor(dictionary=True)
-                query_datos = f"""
-                    SELECT asesor, nombres, correo, documento, tipo, segmento, grupo 
-                    FROM {TABLE_NAME} 
-                    WHERE idcalificacion = %s
-                """
-                cursor_datos.execute(query_datos, (unique_id,))
-                datos_cliente = cursor_datos.fetchone()
-                cursor_datos.close()
-                
-                if datos_cliente:
-                    # Generar número de consulta con validación
-                    try:
-                        unique_id_int = int(unique_id) if unique_id else 0
-                        numero_consulta = f"CONS-{unique_id_int:06d}"
-                    except (ValueError, TypeError):
-                        numero_consulta = f"CONS-{unique_id or 'UNKNOWN'}"
-                    
-                    # Enviar email de lamentamos automáticamente
-                    print(f"📧 Enviando email de lamentamos automático para calificación {calificacion_num}")
-                    resultado_email, codigo_email = enviar_email_lamentamos(
-                        nombre_cliente=datos_cliente['nombres'],
-                        correo_cliente=datos_cliente['correo'],
-                        numero_consulta=numero_consulta,
-                        tipo=datos_cliente['tipo'] or tipo_param,
-                        documento=datos_cliente['documento']
-                    )
-                    
-                    if codigo_email == 200:
-                        print(f"✅ Email de lamentamos enviado exitosamente: {resultado_email['message']}")
-                    else:
-                        print(f"⚠️  Error enviando email de lamentamos: {resultado_email['message']}")
-                        
-                else:
-                    print(f"⚠️  No se encontraron datos del cliente para unique_id: {unique_id}")
-                    
-            except Exception as e:
-                print(f"❌ Error enviando email de lamentamos automático: {e}")
-                # Continuamos con la redirección aunque falle el email
-            
-            # --- REDIRECCIÓN SEGÚN EL TIPO (como antes) ---
-            if tipo_param in ["Ventas", "Ventas (OT)", "Ventas (OC)"]:
-                # Redirige a la página de lamentación para Ventas
-                return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_ventas.html?unique_id={unique_id}")
-            elif tipo_param in ["Operaciones"]:
-                # Redirige a la página de lamentación para Operaciones
-                return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_operaciones.html?unique_id={unique_id}")
-            else:
-                # Para Coordinador (Conformidad) u otro, redirige a la página de lamentación de coordinación
-                return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta_lamentamos_coordinacion.html?unique_id={unique_id}")
-        else:
-            # Para calificaciones 5-10 redirige a la página de agradecimiento
-            return redirect(f"https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-gracias.html?unique_id={unique_id}")
+        _al_calificar(unique_id, calificacion_num, (tipo or "").strip())
+        return _redireccion_calificacion(calificacion_num, tipo, unique_id)
 
     except mysql.connector.Error as err:
         print(f"Error al actualizar la calificación: {err}")
@@ -359,6 +528,7 @@ def guardar_observaciones():
         update_query = f"UPDATE {TABLE_NAME} SET observaciones = %s WHERE idcalificacion = %s"
         cursor.execute(update_query, (comentario, unique_id))
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
 
         return jsonify({'status': 'success', 'message': 'Comentario guardado correctamente'}), 200
     except mysql.connector.Error as err:
@@ -374,25 +544,33 @@ def segmento_imagenes():
     if not unique_id:
         return jsonify({'status': 'error', 'message': 'Falta el parámetro unique_id'}), 400
 
-    carpeta = "Otros"
-    try:
-        ftp = ftplib.FTP("75.102.23.104", "kossodo_kossodo.estilovisual.com", "kossodo2024##")
-        ftp.cwd(f"/marketing/calificacion/categorias/{carpeta}")
-        files = ftp.nlst()
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
-        image_filenames = [f for f in files if f.lower().endswith(valid_extensions)]
-        ftp.quit()
-    except ftplib.all_errors as e:
-        print(f"Error FTP: {e}")
-        return jsonify({'status': 'error', 'message': 'Error al acceder vía FTP'}), 500
-
-    image_urls = [f"https://kossodo.estilovisual.com/marketing/calificacion/categorias/{carpeta}/{filename}"
-                  for filename in image_filenames]
+    # Las imágenes salen del catálogo en memoria (refrescado en segundo plano)
+    carpeta = request.args.get('carpeta', CATALOGO_CARPETAS[0])
+    if carpeta not in CATALOGO_CARPETAS:
+        return jsonify({'status': 'error', 'message': 'Carpeta no válida'}), 400
+
     return jsonify({
         'status': 'success',
-        'image_urls': image_urls
+        'image_urls': obtener_imagenes(carpeta)
     }), 200
 
+@app.route('/segmento_imagenes/refrescar', methods=['POST'])
+def refrescar_segmento_imagenes():
+    """Vuelve a listar las carpetas por FTP sin esperar al refresco periódico."""
+    resultado = refrescar_catalogo()
+    if not resultado['success']:
+        return jsonify({
+            'status': 'error',
+            'message': 'Error al acceder vía FTP; se mantiene el último catálogo',
+            'catalogo': estado_catalogo()
+        }), 502
+    return jsonify({'status': 'success', 'catalogo': estado_catalogo()}), 200
+
+@app.route('/segmento_imagenes/catalogo', methods=['GET'])
+def get_catalogo_imagenes():
+    """Carpetas en memoria, cantidad de imágenes y antigüedad del último listado."""
+    return jsonify({'status': 'success', 'catalogo': estado_catalogo()}), 200
+
 
 @app.route('/feedback_especifico', methods=['GET'])
 def guardar_feedback_especifico():
@@ -457,6 +635,7 @@ def guardar_feedback_especifico():
         update_query = f"UPDATE {TABLE_NAME} SET observaciones = %s WHERE idcalificacion = %s"
         cursor.execute(update_query, (observaciones_nuevas, unique_id))
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
 
         # Redirigir a página de agradecimiento final por feedback específico
         return redirect("https://kossodo.estilovisual.com/kossomet/califacion/paginas/encuesta-gracias_final.html")
@@ -478,6 +657,26 @@ app.register_blueprint(octopus_bp, url_prefix='/octopus')
 app.register_blueprint(bd_bp, url_prefix='/bd')
 app.register_blueprint(records_bp)  # Registrar el blueprint de records
 app.register_blueprint(sync_bp, url_prefix='/sync')  # Sincronización con sistema externo
+app.register_blueprint(jobs_bp, url_prefix='/jobs')  # Pipeline asíncrono de leads
+app.register_blueprint(gemini_bp, url_prefix='/gemini')  # Caches de tools Gemini
+app.register_blueprint(analytics_bp, url_prefix='/analytics/encuestas')  # Rollups de encuestas
+
+# Aplicar migraciones de esquema pendientes una sola vez al arrancar
+# (los endpoints ya no ejecutan CREATE/ALTER TABLE por request)
+if RUN_MIGRATIONS_ON_STARTUP:
+    aplicar_migraciones()
+
+# Workers del pipeline post-inserción de leads (EmailOctopus, notificación, Gemini, sync)
+if JOBS_WORKERS_ENABLED:
+    iniciar_workers()
+
+# Catálogo de imágenes de /segmento_imagenes (snapshot en disco + refresco FTP periódico)
+if CATALOGO_REFRESCO_ENABLED:
+    iniciar_refresco_catalogo()
+
+# Buffer write-behind de clics de /encuesta
+if ENCUESTA_BUFFER_ENABLED:
+    iniciar_flusher(_al_calificar)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,413 @@
+"""
+Migraciones de esquema - Cambios DDL versionados
+
+Aplica una sola vez los CREATE/ALTER que antes se ejecutaban en cada request
+(/submit, /wix/records, /bd/records, analisis Gemini, /sync/*).
+Cada migracion aplicada queda registrada en la tabla schema_version.
+
+Uso:
+    - Automatico al iniciar la app (RUN_MIGRATIONS_ON_STARTUP=true, por defecto)
+    - CLI: python -m app.migrations            (aplica pendientes)
+           python -m app.migrations --status   (muestra version actual)
+"""
+
+import os
+import sys
+from typing import Dict, Any, List
+
+import mysql.connector
+
+try:
+    from app.db import get_db_connection
+except ImportError:
+    from db import get_db_connection
+
+
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+
+# Nombre del lock de MySQL que serializa las migraciones entre workers de gunicorn
+MIGRATION_LOCK_NAME = "feedback_califcacion_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+# Errores que significan "este cambio ya estaba aplicado" en bases existentes
+# 1050: tabla ya existe, 1060: columna duplicada, 1061: indice duplicado
+ERRORES_IDEMPOTENTES = (1050, 1060, 1061)
+
+
+# ============================================================================
+# MIGRACIONES (agregar siempre al final, nunca modificar una ya publicada)
+# ============================================================================
+
+MIGRACIONES: List[Dict[str, Any]] = [
+    {
+        "version": 1,
+        "descripcion": "Tabla envio_de_encuestas y columnas observaciones, documento, tipo, grupo, fecha_califacion",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS envio_de_encuestas (
+                idcalificacion INT AUTO_INCREMENT PRIMARY KEY,
+                asesor VARCHAR(255) NOT NULL,
+                nombres VARCHAR(255) NOT NULL,
+                ruc VARCHAR(50) NOT NULL,
+                correo VARCHAR(255) NOT NULL,
+                documento VARCHAR(255) NULL,
+                segmento VARCHAR(255),
+                tipo VARCHAR(50),
+                grupo VARCHAR(255),
+                calificacion VARCHAR(50),
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                fecha_califacion DATETIME NULL
+            ) ENGINE=InnoDB
+            """,
+            "ALTER TABLE envio_de_encuestas ADD COLUMN observaciones TEXT NULL AFTER calificacion",
+            "ALTER TABLE envio_de_encuestas ADD COLUMN documento VARCHAR(255) NULL AFTER correo",
+            "ALTER TABLE envio_de_encuestas ADD COLUMN tipo VARCHAR(50) NULL AFTER segmento",
+            "ALTER TABLE envio_de_encuestas ADD COLUMN grupo VARCHAR(255) NULL AFTER tipo",
+            "ALTER TABLE envio_de_encuestas ADD COLUMN fecha_califacion DATETIME NULL AFTER timestamp",
+        ]
+    },
+    {
+        "version": 2,
+        "descripcion": "Columna origen en WIX",
+        "sentencias": [
+            "ALTER TABLE WIX ADD COLUMN origen VARCHAR(50) DEFAULT 'UNKNOWN' AFTER treq_requerimiento",
+        ]
+    },
+    {
+        "version": 3,
+        "descripcion": "Columnas de analisis IA en WIX",
+        "sentencias": [
+            "ALTER TABLE WIX ADD COLUMN ia_tipo_requerimiento VARCHAR(50) NULL",
+            "ALTER TABLE WIX ADD COLUMN ia_confianza VARCHAR(20) NULL",
+            "ALTER TABLE WIX ADD COLUMN ia_procesado DATETIME NULL",
+        ]
+    },
+    {
+        "version": 4,
+        "descripcion": "Columnas de sincronizacion con sistema externo en WIX",
+        "sentencias": [
+            "ALTER TABLE WIX ADD COLUMN sync_status VARCHAR(20) DEFAULT 'pendiente'",
+            "ALTER TABLE WIX ADD COLUMN sync_sent_at DATETIME NULL",
+            "ALTER TABLE WIX ADD COLUMN sync_confirmed_at DATETIME NULL",
+            "ALTER TABLE WIX ADD COLUMN sync_error TEXT NULL",
+            "ALTER TABLE WIX ADD COLUMN sync_external_id VARCHAR(100) NULL",
+        ]
+    },
+    {
+        "version": 5,
+        "descripcion": "Tabla lead_jobs para el pipeline asincrono post-insercion",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS lead_jobs (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                record_id INT NOT NULL,
+                etapa VARCHAR(30) NOT NULL,
+                estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+                intentos INT NOT NULL DEFAULT 0,
+                max_intentos INT NOT NULL DEFAULT 5,
+                payload TEXT NULL,
+                resultado TEXT NULL,
+                ultimo_error TEXT NULL,
+                disponible_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                bloqueado_por VARCHAR(100) NULL,
+                bloqueado_en DATETIME NULL,
+                creado_en DATETIME DEFAULT CURRENT_TIMESTAMP,
+                actualizado_en DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_lead_jobs_cola (estado, disponible_en),
+                INDEX idx_lead_jobs_record (record_id)
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 6,
+        "descripcion": "Tabla siek_cache para resultados de la API SIEK por RUC/DNI",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS siek_cache (
+                clave VARCHAR(20) PRIMARY KEY,
+                valor MEDIUMTEXT NOT NULL,
+                expira_en DATETIME NOT NULL,
+                actualizado_en DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_siek_cache_expira (expira_en)
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 7,
+        "descripcion": "Tabla empresa_cache para resultados de buscar_info_empresa por nombre normalizado",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS empresa_cache (
+                clave VARCHAR(191) PRIMARY KEY,
+                valor MEDIUMTEXT NOT NULL,
+                expira_en DATETIME NOT NULL,
+                actualizado_en DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                INDEX idx_empresa_cache_expira (expira_en)
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 8,
+        "descripcion": "Columna ia_tipo_fuente en WIX (local o gemini) para separar etiquetas del clasificador local",
+        "sentencias": [
+            "ALTER TABLE WIX ADD COLUMN ia_tipo_fuente VARCHAR(10) NULL AFTER ia_tipo_requerimiento",
+        ]
+    },
+    {
+        "version": 9,
+        "descripcion": "Tabla backfill_checkpoint para reanudar el reanalisis masivo de leads",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+                nombre VARCHAR(50) PRIMARY KEY,
+                ultimo_id INT NOT NULL DEFAULT 0,
+                procesados INT NOT NULL DEFAULT 0,
+                actualizados INT NOT NULL DEFAULT 0,
+                errores INT NOT NULL DEFAULT 0,
+                estado VARCHAR(20) NOT NULL DEFAULT 'detenido',
+                parametros TEXT NULL,
+                iniciado_en DATETIME NULL,
+                actualizado_en DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 10,
+        "descripcion": "Columnas de outbox de sincronizacion en WIX (intentos, backoff y bloqueo del despachador)",
+        "sentencias": [
+            "ALTER TABLE WIX ADD COLUMN sync_intentos INT NOT NULL DEFAULT 0",
+            "ALTER TABLE WIX ADD COLUMN sync_max_intentos INT NOT NULL DEFAULT 8",
+            "ALTER TABLE WIX ADD COLUMN sync_proximo_intento DATETIME NULL",
+            "ALTER TABLE WIX ADD COLUMN sync_bloqueado_por VARCHAR(100) NULL",
+            "CREATE INDEX idx_wix_sync_outbox ON WIX (sync_status, sync_proximo_intento)",
+        ]
+    },
+    {
+        "version": 11,
+        "descripcion": "Tabla wix_stats con el snapshot de estadisticas de asignacion y sincronizacion",
+        "sentencias": [
+            """
+            CREATE TABLE IF NOT EXISTS wix_stats (
+                clave VARCHAR(50) PRIMARY KEY,
+                valor MEDIUMTEXT NOT NULL,
+                vigente TINYINT NOT NULL DEFAULT 1,
+                calculado_en DATETIME NOT NULL
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 12,
+        "descripcion": "Indices gestionados de WIX para /sync/leads, pendientes, timeouts y outbox (ver app.index_advisor)",
+        "sentencias": [
+            # Columna generada para filtrar asignados/sin asignar con igualdad en lugar de OR
+            """
+            ALTER TABLE WIX ADD COLUMN lead_asignado TINYINT(1)
+                AS (asesor_in IS NOT NULL AND asesor_in <> '' AND fecha_asignacion IS NOT NULL) STORED
+            """,
+            "CREATE INDEX idx_wix_submission ON WIX (submission_time)",
+            "CREATE INDEX idx_wix_asignado ON WIX (lead_asignado, submission_time)",
+            "CREATE INDEX idx_wix_asesor ON WIX (asesor_in, submission_time)",
+            "CREATE INDEX idx_wix_origen ON WIX (origen, submission_time)",
+            "CREATE INDEX idx_wix_sync_submission ON WIX (sync_status, submission_time)",
+            "CREATE INDEX idx_wix_sync_enviado ON WIX (sync_status, sync_sent_at)",
+            "CREATE INDEX idx_wix_sync_bloqueado ON WIX (sync_bloqueado_por)",
+        ]
+    },
+    {
+        "version": 13,
+        "descripcion": "Marcadores de cambio para el cache de respuestas (actualizado_en y tabla cache_version)",
+        "sentencias": [
+            """
+            ALTER TABLE WIX ADD COLUMN actualizado_en TIMESTAMP NOT NULL
+                DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            """,
+            "CREATE INDEX idx_wix_actualizado ON WIX (actualizado_en)",
+            """
+            ALTER TABLE envio_de_encuestas ADD COLUMN actualizado_en TIMESTAMP NOT NULL
+                DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            """,
+            "CREATE INDEX idx_encuestas_actualizado ON envio_de_encuestas (actualizado_en)",
+            """
+            CREATE TABLE IF NOT EXISTS cache_version (
+                recurso VARCHAR(50) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+    {
+        "version": 14,
+        "descripcion": "Rollup diario de encuestas para /analytics/encuestas",
+        "sentencias": [
+            "CREATE INDEX idx_encuestas_timestamp ON envio_de_encuestas (timestamp)",
+            # Dimensiones NOT NULL ('' = sin valor) para que formen parte de la clave
+            """
+            CREATE TABLE IF NOT EXISTS encuestas_rollup_diario (
+                dia DATE NOT NULL,
+                asesor VARCHAR(150) NOT NULL DEFAULT '',
+                tipo VARCHAR(50) NOT NULL DEFAULT '',
+                grupo VARCHAR(150) NOT NULL DEFAULT '',
+                segmento VARCHAR(150) NOT NULL DEFAULT '',
+                enviadas INT NOT NULL DEFAULT 0,
+                respondidas INT NOT NULL DEFAULT 0,
+                c1 INT NOT NULL DEFAULT 0,
+                c2 INT NOT NULL DEFAULT 0,
+                c3 INT NOT NULL DEFAULT 0,
+                c4 INT NOT NULL DEFAULT 0,
+                c5 INT NOT NULL DEFAULT 0,
+                c6 INT NOT NULL DEFAULT 0,
+                c7 INT NOT NULL DEFAULT 0,
+                c8 INT NOT NULL DEFAULT 0,
+                c9 INT NOT NULL DEFAULT 0,
+                c10 INT NOT NULL DEFAULT 0,
+                con_tiempo INT NOT NULL DEFAULT 0,
+                suma_respuesta_s BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, asesor, tipo, grupo, segmento)
+            ) ENGINE=InnoDB
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS analytics_estado (
+                nombre VARCHAR(50) PRIMARY KEY,
+                marca DATETIME NULL,
+                actualizado_en DATETIME NULL
+            ) ENGINE=InnoDB
+            """,
+        ]
+    },
+]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _crear_tabla_version(cursor) -> None:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(255) NOT NULL,
+            aplicada_en DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+
+
+def _versiones_aplicadas(cursor) -> set:
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _ejecutar_sentencia(cursor, sentencia: str) -> None:
+    try:
+        cursor.execute(sentencia)
+    except mysql.connector.Error as err:
+        if err.errno in ERRORES_IDEMPOTENTES:
+            # El cambio ya existia (bases creadas antes del sistema de migraciones)
+            return
+        raise
+
+
+def aplicar_migraciones() -> Dict[str, Any]:
+    """
+    Aplica en orden las migraciones que aun no figuran en schema_version.
+
+    Returns:
+        Dict con:
+            - success: bool
+            - aplicadas: lista de versiones aplicadas en esta ejecucion
+            - version_actual: ultima version registrada
+            - error: mensaje (si aplica)
+    """
+    cnx = get_db_connection()
+    if cnx is None:
+        print("[Migrations] ERROR: No se pudo conectar a la BD")
+        return {"success": False, "aplicadas": [], "error": "No se pudo conectar a la BD"}
+
+    cursor = cnx.cursor()
+    aplicadas = []
+    lock_obtenido = False
+
+    try:
+        # Evita que varios workers apliquen la misma migracion a la vez
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+        lock_obtenido = cursor.fetchone()[0] == 1
+        if not lock_obtenido:
+            return {"success": False, "aplicadas": [], "error": "No se obtuvo el lock de migraciones"}
+
+        _crear_tabla_version(cursor)
+        ya_aplicadas = _versiones_aplicadas(cursor)
+
+        for migracion in sorted(MIGRACIONES, key=lambda m: m["version"]):
+            version = migracion["version"]
+            if version in ya_aplicadas:
+                continue
+
+            print(f"[Migrations] Aplicando v{version}: {migracion['descripcion']}")
+            for sentencia in migracion["sentencias"]:
+                _ejecutar_sentencia(cursor, sentencia)
+
+            cursor.execute(
+                "INSERT INTO schema_version (version, descripcion) VALUES (%s, %s)",
+                (version, migracion["descripcion"][:255])
+            )
+            cnx.commit()
+            aplicadas.append(version)
+
+        version_actual = max(ya_aplicadas | set(aplicadas)) if (ya_aplicadas or aplicadas) else 0
+
+        if aplicadas:
+            print(f"[Migrations] {len(aplicadas)} migracion(es) aplicadas. Version actual: {version_actual}")
+
+        return {"success": True, "aplicadas": aplicadas, "version_actual": version_actual}
+
+    except Exception as e:
+        print(f"[Migrations] ERROR al aplicar migraciones: {e}")
+        return {"success": False, "aplicadas": aplicadas, "error": str(e)}
+
+    finally:
+        if lock_obtenido:
+            try:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+                cursor.fetchone()
+            except Exception:
+                pass
+        cursor.close()
+        cnx.close()
+
+
+def obtener_estado_migraciones() -> Dict[str, Any]:
+    """Retorna las versiones aplicadas y las pendientes."""
+    cnx = get_db_connection()
+    if cnx is None:
+        return {"error": "No se pudo conectar a la BD"}
+
+    cursor = cnx.cursor()
+    try:
+        _crear_tabla_version(cursor)
+        aplicadas = _versiones_aplicadas(cursor)
+        pendientes = [m["version"] for m in MIGRACIONES if m["version"] not in aplicadas]
+        return {
+            "version_actual": max(aplicadas) if aplicadas else 0,
+            "aplicadas": sorted(aplicadas),
+            "pendientes": pendientes
+        }
+    except Exception as e:
+        print(f"[Migrations] ERROR al obtener estado: {e}")
+        return {"error": str(e)}
+    finally:
+        cursor.close()
+        cnx.close()
+
+
+if __name__ == '__main__':
+    if "--status" in sys.argv:
+        print(obtener_estado_migraciones())
+        sys.exit(0)
+
+    resultado = aplicar_migraciones()
+    print(resultado)
+    sys.exit(0 if resultado.get("success") else 1)
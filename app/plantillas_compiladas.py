@@ -0,0 +1,280 @@
+"""
+Plantillas de correo precompiladas
+
+Los builders de encuesta con 10 botones de templates_email.py (ventas,
+operaciones, coordinador) arman en cada llamada el HTML con un bucle += de
+URLs. Aqui esos templates se compilan una sola vez al importar el modulo:
+    1. Se llama al builder original con sentinelas en lugar de los datos
+    2. La salida se parte en segmentos estaticos y campos dinamicos
+    3. Cada campo recibe su contexto de escape segun donde aparece:
+        - texto:    html.escape
+        - atributo: html.escape (p.ej. base_url al inicio de un href)
+        - url:      quote, dentro de la query de un href o en mailto:/tel:
+Renderizar es un format_map sobre el texto ya armado con los valores
+escapados. Los builders originales siguen siendo la fuente del HTML.
+
+Las partes que cambian la estructura (parrafo del documento presente o no,
+texto del coordinador para "Ventas (OC)") se compilan como variantes y se
+guardan en _compiladas.
+
+Los templates "lamentamos" y la notificacion de nuevo lead ya son un unico
+f-string: compilados eran 2-3x mas lentos (el escape es trabajo nuevo), asi
+que siguen usando su builder. Solo se compila lo que PLANTILLAS_COMPILABLES
+lista.
+
+Benchmark (contra los builders f-string):
+    python -m app.plantillas_compiladas --renders 10000
+"""
+
+import os
+import sys
+import re
+import html
+import time
+import argparse
+from urllib.parse import quote, unquote
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from app.templates_email import (
+        get_email_template_ventas,
+        get_email_template_operaciones,
+        get_email_template_coordinador,
+        get_email_template_lamentamos_ventas,
+        get_email_template_lamentamos_operaciones
+    )
+except ImportError:
+    from templates_email import (
+        get_email_template_ventas,
+        get_email_template_operaciones,
+        get_email_template_coordinador,
+        get_email_template_lamentamos_ventas,
+        get_email_template_lamentamos_operaciones
+    )
+
+
+PLANTILLAS_COMPILADAS = os.environ.get('PLANTILLAS_COMPILADAS', 'true').lower() == 'true'
+
+# Delimitadores de los sentinelas (uso privado de Unicode, no aparecen en el HTML)
+_INICIO, _FIN = "\ue000", "\ue001"
+
+def _variante_coordinador(tipo: str) -> str:
+    # El builder del coordinador solo distingue "Ventas (OC)" del resto
+    return tipo if tipo == "Ventas (OC)" else ""
+
+
+# nombre -> (builder, funcion que reduce tipo a la variante que usa el builder)
+PLANTILLAS_ENCUESTA: Dict[str, Tuple[Callable[..., str], Optional[Callable[[str], str]]]] = {
+    "ventas": (get_email_template_ventas, None),
+    "operaciones": (get_email_template_operaciones, None),
+    "coordinador": (get_email_template_coordinador, _variante_coordinador),
+    "lamentamos_ventas": (get_email_template_lamentamos_ventas, None),
+    "lamentamos_operaciones": (get_email_template_lamentamos_operaciones, None),
+}
+# Templates que renderizan mas rapido compilados (ver benchmark); el resto usa su builder
+PLANTILLAS_COMPILABLES = ("ventas", "operaciones", "coordinador")
+
+_REQUIERE_ESCAPE_HTML = re.compile(r'[&<>"\']').search
+_URL_SEGURA = re.compile(r'[A-Za-z0-9_.~@+-]*\Z').match
+
+
+def _escapar_html(valor: str) -> str:
+    return html.escape(valor) if _REQUIERE_ESCAPE_HTML(valor) else valor
+
+
+def _escapar_url(valor: str) -> str:
+    return valor if _URL_SEGURA(valor) else quote(valor, safe="@+")
+
+
+ESCAPES: Dict[str, Callable[[str], str]] = {
+    "texto": _escapar_html,
+    "atributo": _escapar_html,
+    "url": _escapar_url,
+}
+
+
+class _Campo(str):
+    """Sentinela de un campo: se imprime como marcador y se compara como `variante`."""
+
+    def __new__(cls, nombre: str, variante: Optional[str] = None):
+        campo = super().__new__(cls, f"{_INICIO}{nombre}{_FIN}")
+        campo.variante = variante
+        return campo
+
+    def __eq__(self, otro):
+        return self.variante == otro if self.variante is not None else str.__eq__(self, otro)
+
+    def __ne__(self, otro):
+        return not self == otro
+
+    __hash__ = str.__hash__
+
+
+class PlantillaCompilada:
+    """
+    HTML partido en segmentos estaticos y campos. Se genera una funcion cuyo
+    cuerpo escapa cada campo una vez y devuelve un unico f-string con el
+    texto estatico como literal, asi un render no repite concatenaciones.
+    """
+
+    def __init__(self, salida: str):
+        fuente = []
+        huecos: Dict[Tuple[str, str], str] = {}
+        previo = ""
+        resto = salida
+        while _INICIO in resto:
+            estatico, resto = resto.split(_INICIO, 1)
+            campo, resto = resto.split(_FIN, 1)
+            previo += estatico
+            hueco = (campo, _contexto(previo, campo))
+            variable = huecos.setdefault(hueco, f"_h{len(huecos)}")
+            fuente.append(estatico.replace("{", "{{").replace("}", "}}"))
+            fuente.append("{" + variable + "}")
+        fuente.append(resto.replace("{", "{{").replace("}", "}}"))
+
+        self.huecos = list(huecos)
+        cuerpo = [
+            f"    {variable} = _escapes[{contexto!r}](str(valores[{campo!r}]))"
+            for (campo, contexto), variable in huecos.items()
+        ]
+        codigo = "def renderizar(valores):\n" + "\n".join(cuerpo) + "\n    return f" + repr("".join(fuente))
+        espacio = {"_escapes": ESCAPES}
+        exec(compile(codigo, "<plantilla compilada>", "exec"), espacio)
+        self.renderizar: Callable[[Dict[str, Any]], str] = espacio["renderizar"]
+
+
+def _contexto(previo: str, campo: str) -> str:
+    """Contexto de escape de un campo segun el HTML que lo precede."""
+    etiqueta = previo[previo.rfind("<"):]
+    if ">" in etiqueta or etiqueta.count('"') % 2 == 0:
+        return "texto"
+    valor_atributo = etiqueta[etiqueta.rfind('"') + 1:]
+    if "?" in valor_atributo or valor_atributo.startswith(("mailto:", "tel:")):
+        return "url"
+    return "atributo"
+
+
+# (nombre, con_documento, variante) -> PlantillaCompilada
+_compiladas: Dict[Tuple[str, bool, str], PlantillaCompilada] = {}
+
+
+def _compilar_encuesta(nombre: str, con_documento: bool, variante: str) -> PlantillaCompilada:
+    clave = (nombre, con_documento, variante)
+    compilada = _compiladas.get(clave)
+    if compilada is None:
+        builder, _ = PLANTILLAS_ENCUESTA[nombre]
+        salida = builder(
+            _Campo("nombre_cliente"),
+            _Campo("documento") if con_documento else "",
+            _Campo("base_url"),
+            _Campo("unique_id"),
+            _Campo("tipo", variante)
+        )
+        compilada = _compiladas[clave] = PlantillaCompilada(salida)
+    return compilada
+
+
+def renderizar_encuesta(nombre: str, nombre_cliente, documento, base_url, unique_id, tipo) -> str:
+    """
+    HTML del correo de encuesta `nombre` (clave de PLANTILLAS_ENCUESTA).
+    Mismos argumentos que los builders de templates_email.
+    """
+    builder, variante_de = PLANTILLAS_ENCUESTA[nombre]
+    if not PLANTILLAS_COMPILADAS or nombre not in PLANTILLAS_COMPILABLES:
+        return builder(nombre_cliente, documento, base_url, unique_id, tipo)
+
+    variante = variante_de(tipo) if variante_de else ""
+    compilada = _compilar_encuesta(nombre, bool(documento), variante)
+    return compilada.renderizar({
+        "nombre_cliente": nombre_cliente,
+        "documento": documento,
+        "base_url": base_url,
+        "unique_id": unique_id,
+        "tipo": tipo,
+    })
+
+
+def precompilar() -> int:
+    """Compila las plantillas compilables y sus variantes. Retorna cuantas hay en cache."""
+    for nombre in PLANTILLAS_COMPILABLES:
+        _, variante_de = PLANTILLAS_ENCUESTA[nombre]
+        variantes = {"", "Ventas (OC)"} if variante_de else {""}
+        for variante in variantes:
+            for con_documento in (True, False):
+                _compilar_encuesta(nombre, con_documento, variante)
+    return len(_compiladas)
+
+
+if PLANTILLAS_COMPILADAS:
+    precompilar()
+
+
+# ------------------------------------------------------------------
+# Benchmark
+# ------------------------------------------------------------------
+
+def _medir(funcion: Callable[[int], str], renders: int) -> float:
+    inicio = time.perf_counter()
+    for i in range(renders):
+        funcion(i)
+    return time.perf_counter() - inicio
+
+
+def benchmark(renders: int = 10000) -> Dict[str, Dict[str, Any]]:
+    """
+    Compara builders f-string y plantillas compiladas en `renders` renders
+    por template. `iguales` compara ambas salidas con las URLs decodificadas
+    (las compiladas codifican tipo en la query, p.ej. "Ventas%20%28OC%29").
+    """
+    base_url = "https://feedback-califcacion.onrender.com"
+    casos = [
+        (nombre, tipo)
+        for nombre in PLANTILLAS_COMPILABLES
+        for tipo in (("Ventas (OC)", "Coordinador (Conformidad)") if nombre == "coordinador" else ("Ventas",))
+    ]
+
+    resultados = {}
+    for nombre, tipo in casos:
+        builder, _ = PLANTILLAS_ENCUESTA[nombre]
+
+        def original(i, builder=builder, tipo=tipo):
+            return builder(f"Cliente {i}", f"OT-{i}", base_url, str(i), tipo)
+
+        def compilada(i, nombre=nombre, tipo=tipo):
+            return renderizar_encuesta(nombre, f"Cliente {i}", f"OT-{i}", base_url, str(i), tipo)
+
+        resultados[f"{nombre} [{tipo}]"] = _resultado(original, compilada, renders)
+
+    return resultados
+
+
+def _resultado(original: Callable[[int], str], compilada: Callable[[int], str], renders: int) -> Dict[str, Any]:
+    t_original = _medir(original, renders)
+    t_compilada = _medir(compilada, renders)
+    return {
+        "renders": renders,
+        "original_ms": round(t_original * 1000, 1),
+        "compilada_ms": round(t_compilada * 1000, 1),
+        "aceleracion": round(t_original / t_compilada, 2) if t_compilada else None,
+        "iguales": unquote(original(1)) == unquote(compilada(1)),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de plantillas de correo compiladas")
+    parser.add_argument("--renders", type=int, default=10000, help="Renders por template (default 10000)")
+    args = parser.parse_args(argv)
+
+    if not PLANTILLAS_COMPILADAS:
+        print("[Plantillas] PLANTILLAS_COMPILADAS=false: el benchmark compararia el builder consigo mismo")
+        return 2
+
+    resultados = benchmark(args.renders)
+    print(f"{'template':<40} {'f-string ms':>12} {'compilada ms':>13} {'x':>6}  iguales")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<40} {r['original_ms']:>12} {r['compilada_ms']:>13} {r['aceleracion']:>6}  {r['iguales']}")
+    return 0 if all(r["iguales"] for r in resultados.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
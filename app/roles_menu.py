@@ -4,9 +4,13 @@ from mysql.connector import Error
 try:
     # Importaciones del paquete app (para Render/producción)
     from app.db import get_db_connection
+    from app.listados import responder_listado
+    from app.cache_respuestas import respuesta_condicional, marcar_cambio
 except ImportError:
     # Importaciones relativas (para desarrollo con run_app.py)
     from db import get_db_connection
+    from listados import responder_listado
+    from cache_respuestas import respuesta_condicional, marcar_cambio
 
 TABLE_NAME = "roles_menu"
 roles_menu_bp = Blueprint('roles_menu_bp', __name__)
@@ -27,22 +31,13 @@ ALLOWED_COLUMNS = [
 ]
 
 @roles_menu_bp.route('/roles_menu', methods=['GET'])
+@respuesta_condicional(TABLE_NAME)
 def get_roles_menu():
-    cnx = get_db_connection()
-    if cnx is None:
-        return jsonify({'status': 'error', 'message': 'No se pudo conectar a la base de datos.'}), 500
-
-    try:
-        cursor = cnx.cursor(dictionary=True)
-        query = f"SELECT * FROM `{TABLE_NAME}`;"
-        cursor.execute(query)
-        records = cursor.fetchall()
-        return jsonify({'status': 'success', 'records': records}), 200
-    except Exception as err:
-        return jsonify({'status': 'error', 'message': str(err)}), 500
-    finally:
-        cursor.close()
-        cnx.close()
+    """
+    GET /roles_menu
+    Admite fields, limit, cursor y format (ver listados.py).
+    """
+    return responder_listado(TABLE_NAME, 'id')
 
 
 @roles_menu_bp.route('/roles_menu', methods=['POST'])
@@ -96,6 +91,7 @@ def add_role_to_column():
         update_query = f"UPDATE `{TABLE_NAME}` SET `{column}` = %s WHERE id = 1;"
         cursor.execute(update_query, (new_value,))
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
         return jsonify({'status': 'success', 'message': f'Rol agregado a {column} correctamente.'}), 200
     except Exception as err:
         return jsonify({'status': 'error', 'message': str(err)}), 500
@@ -138,6 +134,7 @@ def update_column_value():
         query = f"UPDATE `{TABLE_NAME}` SET `{column}` = %s WHERE id = 1;"
         cursor.execute(query, (new_value,))
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
         return jsonify({'status': 'success', 'message': f'Columna {column} actualizada correctamente.'}), 200
     except Exception as err:
         return jsonify({'status': 'error', 'message': str(err)}), 500
@@ -195,6 +192,7 @@ def delete_role_from_column():
         update_query = f"UPDATE `{TABLE_NAME}` SET `{column}` = %s WHERE id = 1;"
         cursor.execute(update_query, (new_value,))
         cnx.commit()
+        marcar_cambio(TABLE_NAME, cnx)
         return jsonify({'status': 'success', 'message': f'Rol eliminado de {column} correctamente.'}), 200
     except Exception as err:
         return jsonify({'status': 'error', 'message': str(err)}), 500
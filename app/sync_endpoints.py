@@ -11,18 +11,24 @@ Endpoints de Sincronizacion:
 - GET  /sync/stats          - Estadisticas de sincronizacion
 - GET  /sync/status/{id}    - Estado de un lead especifico
 - POST /sync/confirm        - Confirma recepcion de un lead (llamado por sistema externo)
+- POST /sync/confirm/batch  - Confirma muchos leads en una sola transaccion
 - POST /sync/retry/{id}     - Reintenta envio de un lead
 - POST /sync/send/{id}      - Envia manualmente un lead
 - POST /sync/check-timeouts - Verifica y marca timeouts
-- POST /sync/init           - Inicializa columnas de sync
+- POST /sync/dispatch       - Despacha por lotes los leads pendientes/error/timeout (outbox)
+- POST /sync/init           - Aplica migraciones pendientes (columnas de sync)
 """
 
+from datetime import datetime
+
 from flask import Blueprint, request, jsonify
 
 try:
     from app.sync_service import (
         enviar_lead_a_sistema_externo,
         confirmar_recepcion,
+        confirmar_recepcion_lote,
+        SYNC_CONFIRM_BATCH_MAX,
         obtener_leads_pendientes,
         obtener_estadisticas_sync,
         obtener_lead_completo,
@@ -31,14 +37,25 @@ try:
         obtener_todos_los_leads,
         obtener_asesores_disponibles,
         obtener_estadisticas_asignacion,
+        despachar_pendientes,
+        SYNC_BATCH_SIZE,
         SYNC_ENABLED,
         EXTERNAL_ENDPOINT,
-        SYNC_TIMEOUT_HOURS
+        SYNC_TIMEOUT_HOURS,
+        SYNC_LEADS_DEFAULT_LIMIT,
+        SYNC_LEADS_MAX_LIMIT,
+        MODOS_CONTEO,
+        COLUMNAS_LEADS
     )
+    from app.wix_stats import WIX_STATS_MAX_AGE
+    from app.listados import codificar_cursor, decodificar_cursor, ListadoError, a_fila
+    from app.cache_respuestas import respuesta_condicional
 except ImportError:
     from sync_service import (
         enviar_lead_a_sistema_externo,
         confirmar_recepcion,
+        confirmar_recepcion_lote,
+        SYNC_CONFIRM_BATCH_MAX,
         obtener_leads_pendientes,
         obtener_estadisticas_sync,
         obtener_lead_completo,
@@ -47,14 +64,49 @@ except ImportError:
         obtener_todos_los_leads,
         obtener_asesores_disponibles,
         obtener_estadisticas_asignacion,
+        despachar_pendientes,
+        SYNC_BATCH_SIZE,
         SYNC_ENABLED,
         EXTERNAL_ENDPOINT,
-        SYNC_TIMEOUT_HOURS
+        SYNC_TIMEOUT_HOURS,
+        SYNC_LEADS_DEFAULT_LIMIT,
+        SYNC_LEADS_MAX_LIMIT,
+        MODOS_CONTEO,
+        COLUMNAS_LEADS
     )
+    from wix_stats import WIX_STATS_MAX_AGE
+    from listados import codificar_cursor, decodificar_cursor, ListadoError, a_fila
+    from cache_respuestas import respuesta_condicional
 
 
 sync_bp = Blueprint('sync_bp', __name__)
 
+# Columnas de cada lead en /sync/leads?format=columnar (incluye el campo calculado)
+COLUMNAS_LEADS_SALIDA = [c.strip() for c in COLUMNAS_LEADS.split(',')] + ['asignado']
+
+
+def _codificar_cursor_leads(clave) -> str:
+    """Cursor opaco con (submission_time, id) del ultimo lead de la pagina."""
+    submission_time, record_id = clave
+    return codificar_cursor([submission_time.isoformat() if submission_time else None, record_id])
+
+
+def _decodificar_cursor_leads(cursor_param: str):
+    valor = decodificar_cursor(cursor_param)
+    try:
+        submission_time, record_id = valor
+        return (datetime.fromisoformat(submission_time) if submission_time else None, int(record_id))
+    except (TypeError, ValueError):
+        raise ListadoError('Cursor inválido.')
+
+
+def _fecha_valida(fecha: str) -> bool:
+    try:
+        datetime.strptime(fecha, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
 
 @sync_bp.route('/leads', methods=['GET'])
 def get_all_leads():
@@ -69,11 +121,15 @@ def get_all_leads():
         - fecha_desde: YYYY-MM-DD - Fecha mínima de asignación
         - fecha_hasta: YYYY-MM-DD - Fecha máxima de asignación
         - origen: string - Filtrar por origen (WIX, UNKNOWN, etc.)
-        - limit: int - Máximo de registros (default: sin limite)
-        - offset: int - Registros a saltar para paginación
+        - limit: int - Tamaño de página (default: SYNC_LEADS_DEFAULT_LIMIT, máximo SYNC_LEADS_MAX_LIMIT)
+        - cursor: string - next_cursor de la página anterior (keyset sobre submission_time, id)
+        - count: exact | estimate | false - Cómo calcular total
+                 (default: exact en la primera página, false con cursor)
+        - offset: int - Registros a saltar (legacy; preferir cursor)
+        - format: json | columnar - columnar devuelve columns (una vez) y rows (arreglos)
 
     Returns:
-        JSON con lista de leads, total y filtros aplicados
+        JSON con lista de leads, total, next_cursor y filtros aplicados
     """
     # Parsear parámetros
     asignado_param = request.args.get('asignado', None)
@@ -85,26 +141,61 @@ def get_all_leads():
     fecha_desde = request.args.get('fecha_desde', None)
     fecha_hasta = request.args.get('fecha_hasta', None)
     origen = request.args.get('origen', None)
-    limit = request.args.get('limit', 10000, type=int)  # Sin limite por defecto
-    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', SYNC_LEADS_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, SYNC_LEADS_MAX_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    cursor_param = request.args.get('cursor') or None
+    count = (request.args.get('count') or ('false' if cursor_param else 'exact')).lower()
+
+    formato = (request.args.get('format') or 'json').lower()
+    if formato not in ('json', 'columnar'):
+        return jsonify({
+            'status': 'error',
+            'message': 'format debe ser json o columnar'
+        }), 400
+
+    if count not in MODOS_CONTEO:
+        return jsonify({
+            'status': 'error',
+            'message': f'count invalido. Valores permitidos: {list(MODOS_CONTEO)}'
+        }), 400
+
+    despues_de = None
+    if cursor_param:
+        try:
+            despues_de = _decodificar_cursor_leads(cursor_param)
+        except ListadoError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    for fecha in (fecha_desde, fecha_hasta):
+        if fecha and not _fecha_valida(fecha):
+            return jsonify({
+                'status': 'error',
+                'message': f'Fecha invalida: {fecha}. Formato esperado: YYYY-MM-DD'
+            }), 400
 
     # Obtener leads
-    leads, total = obtener_todos_los_leads(
+    leads, total, siguiente = obtener_todos_los_leads(
         asignado=asignado,
         asesor=asesor,
         fecha_desde=fecha_desde,
         fecha_hasta=fecha_hasta,
         origen=origen,
         limit=limit,
-        offset=offset
+        offset=offset,
+        despues_de=despues_de,
+        conteo=count
     )
 
-    return jsonify({
+    respuesta = {
         'status': 'success',
         'total': total,
+        'count': count,
         'returned': len(leads),
         'offset': offset,
         'limit': limit,
+        'has_more': siguiente is not None,
+        'next_cursor': _codificar_cursor_leads(siguiente) if siguiente else None,
         'filters': {
             'asignado': asignado,
             'asesor': asesor,
@@ -113,20 +204,31 @@ def get_all_leads():
             'origen': origen
         },
         'leads': leads
-    }), 200
+    }
+
+    if formato == 'columnar':
+        respuesta['columns'] = COLUMNAS_LEADS_SALIDA
+        respuesta['rows'] = [a_fila(lead, COLUMNAS_LEADS_SALIDA) for lead in respuesta.pop('leads')]
+
+    return jsonify(respuesta), 200
 
 
 @sync_bp.route('/leads/stats', methods=['GET'])
+@respuesta_condicional('WIX', omitir_si=('fresh',))
 def get_leads_assignment_stats():
     """
     GET /sync/leads/stats
 
     Obtiene estadísticas de asignación de leads.
 
+    Query params:
+        - fresh: true para recalcular sin usar el snapshot (default: false)
+
     Returns:
         JSON con estadísticas: total, asignados, sin_asignar, por_asesor, por_origen
     """
-    stats = obtener_estadisticas_asignacion()
+    fresh = request.args.get('fresh', 'false').lower() == 'true'
+    stats = obtener_estadisticas_asignacion(forzar=fresh)
 
     if 'error' in stats:
         return jsonify({
@@ -141,6 +243,7 @@ def get_leads_assignment_stats():
 
 
 @sync_bp.route('/leads/asesores', methods=['GET'])
+@respuesta_condicional('WIX')
 def get_asesores_list():
     """
     GET /sync/leads/asesores
@@ -167,7 +270,7 @@ def get_pending_leads():
     Lista leads pendientes de confirmacion.
 
     Query params:
-        - status: Filtrar por estado (pendiente, enviado, error, timeout)
+        - status: Filtrar por estado (pendiente, enviando, enviado, error, timeout)
         - limit: Maximo de registros (default: 100)
 
     Returns:
@@ -177,7 +280,7 @@ def get_pending_leads():
     limit = request.args.get('limit', 100, type=int)
 
     # Validar status
-    valid_statuses = ['pendiente', 'enviado', 'error', 'timeout', None]
+    valid_statuses = ['pendiente', 'enviando', 'enviado', 'error', 'timeout', None]
     if status and status not in valid_statuses:
         return jsonify({
             'status': 'error',
@@ -196,18 +299,24 @@ def get_pending_leads():
 
 
 @sync_bp.route('/stats', methods=['GET'])
+@respuesta_condicional('WIX', omitir_si=('fresh',))
 def get_sync_stats():
     """
     GET /sync/stats
 
     Obtiene estadisticas de sincronizacion.
 
+    Query params:
+        - fresh: true para recalcular sin usar el snapshot (default: false)
+
     Returns:
         JSON con conteo por estado
     """
-    stats = obtener_estadisticas_sync()
+    fresh = request.args.get('fresh', 'false').lower() == 'true'
+    stats = obtener_estadisticas_sync(forzar=fresh)
 
-    if 'error' in stats:
+    # 'error' tambien es un estado de sync (conteo entero); el fallo trae un mensaje
+    if isinstance(stats.get('error'), str):
         return jsonify({
             'status': 'error',
             'message': stats['error']
@@ -218,7 +327,8 @@ def get_sync_stats():
         'config': {
             'sync_enabled': SYNC_ENABLED,
             'external_endpoint': EXTERNAL_ENDPOINT,
-            'timeout_hours': SYNC_TIMEOUT_HOURS
+            'timeout_hours': SYNC_TIMEOUT_HOURS,
+            'stats_max_age': WIX_STATS_MAX_AGE
         },
         'statistics': stats
     }), 200
@@ -320,6 +430,52 @@ def confirm_lead_reception():
         }), 404
 
 
+@sync_bp.route('/confirm/batch', methods=['POST'])
+def confirm_leads_batch():
+    """
+    POST /sync/confirm/batch
+
+    Confirma la recepcion de muchos leads en una sola transaccion
+    (util cuando el sistema externo se pone al dia tras una caida).
+
+    Body JSON: lista o {"confirmaciones": [...]}, cada item:
+        - record_id: int (requerido)
+        - external_id: string (opcional)
+
+    Returns:
+        JSON con conteos (actualizados, ya_confirmados, no_encontrados,
+        invalidos, duplicados) y el resultado de cada item
+    """
+    data = request.get_json(silent=True)
+    items = data.get('confirmaciones') if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        return jsonify({
+            'status': 'error',
+            'message': 'Se espera una lista de confirmaciones {record_id, external_id}'
+        }), 400
+
+    if len(items) > SYNC_CONFIRM_BATCH_MAX:
+        return jsonify({
+            'status': 'error',
+            'message': f'Maximo {SYNC_CONFIRM_BATCH_MAX} confirmaciones por llamada'
+        }), 413
+
+    result = confirmar_recepcion_lote(items)
+
+    if not result.get('success'):
+        return jsonify({
+            'status': 'error',
+            'message': result['message']
+        }), 500
+
+    result.pop('success')
+    return jsonify({
+        'status': 'success',
+        **result
+    }), 200
+
+
 @sync_bp.route('/retry/<int:record_id>', methods=['POST'])
 def retry_lead_sync(record_id: int):
     """
@@ -397,6 +553,60 @@ def check_sync_timeouts():
     }), 200
 
 
+@sync_bp.route('/dispatch', methods=['POST'])
+def dispatch_outbox():
+    """
+    POST /sync/dispatch
+
+    Despacha el outbox: toma leads pendientes, con error o timeout cuyo
+    proximo intento ya vencio y los envia por lotes al sistema externo.
+    Puede llamarse desde un cron (o usar el worker: python -m app.sync_service --worker).
+
+    Body JSON opcional:
+        - limite: leads por lote (default: SYNC_BATCH_SIZE)
+        - max_lotes: lotes como maximo en esta llamada (default: 10)
+
+    Returns:
+        JSON con lotes, reclamados, enviados y fallidos
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        limite = int(data.get('limite', SYNC_BATCH_SIZE))
+        max_lotes = int(data.get('max_lotes', 10))
+    except (TypeError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'limite y max_lotes deben ser numeros enteros'
+        }), 400
+
+    if limite < 1 or max_lotes < 1:
+        return jsonify({
+            'status': 'error',
+            'message': 'limite y max_lotes deben ser mayores que 0'
+        }), 400
+
+    result = despachar_pendientes(max_lotes=max_lotes, limite=min(limite, 500))
+
+    if result.get('skipped'):
+        return jsonify({
+            'status': 'warning',
+            'message': result.get('message')
+        }), 200
+
+    if not result.get('success'):
+        return jsonify({
+            'status': 'error',
+            'message': result.get('message', 'Error en el despacho'),
+            'dispatch': result
+        }), 500
+
+    return jsonify({
+        'status': 'success',
+        'dispatch': result
+    }), 200
+
+
 @sync_bp.route('/send/<int:record_id>', methods=['POST'])
 def send_lead_manually(record_id: int):
     """
@@ -448,7 +658,7 @@ def initialize_sync_columns():
     POST /sync/init
 
     Inicializa las columnas de sincronizacion en la tabla WIX.
-    Solo necesario ejecutar una vez.
+    Aplica las migraciones de esquema pendientes (normalmente ya aplicadas al arrancar).
 
     Returns:
         JSON con resultado de la inicializacion
@@ -2,65 +2,82 @@
 Sync Service - Servicio de sincronizacion de leads con sistema externo
 
 Maneja el envio de leads a un sistema externo y la confirmacion de recepcion.
-Incluye manejo de estados: pendiente, enviado, confirmado, error, timeout.
+Incluye manejo de estados: pendiente, enviando, enviado, confirmado, error, timeout.
+
+Los leads pendientes, con error o en timeout se despachan por lotes desde
+el outbox (despachar_outbox) con reintentos y backoff por lead:
+    - POST /sync/dispatch
+    - Worker: python -m app.sync_service --worker
 """
 
 import os
+import time
+import uuid
+import socket
+import argparse
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 
 try:
     from app.db import get_db_connection
+    from app.migrations import aplicar_migraciones
+    from app.http_client import http_post
+    from app.wix_stats import obtener_estadisticas_wix, invalidar_wix_stats
+    from app.cache_respuestas import marcar_cambio
 except ImportError:
     from db import get_db_connection
+    from migrations import aplicar_migraciones
+    from http_client import http_post
+    from wix_stats import obtener_estadisticas_wix, invalidar_wix_stats
+    from cache_respuestas import marcar_cambio
 
 
 # Configuracion
 EXTERNAL_ENDPOINT = os.getenv("SYNC_EXTERNAL_ENDPOINT", "https://httpbin.org/post")  # Ficticio por ahora
 SYNC_TIMEOUT_HOURS = int(os.getenv("SYNC_TIMEOUT_HOURS", "24"))
 SYNC_ENABLED = os.getenv("SYNC_ENABLED", "true").lower() == "true"
+# Tamano de pagina de GET /sync/leads (por defecto y maximo)
+SYNC_LEADS_DEFAULT_LIMIT = int(os.getenv("SYNC_LEADS_DEFAULT_LIMIT", "100"))
+SYNC_LEADS_MAX_LIMIT = int(os.getenv("SYNC_LEADS_MAX_LIMIT", "1000"))
+MODOS_CONTEO = ("false", "estimate", "exact")
+
+# "No confirmado" expresado como IN + IS NULL (un != no puede usar el indice de sync_status)
+CONDICION_NO_CONFIRMADO = (
+    "(sync_status IN ('pendiente', 'enviando', 'enviado', 'error', 'timeout') OR sync_status IS NULL)"
+)
+
+COLUMNAS_PENDIENTES = """
+    id, nombre_apellido, empresa, correo, origen,
+    sync_status, sync_sent_at, sync_confirmed_at, sync_error,
+    submission_time
+"""
+
+COLUMNAS_LEADS = """
+    id, nombre_apellido, empresa, telefono2, ruc_dni, correo,
+    treq_requerimiento, origen, submission_time, observacion,
+    asesor_in, fecha_asignacion,
+    siek_cliente, ia_cliente_doc, ia_cliente_sector,
+    ia_cliente_razon_social, ia_tipo_requerimiento, ia_confianza,
+    sync_status, sync_sent_at, sync_confirmed_at
+"""
 
 
 def asegurar_columnas_sync() -> bool:
     """
     Asegura que existan las columnas de sincronizacion en la tabla WIX.
+    Las columnas se crean mediante el sistema de migraciones (app.migrations),
+    que solo ejecuta DDL la primera vez.
     Retorna True si se ejecuto correctamente.
     """
-    cnx = get_db_connection()
-    if cnx is None:
-        print("[SyncService] ERROR: No se pudo conectar a la BD")
-        return False
-
-    try:
-        cursor = cnx.cursor()
-
-        columnas = [
-            ("sync_status", "VARCHAR(20) DEFAULT 'pendiente'"),
-            ("sync_sent_at", "DATETIME NULL"),
-            ("sync_confirmed_at", "DATETIME NULL"),
-            ("sync_error", "TEXT NULL"),
-            ("sync_external_id", "VARCHAR(100) NULL"),
-        ]
-
-        for col_name, col_type in columnas:
-            try:
-                cursor.execute(f"ALTER TABLE WIX ADD COLUMN {col_name} {col_type}")
-                cnx.commit()
-                print(f"[SyncService] Columna {col_name} agregada a tabla WIX")
-            except Exception:
-                # La columna ya existe
-                pass
+    resultado = aplicar_migraciones()
 
-        return True
-
-    except Exception as e:
-        print(f"[SyncService] ERROR al asegurar columnas: {e}")
+    if not resultado.get("success"):
+        print(f"[SyncService] ERROR al asegurar columnas: {resultado.get('error')}")
         return False
 
-    finally:
-        cursor.close()
-        cnx.close()
+    return True
 
 
 def obtener_lead_completo(record_id: int) -> Optional[Dict[str, Any]]:
@@ -144,6 +161,8 @@ def actualizar_estado_sync(
             """, (status, record_id))
 
         cnx.commit()
+        invalidar_wix_stats(cnx)
+        marcar_cambio("WIX", cnx)
         print(f"[SyncService] Lead {record_id} actualizado a estado: {status}")
         return True
 
@@ -193,15 +212,15 @@ def enviar_lead_a_sistema_externo(record_id: int) -> Dict[str, Any]:
         }
 
         # Enviar al sistema externo
-        response = requests.post(
+        response = http_post(
+            "sync",
             EXTERNAL_ENDPOINT,
             json=payload,
             headers={
                 "Content-Type": "application/json",
                 "X-Source-System": "feedback_califcacion",
                 "X-Record-ID": str(record_id)
-            },
-            timeout=30
+            }
         )
 
         if response.ok:
@@ -310,6 +329,127 @@ def confirmar_recepcion(record_id: int, external_id: Optional[str] = None) -> Di
         }
 
 
+# Maximo de confirmaciones por llamada a /sync/confirm/batch
+SYNC_CONFIRM_BATCH_MAX = int(os.getenv("SYNC_CONFIRM_BATCH_MAX", "5000"))
+# Filas por sentencia dentro de la transaccion de confirmacion
+SYNC_CONFIRM_CHUNK = 1000
+
+
+def confirmar_recepcion_lote(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Confirma muchos leads en una sola transaccion.
+
+    Args:
+        items: lista de {"record_id": int, "external_id": str opcional}
+
+    Returns:
+        Dict con success, conteos (actualizados, ya_confirmados, no_encontrados,
+        invalidos, duplicados) y resultados por item en el orden recibido
+    """
+    resultados: List[Dict[str, Any]] = []
+    # record_id -> external_id (la primera aparicion gana)
+    pendientes: Dict[int, Optional[str]] = {}
+
+    for item in items:
+        record_id = item.get("record_id") if isinstance(item, dict) else None
+        try:
+            record_id = int(record_id)
+            if record_id <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            resultados.append({"record_id": record_id, "resultado": "invalido",
+                               "message": "record_id debe ser un numero entero"})
+            continue
+
+        if record_id in pendientes:
+            resultados.append({"record_id": record_id, "resultado": "duplicado"})
+            continue
+
+        external_id = item.get("external_id")
+        pendientes[record_id] = str(external_id)[:100] if external_id is not None else None
+        resultados.append({"record_id": record_id, "external_id": pendientes[record_id]})
+
+    estados: Dict[int, Optional[str]] = {}
+
+    if pendientes:
+        cnx = get_db_connection()
+        if cnx is None:
+            return {"success": False, "message": "No se pudo conectar a la BD"}
+
+        cursor = None
+        try:
+            cursor = cnx.cursor()
+            ids = list(pendientes.keys())
+
+            # Bloquear las filas: una confirmacion concurrente del mismo lead espera
+            for i in range(0, len(ids), SYNC_CONFIRM_CHUNK):
+                bloque = ids[i:i + SYNC_CONFIRM_CHUNK]
+                placeholders = ", ".join(["%s"] * len(bloque))
+                cursor.execute(f"""
+                    SELECT id, sync_status FROM WIX
+                    WHERE id IN ({placeholders})
+                    FOR UPDATE
+                """, tuple(bloque))
+                estados.update({row[0]: row[1] for row in cursor.fetchall()})
+
+            a_confirmar = [record_id for record_id in ids
+                           if record_id in estados and estados[record_id] != "confirmado"]
+
+            for i in range(0, len(a_confirmar), SYNC_CONFIRM_CHUNK):
+                bloque = a_confirmar[i:i + SYNC_CONFIRM_CHUNK]
+                casos = " ".join(["WHEN %s THEN %s"] * len(bloque))
+                params_casos = [valor for record_id in bloque for valor in (record_id, pendientes[record_id])]
+                placeholders = ", ".join(["%s"] * len(bloque))
+                cursor.execute(f"""
+                    UPDATE WIX SET
+                        sync_status = 'confirmado',
+                        sync_confirmed_at = NOW(),
+                        sync_external_id = CASE id {casos} END,
+                        sync_error = NULL,
+                        sync_proximo_intento = NULL,
+                        sync_bloqueado_por = NULL
+                    WHERE id IN ({placeholders})
+                """, (*params_casos, *bloque))
+
+            cnx.commit()
+            if a_confirmar:
+                invalidar_wix_stats(cnx)
+            marcar_cambio("WIX", cnx)
+
+        except Exception as e:
+            cnx.rollback()
+            print(f"[SyncService] ERROR al confirmar lote de {len(pendientes)} leads: {e}")
+            return {"success": False, "message": f"Error al confirmar el lote: {e}"}
+
+        finally:
+            if cursor is not None:
+                cursor.close()
+            cnx.close()
+
+    conteos = {"actualizados": 0, "ya_confirmados": 0, "no_encontrados": 0, "invalidos": 0, "duplicados": 0}
+    for resultado in resultados:
+        if "resultado" not in resultado:
+            record_id = resultado["record_id"]
+            if record_id not in estados:
+                resultado["resultado"] = "no_encontrado"
+            elif estados[record_id] == "confirmado":
+                resultado["resultado"] = "ya_confirmado"
+            else:
+                resultado["resultado"] = "actualizado"
+        clave = {
+            "actualizado": "actualizados",
+            "ya_confirmado": "ya_confirmados",
+            "no_encontrado": "no_encontrados",
+            "invalido": "invalidos",
+            "duplicado": "duplicados"
+        }[resultado["resultado"]]
+        conteos[clave] += 1
+
+    print(f"[SyncService] Confirmacion por lote: {conteos}")
+
+    return {"success": True, "total": len(items), **conteos, "resultados": resultados}
+
+
 def obtener_leads_pendientes(
     status: Optional[str] = None,
     limit: int = 100
@@ -331,31 +471,20 @@ def obtener_leads_pendientes(
     try:
         cursor = cnx.cursor(dictionary=True)
 
-        # Asegurar columnas existen
-        asegurar_columnas_sync()
-
         if status:
             # Filtrar por estado especifico
-            cursor.execute("""
-                SELECT id, nombre_apellido, empresa, correo, origen,
-                       sync_status, sync_sent_at, sync_confirmed_at, sync_error,
-                       submission_time
-                FROM WIX
-                WHERE sync_status = %s
-                ORDER BY submission_time DESC
-                LIMIT %s
-            """, (status, limit))
+            condicion, params = "sync_status = %s", [status]
         else:
             # Todos los no confirmados
-            cursor.execute("""
-                SELECT id, nombre_apellido, empresa, correo, origen,
-                       sync_status, sync_sent_at, sync_confirmed_at, sync_error,
-                       submission_time
-                FROM WIX
-                WHERE sync_status != 'confirmado' OR sync_status IS NULL
-                ORDER BY submission_time DESC
-                LIMIT %s
-            """, (limit,))
+            condicion, params = CONDICION_NO_CONFIRMADO, []
+
+        cursor.execute(f"""
+            SELECT {COLUMNAS_PENDIENTES}
+            FROM WIX
+            WHERE {condicion}
+            ORDER BY submission_time DESC
+            LIMIT %s
+        """, (*params, limit))
 
         leads = cursor.fetchall()
 
@@ -366,10 +495,7 @@ def obtener_leads_pendientes(
                     lead[key] = value.isoformat()
 
         # Obtener total
-        if status:
-            cursor.execute("SELECT COUNT(*) as total FROM WIX WHERE sync_status = %s", (status,))
-        else:
-            cursor.execute("SELECT COUNT(*) as total FROM WIX WHERE sync_status != 'confirmado' OR sync_status IS NULL")
+        cursor.execute(f"SELECT COUNT(*) as total FROM WIX WHERE {condicion}", params)
 
         total = cursor.fetchone()["total"]
 
@@ -384,55 +510,15 @@ def obtener_leads_pendientes(
         cnx.close()
 
 
-def obtener_estadisticas_sync() -> Dict[str, Any]:
+def obtener_estadisticas_sync(forzar: bool = False) -> Dict[str, Any]:
     """
-    Obtiene estadisticas de sincronizacion.
+    Obtiene estadisticas de sincronizacion (conteo por sync_status).
+    Sale del snapshot compartido de wix_stats.
     """
-    cnx = get_db_connection()
-    if cnx is None:
-        return {"error": "No se pudo conectar a la BD"}
-
-    try:
-        cursor = cnx.cursor(dictionary=True)
-
-        # Asegurar columnas existen
-        asegurar_columnas_sync()
-
-        cursor.execute("""
-            SELECT
-                sync_status,
-                COUNT(*) as cantidad
-            FROM WIX
-            GROUP BY sync_status
-        """)
-
-        stats_raw = cursor.fetchall()
-
-        stats = {
-            "pendiente": 0,
-            "enviado": 0,
-            "confirmado": 0,
-            "error": 0,
-            "timeout": 0,
-            "sin_estado": 0
-        }
-
-        for row in stats_raw:
-            status = row["sync_status"] or "sin_estado"
-            stats[status] = row["cantidad"]
-
-        # Total
-        stats["total"] = sum(stats.values())
-
-        return stats
-
-    except Exception as e:
-        print(f"[SyncService] ERROR al obtener estadisticas: {e}")
-        return {"error": str(e)}
-
-    finally:
-        cursor.close()
-        cnx.close()
+    stats = obtener_estadisticas_wix(forzar)
+    if "error" in stats:
+        return {"error": stats["error"]}
+    return {**stats["sync"], "calculado_en": stats["calculado_en"]}
 
 
 def verificar_timeouts() -> int:
@@ -461,6 +547,9 @@ def verificar_timeouts() -> int:
 
         affected = cursor.rowcount
         cnx.commit()
+        if affected > 0:
+            invalidar_wix_stats(cnx)
+            marcar_cambio("WIX", cnx)
 
         if affected > 0:
             print(f"[SyncService] {affected} leads marcados como timeout")
@@ -476,6 +565,108 @@ def verificar_timeouts() -> int:
         cnx.close()
 
 
+def _rango_fechas(fecha_desde: Optional[str], fecha_hasta: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Convierte fechas YYYY-MM-DD (inclusivas) en el rango semiabierto
+    [desde 00:00, hasta + 1 dia 00:00) para comparar submission_time sin DATE().
+
+    Raises:
+        ValueError si alguna fecha no tiene formato YYYY-MM-DD
+    """
+    desde = datetime.strptime(fecha_desde, "%Y-%m-%d") if fecha_desde else None
+    hasta = datetime.strptime(fecha_hasta, "%Y-%m-%d") + timedelta(days=1) if fecha_hasta else None
+    return desde, hasta
+
+
+def _condiciones_leads(
+    asignado: Optional[bool] = None,
+    asesor: Optional[str] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    origen: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """Filtros de /sync/leads con predicados que usan los indices de la migracion 12."""
+    conditions = ""
+    params: List[Any] = []
+
+    # Filtro por asignacion (columna generada lead_asignado)
+    if asignado is not None:
+        conditions += " AND lead_asignado = %s"
+        params.append(1 if asignado else 0)
+
+    # Filtro por asesor
+    if asesor:
+        conditions += " AND asesor_in = %s"
+        params.append(asesor)
+
+    # Filtro por fechas: rango semiabierto sobre submission_time
+    desde, hasta = _rango_fechas(fecha_desde, fecha_hasta)
+    if desde:
+        conditions += " AND submission_time >= %s"
+        params.append(desde)
+    if hasta:
+        conditions += " AND submission_time < %s"
+        params.append(hasta)
+
+    # Filtro por origen
+    if origen:
+        conditions += " AND origen = %s"
+        params.append(origen)
+
+    return conditions, params
+
+
+def _condicion_despues_de(despues_de: Tuple[Optional[datetime], int]) -> Tuple[str, List[Any]]:
+    """
+    Predicado keyset para la pagina siguiente en orden (submission_time DESC, id DESC).
+    Los NULL de submission_time van al final en orden descendente.
+    """
+    submission_time, record_id = despues_de
+    if submission_time is None:
+        return " AND submission_time IS NULL AND id < %s", [record_id]
+    return (
+        " AND (submission_time < %s OR (submission_time = %s AND id < %s) OR submission_time IS NULL)",
+        [submission_time, submission_time, record_id]
+    )
+
+
+def consulta_leads(
+    asignado: Optional[bool] = None,
+    asesor: Optional[str] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    origen: Optional[str] = None,
+    despues_de: Optional[Tuple[Optional[datetime], int]] = None
+) -> Tuple[str, str, List[Any]]:
+    """
+    Arma la consulta de /sync/leads.
+
+    Returns:
+        Tupla (query con LIMIT/OFFSET pendientes, query de conteo, parametros
+        de la query). El conteo no incluye el predicado de la pagina (despues_de).
+    """
+    conditions, params = _condiciones_leads(asignado, asesor, fecha_desde, fecha_hasta, origen)
+    count_query = f"SELECT COUNT(*) as total FROM WIX WHERE 1=1{conditions}"
+
+    if despues_de is not None:
+        condicion_pagina, params_pagina = _condicion_despues_de(despues_de)
+        conditions += condicion_pagina
+        params = params + params_pagina
+
+    query = (
+        f"SELECT {COLUMNAS_LEADS} FROM WIX WHERE 1=1{conditions} "
+        "ORDER BY submission_time DESC, id DESC LIMIT %s OFFSET %s"
+    )
+    return query, count_query, params
+
+
+def _estimar_total(cursor, count_query: str, params: List[Any]) -> int:
+    """Filas estimadas por el optimizador (EXPLAIN), sin recorrer la tabla."""
+    cursor.execute("EXPLAIN " + count_query.replace("COUNT(*) as total", "id", 1), params)
+    plan = cursor.fetchall()
+    return int(plan[0]["rows"] or 0) if plan else 0
+
+
 def obtener_todos_los_leads(
     asignado: Optional[bool] = None,
     asesor: Optional[str] = None,
@@ -483,10 +674,13 @@ def obtener_todos_los_leads(
     fecha_hasta: Optional[str] = None,
     origen: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
-) -> Tuple[List[Dict], int]:
+    offset: int = 0,
+    despues_de: Optional[Tuple[Optional[datetime], int]] = None,
+    conteo: str = "exact"
+) -> Tuple[List[Dict], Optional[int], Optional[Tuple[Optional[datetime], int]]]:
     """
-    Obtiene todos los leads con filtros opcionales.
+    Obtiene una pagina de leads con filtros opcionales, ordenada por
+    (submission_time, id) descendente.
 
     Args:
         asignado: True=solo asignados, False=solo sin asignar, None=todos
@@ -495,74 +689,42 @@ def obtener_todos_los_leads(
         fecha_hasta: Fecha maxima de submission_time (YYYY-MM-DD)
         origen: Filtrar por origen (WIX, UNKNOWN, etc.)
         limit: Maximo de registros a retornar
-        offset: Registros a saltar (para paginacion)
+        offset: Registros a saltar (paginacion antigua; preferir despues_de)
+        despues_de: (submission_time, id) del ultimo lead de la pagina anterior
+        conteo: "exact" (COUNT(*)), "estimate" (EXPLAIN) o "false" (sin total)
 
     Returns:
-        Tupla con (lista de leads, total de registros)
+        Tupla con (lista de leads, total o None, clave de la pagina siguiente o None)
     """
     cnx = get_db_connection()
     if cnx is None:
-        return [], 0
+        return [], 0, None
 
     try:
         cursor = cnx.cursor(dictionary=True)
 
-        # Construir query dinamicamente
-        base_query = """
-            SELECT
-                id, nombre_apellido, empresa, telefono2, ruc_dni, correo,
-                treq_requerimiento, origen, submission_time, observacion,
-                asesor_in, fecha_asignacion,
-                siek_cliente, ia_cliente_doc, ia_cliente_sector,
-                ia_cliente_razon_social, ia_tipo_requerimiento, ia_confianza,
-                sync_status, sync_sent_at, sync_confirmed_at
-            FROM WIX
-            WHERE 1=1
-        """
-
-        count_query = "SELECT COUNT(*) as total FROM WIX WHERE 1=1"
-
-        params = []
-        conditions = ""
-
-        # Filtro por asignacion
-        if asignado is True:
-            conditions += " AND (asesor_in IS NOT NULL AND asesor_in != '' AND fecha_asignacion IS NOT NULL)"
-        elif asignado is False:
-            conditions += " AND (asesor_in IS NULL OR asesor_in = '' OR fecha_asignacion IS NULL)"
-
-        # Filtro por asesor
-        if asesor:
-            conditions += " AND asesor_in = %s"
-            params.append(asesor)
-
-        # Filtro por fecha desde
-        if fecha_desde:
-            conditions += " AND DATE(submission_time) >= %s"
-            params.append(fecha_desde)
-
-        # Filtro por fecha hasta
-        if fecha_hasta:
-            conditions += " AND DATE(submission_time) <= %s"
-            params.append(fecha_hasta)
-
-        # Filtro por origen
-        if origen:
-            conditions += " AND origen = %s"
-            params.append(origen)
-
-        # Query final con ordenamiento y paginacion
-        final_query = base_query + conditions + " ORDER BY submission_time DESC LIMIT %s OFFSET %s"
-        final_count_query = count_query + conditions
-
-        # Ejecutar count primero
-        cursor.execute(final_count_query, params)
-        total = cursor.fetchone()["total"]
-
-        # Ejecutar query principal
-        cursor.execute(final_query, params + [limit, offset])
+        final_query, final_count_query, params = consulta_leads(
+            asignado, asesor, fecha_desde, fecha_hasta, origen, despues_de
+        )
+        # El conteo usa solo los filtros (sin el predicado de la pagina)
+        _, params_conteo = _condiciones_leads(asignado, asesor, fecha_desde, fecha_hasta, origen)
+
+        total = None
+        if conteo == "exact":
+            cursor.execute(final_count_query, params_conteo)
+            total = cursor.fetchone()["total"]
+        elif conteo == "estimate":
+            total = _estimar_total(cursor, final_count_query, params_conteo)
+
+        # Una fila extra para saber si hay pagina siguiente
+        cursor.execute(final_query, params + [limit + 1, offset])
         leads = cursor.fetchall()
 
+        siguiente = None
+        if len(leads) > limit:
+            leads = leads[:limit]
+            siguiente = (leads[-1]["submission_time"], leads[-1]["id"])
+
         # Convertir datetime a string y agregar campo calculado 'asignado'
         for lead in leads:
             for key, value in lead.items():
@@ -575,11 +737,11 @@ def obtener_todos_los_leads(
                 lead.get('fecha_asignacion')
             )
 
-        return leads, total
+        return leads, total, siguiente
 
     except Exception as e:
         print(f"[SyncService] ERROR al obtener leads: {e}")
-        return [], 0
+        return [], 0, None
 
     finally:
         cursor.close()
@@ -617,64 +779,382 @@ def obtener_asesores_disponibles() -> List[str]:
         cnx.close()
 
 
-def obtener_estadisticas_asignacion() -> Dict[str, Any]:
+def obtener_estadisticas_asignacion(forzar: bool = False) -> Dict[str, Any]:
     """
     Obtiene estadisticas de asignacion de leads.
+    Sale del snapshot compartido de wix_stats (un solo recorrido de WIX).
+    """
+    stats = obtener_estadisticas_wix(forzar)
+    if "error" in stats:
+        return {"error": stats["error"]}
+    return {**stats["asignacion"], "calculado_en": stats["calculado_en"]}
+
+
+# ============================================================================
+# OUTBOX: DESPACHO POR LOTES
+# ============================================================================
+
+# Leads por lote del despachador
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "50"))
+# batch: un POST con todos los leads del lote; single: un POST por lead;
+# auto: intenta batch y pasa a single si el receptor no lo acepta
+SYNC_BATCH_MODE = os.getenv("SYNC_BATCH_MODE", "auto").lower()
+SYNC_BATCH_ENDPOINT = os.getenv("SYNC_BATCH_ENDPOINT", EXTERNAL_ENDPOINT)
+# Envios simultaneos en modo single
+SYNC_DISPATCH_CONCURRENCIA = int(os.getenv("SYNC_DISPATCH_CONCURRENCIA", "4"))
+# Backoff por lead: base * 2^intentos segundos (con jitter), hasta el maximo
+SYNC_BACKOFF_BASE = int(os.getenv("SYNC_BACKOFF_BASE", "60"))
+SYNC_BACKOFF_MAX = int(os.getenv("SYNC_BACKOFF_MAX", "21600"))
+# Segundos que un lote reclamado queda reservado para su despachador
+SYNC_LEASE_SECONDS = int(os.getenv("SYNC_LEASE_SECONDS", "300"))
+# Segundos entre pasadas del despachador en modo worker
+SYNC_DISPATCH_INTERVAL = int(os.getenv("SYNC_DISPATCH_INTERVAL", "30"))
+
+# Respuestas que indican que el receptor no acepta el formato por lotes
+STATUS_LOTE_NO_SOPORTADO = {400, 404, 405, 413, 415, 422, 501}
+
+_CONDICION_OUTBOX = """
+    (
+        ((sync_status IS NULL OR sync_status IN ('pendiente', 'error', 'timeout'))
+         AND sync_intentos < sync_max_intentos
+         AND (sync_proximo_intento IS NULL OR sync_proximo_intento <= NOW()))
+        OR (sync_status = 'enviando' AND sync_proximo_intento <= NOW()
+            AND sync_intentos < sync_max_intentos)
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM lead_jobs j
+        WHERE j.record_id = WIX.id
+          AND j.etapa IN ('gemini', 'sync')
+          AND j.estado IN ('pendiente', 'en_proceso')
+    )
+"""
+
+# None = aun no se sabe si el receptor acepta lotes (modo auto)
+_lote_soportado: Optional[bool] = None
+
+
+def _serializar_lead(lead: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in lead.items():
+        if isinstance(value, datetime):
+            lead[key] = value.isoformat()
+    return lead
+
+
+def _cerrar_leases_agotados(cursor) -> int:
+    """
+    Pasa a 'error' los leads con lease vencido que ya agotaron sus intentos
+    (no vuelven a ser elegibles). Retorna cuantos cambiaron.
+    """
+    cursor.execute("""
+        UPDATE WIX SET
+            sync_status = 'error',
+            sync_error = 'Lease vencido sin resultado tras agotar los intentos',
+            sync_bloqueado_por = NULL,
+            sync_proximo_intento = NULL
+        WHERE sync_status = 'enviando' AND sync_proximo_intento <= NOW()
+          AND sync_intentos >= sync_max_intentos
+    """)
+    if cursor.rowcount > 0:
+        print(f"[SyncService] {cursor.rowcount} leads con lease vencido pasan a 'error'")
+    return cursor.rowcount
+
+
+def _reclamar_lote_outbox(cursor, despachador: str, limite: int) -> List[Dict[str, Any]]:
+    """
+    Reserva hasta `limite` leads elegibles (claim optimista con lease) y
+    retorna sus datos completos. Un lote abandonado vuelve a ser elegible
+    cuando vence el lease y reclamarlo cuenta como un intento, asi un lead
+    que tumba al despachador no bloquea el outbox para siempre.
+    """
+    cursor.execute(f"""
+        SELECT id FROM WIX
+        WHERE {_CONDICION_OUTBOX}
+        ORDER BY id
+        LIMIT %s
+    """, (limite,))
+    ids = [row["id"] for row in cursor.fetchall()]
+    if not ids:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    # MySQL evalua las asignaciones en orden: el intento se cuenta antes de cambiar sync_status
+    cursor.execute(f"""
+        UPDATE WIX SET
+            sync_intentos = sync_intentos + IF(sync_status = 'enviando', 1, 0),
+            sync_status = 'enviando',
+            sync_bloqueado_por = %s,
+            sync_proximo_intento = NOW() + INTERVAL %s SECOND
+        WHERE id IN ({placeholders}) AND {_CONDICION_OUTBOX}
+    """, (despachador, SYNC_LEASE_SECONDS, *ids))
+
+    cursor.execute("""
+        SELECT * FROM WIX
+        WHERE sync_bloqueado_por = %s AND sync_status = 'enviando'
+        ORDER BY id
+    """, (despachador,))
+    return [_serializar_lead(lead) for lead in cursor.fetchall()]
+
+
+def _leer_resultados_lote(response, ids: List[int]) -> Dict[int, Optional[str]]:
+    """
+    Resultado por lead de un POST por lotes. Si el receptor devuelve
+    {"results": [{"record_id", "success", "error"}]} se usa; si no, un 2xx
+    confirma todo el lote.
+    """
+    resultados: Dict[int, Optional[str]] = {record_id: None for record_id in ids}
+    try:
+        data = response.json() if response.text else {}
+    except ValueError:
+        return resultados
+
+    for item in (data.get("results") or []) if isinstance(data, dict) else []:
+        try:
+            record_id = int(item.get("record_id"))
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if record_id in resultados and not item.get("success", item.get("ok", True)):
+            resultados[record_id] = str(item.get("error") or "Rechazado por el sistema externo")[:500]
+    return resultados
+
+
+def _enviar_lote_externo(leads: List[Dict[str, Any]]) -> Optional[Dict[int, Optional[str]]]:
+    """
+    Un POST con todos los leads. Retorna {record_id: error o None}, o None si
+    el receptor no acepta lotes (se envian uno por uno).
     """
+    global _lote_soportado
+    ids = [lead["id"] for lead in leads]
+
+    try:
+        response = http_post(
+            "sync",
+            SYNC_BATCH_ENDPOINT,
+            json={
+                "source": "feedback_califcacion",
+                "timestamp": datetime.now().isoformat(),
+                "leads": leads
+            },
+            headers={
+                "Content-Type": "application/json",
+                "X-Source-System": "feedback_califcacion",
+                "X-Batch-Size": str(len(leads))
+            }
+        )
+    except requests.exceptions.Timeout:
+        return {record_id: "Timeout al conectar con sistema externo" for record_id in ids}
+    except requests.exceptions.ConnectionError as e:
+        return {record_id: f"Error de conexion: {str(e)[:100]}" for record_id in ids}
+    except Exception as e:
+        # Como en _enviar_individual: el error queda por lead y el lote no se pierde en 'enviando'
+        return {record_id: f"Error inesperado: {str(e)[:200]}" for record_id in ids}
+
+    if response.ok:
+        _lote_soportado = True
+        return _leer_resultados_lote(response, ids)
+
+    if SYNC_BATCH_MODE == "auto" and not _lote_soportado and response.status_code in STATUS_LOTE_NO_SOPORTADO:
+        print(f"[SyncService] El receptor no acepta lotes (HTTP {response.status_code}); se envia lead por lead")
+        _lote_soportado = False
+        return None
+
+    error = f"HTTP {response.status_code}: {response.text[:200]}"
+    return {record_id: error for record_id in ids}
+
+
+def _enviar_individual(lead: Dict[str, Any]) -> Optional[str]:
+    """POST de un lead con el payload de enviar_lead_a_sistema_externo. Retorna el error o None."""
+    try:
+        response = http_post(
+            "sync",
+            EXTERNAL_ENDPOINT,
+            json={
+                "source": "feedback_califcacion",
+                "timestamp": datetime.now().isoformat(),
+                "lead": lead
+            },
+            headers={
+                "Content-Type": "application/json",
+                "X-Source-System": "feedback_califcacion",
+                "X-Record-ID": str(lead["id"])
+            }
+        )
+    except requests.exceptions.Timeout:
+        return "Timeout al conectar con sistema externo"
+    except requests.exceptions.ConnectionError as e:
+        return f"Error de conexion: {str(e)[:100]}"
+    except Exception as e:
+        return f"Error inesperado: {str(e)[:200]}"
+
+    if response.ok:
+        return None
+    return f"HTTP {response.status_code}: {response.text[:200]}"
+
+
+def _registrar_resultados(cursor, resultados: Dict[int, Optional[str]],
+                          despachador: str) -> Tuple[int, int, int]:
+    """
+    Actualiza el estado de todo el lote con dos UPDATE: enviados y fallidos.
+    Los fallidos se reprograman con backoff exponencial calculado en SQL y
+    pasan a 'error' al agotar sync_max_intentos.
+
+    Solo se tocan las filas que siguen reservadas por `despachador`: si el
+    receptor ya confirmo el lead o el lease vencio y otro despachador lo
+    reclamo, el resultado se descarta (lease perdido).
+
+    Returns:
+        (enviados, fallidos, lease_perdido)
+    """
+    enviados = [record_id for record_id, error in resultados.items() if error is None]
+    fallidos = {record_id: error for record_id, error in resultados.items() if error is not None}
+
+    if enviados:
+        placeholders = ", ".join(["%s"] * len(enviados))
+        cursor.execute(f"""
+            UPDATE WIX SET
+                sync_status = 'enviado',
+                sync_sent_at = NOW(),
+                sync_error = NULL,
+                sync_intentos = 0,
+                sync_proximo_intento = NULL,
+                sync_bloqueado_por = NULL
+            WHERE id IN ({placeholders}) AND sync_status = 'enviando' AND sync_bloqueado_por = %s
+        """, (*enviados, despachador))
+        registrados_enviados = cursor.rowcount
+    else:
+        registrados_enviados = 0
+
+    if fallidos:
+        casos = " ".join(["WHEN %s THEN %s"] * len(fallidos))
+        params_casos = [valor for par in fallidos.items() for valor in par]
+        placeholders = ", ".join(["%s"] * len(fallidos))
+        # MySQL evalua las asignaciones en orden: sync_intentos se incrementa al final
+        cursor.execute(f"""
+            UPDATE WIX SET
+                sync_error = CASE id {casos} END,
+                sync_status = IF(sync_intentos + 1 >= sync_max_intentos, 'error', 'pendiente'),
+                sync_proximo_intento = NOW() + INTERVAL
+                    ROUND(LEAST(%s, %s * POW(2, sync_intentos)) * (0.5 + RAND() / 2)) SECOND,
+                sync_intentos = sync_intentos + 1,
+                sync_bloqueado_por = NULL
+            WHERE id IN ({placeholders}) AND sync_status = 'enviando' AND sync_bloqueado_por = %s
+        """, (*params_casos, SYNC_BACKOFF_MAX, SYNC_BACKOFF_BASE, *fallidos.keys(), despachador))
+        registrados_fallidos = cursor.rowcount
+    else:
+        registrados_fallidos = 0
+
+    perdidos = len(resultados) - registrados_enviados - registrados_fallidos
+    if perdidos:
+        print(f"[SyncService] {perdidos} leads ya no estaban reservados por {despachador} (lease perdido)")
+    return registrados_enviados, registrados_fallidos, perdidos
+
+
+def despachar_outbox(limite: int = SYNC_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Una pasada del despachador: reclama un lote, lo envia (por lotes o
+    lead por lead) y registra el resultado con UPDATEs masivos.
+
+    Returns:
+        Dict con reclamados, enviados, fallidos y modo usado
+    """
+    if not SYNC_ENABLED:
+        return {"success": False, "skipped": True, "message": "Sincronizacion deshabilitada (SYNC_ENABLED=false)"}
+
     cnx = get_db_connection()
     if cnx is None:
-        return {"error": "No se pudo conectar a la BD"}
+        return {"success": False, "message": "No se pudo conectar a la BD"}
 
+    despachador = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    cursor = None
     try:
         cursor = cnx.cursor(dictionary=True)
+        agotados = _cerrar_leases_agotados(cursor)
+        leads = _reclamar_lote_outbox(cursor, despachador, limite)
+        cnx.commit()
+        if agotados:
+            invalidar_wix_stats(cnx)
 
-        # Total de leads
-        cursor.execute("SELECT COUNT(*) as total FROM WIX")
-        total = cursor.fetchone()["total"]
+        if not leads:
+            return {"success": True, "reclamados": 0, "enviados": 0, "fallidos": 0, "lease_perdido": 0}
 
-        # Leads asignados
-        cursor.execute("""
-            SELECT COUNT(*) as asignados
-            FROM WIX
-            WHERE asesor_in IS NOT NULL AND asesor_in != '' AND fecha_asignacion IS NOT NULL
-        """)
-        asignados = cursor.fetchone()["asignados"]
+        resultados = None
+        modo = "single"
+        if SYNC_BATCH_MODE == "batch" or (SYNC_BATCH_MODE == "auto" and _lote_soportado is not False):
+            resultados = _enviar_lote_externo(leads)
+            modo = "batch"
 
-        # Leads sin asignar
-        sin_asignar = total - asignados
+        if resultados is None:
+            modo = "single"
+            with ThreadPoolExecutor(max_workers=max(1, SYNC_DISPATCH_CONCURRENCIA)) as executor:
+                errores = list(executor.map(_enviar_individual, leads))
+            resultados = {lead["id"]: error for lead, error in zip(leads, errores)}
 
-        # Por asesor
-        cursor.execute("""
-            SELECT asesor_in, COUNT(*) as cantidad
-            FROM WIX
-            WHERE asesor_in IS NOT NULL AND asesor_in != ''
-            GROUP BY asesor_in
-            ORDER BY cantidad DESC
-        """)
-        por_asesor = {row["asesor_in"]: row["cantidad"] for row in cursor.fetchall()}
+        enviados, fallidos, perdidos = _registrar_resultados(cursor, resultados, despachador)
+        cnx.commit()
+        invalidar_wix_stats(cnx)
+        marcar_cambio("WIX", cnx)
 
-        # Por origen
-        cursor.execute("""
-            SELECT origen, COUNT(*) as cantidad
-            FROM WIX
-            GROUP BY origen
-            ORDER BY cantidad DESC
-        """)
-        por_origen = {row["origen"] or "sin_origen": row["cantidad"] for row in cursor.fetchall()}
+        print(f"[SyncService] Outbox ({modo}): {enviados} enviados, {fallidos} fallidos, "
+              f"{perdidos} con lease perdido de {len(leads)}")
 
         return {
-            "total": total,
-            "asignados": asignados,
-            "sin_asignar": sin_asignar,
-            "porcentaje_asignados": round((asignados / total * 100) if total > 0 else 0, 1),
-            "por_asesor": por_asesor,
-            "por_origen": por_origen
+            "success": True,
+            "modo": modo,
+            "reclamados": len(leads),
+            "enviados": enviados,
+            "fallidos": fallidos,
+            "lease_perdido": perdidos
         }
 
     except Exception as e:
-        print(f"[SyncService] ERROR al obtener estadisticas de asignacion: {e}")
-        return {"error": str(e)}
+        cnx.rollback()
+        print(f"[SyncService] ERROR en el despacho del outbox: {e}")
+        return {"success": False, "message": str(e)}
 
     finally:
-        cursor.close()
+        if cursor is not None:
+            cursor.close()
         cnx.close()
+
+
+def despachar_pendientes(max_lotes: int = 10, limite: int = SYNC_BATCH_SIZE) -> Dict[str, Any]:
+    """Despacha lotes hasta vaciar el outbox o llegar a max_lotes."""
+    totales = {"success": True, "lotes": 0, "reclamados": 0, "enviados": 0, "fallidos": 0, "lease_perdido": 0}
+
+    for _ in range(max(1, max_lotes)):
+        resultado = despachar_outbox(limite)
+        if not resultado.get("success"):
+            totales.update({k: v for k, v in resultado.items() if k in ("success", "skipped", "message")})
+            break
+        if not resultado["reclamados"]:
+            break
+        totales["lotes"] += 1
+        for campo in ("reclamados", "enviados", "fallidos", "lease_perdido"):
+            totales[campo] += resultado[campo]
+
+    return totales
+
+
+def ejecutar_despachador(intervalo: int = SYNC_DISPATCH_INTERVAL) -> None:
+    """Worker de larga duracion: marca timeouts y despacha el outbox cada `intervalo` segundos."""
+    print(f"[SyncService] Despachador iniciado (lote {SYNC_BATCH_SIZE}, modo {SYNC_BATCH_MODE}, cada {intervalo}s)")
+    while True:
+        verificar_timeouts()
+        resultado = despachar_pendientes(max_lotes=1000)
+        if not resultado.get("reclamados"):
+            time.sleep(intervalo)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Despachador del outbox de sincronizacion")
+    parser.add_argument("--worker", action="store_true", help="Queda en ejecucion despachando periodicamente")
+    parser.add_argument("--intervalo", type=int, default=SYNC_DISPATCH_INTERVAL)
+    parser.add_argument("--max-lotes", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.worker:
+        try:
+            ejecutar_despachador(args.intervalo)
+        except KeyboardInterrupt:
+            print("\n[SyncService] Despachador detenido")
+    else:
+        print(despachar_pendientes(max_lotes=args.max_lotes))
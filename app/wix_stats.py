@@ -0,0 +1,224 @@
+"""
+Estadisticas de WIX - Un solo recorrido de la tabla y snapshot compartido
+
+Las estadisticas de asignacion (/sync/leads/stats) y de sincronizacion
+(/sync/stats) salen de una unica consulta agrupada por
+(origen, asesor, asignado, sync_status). El resultado se guarda:
+    - en memoria del proceso
+    - en la tabla wix_stats (compartida entre workers)
+y se reutiliza mientras tenga menos de WIX_STATS_MAX_AGE segundos y no se
+haya invalidado. Los INSERT de leads y los cambios de sync_status invalidan
+el snapshot con invalidar_wix_stats(cnx) despues de su commit, en una
+sentencia corta propia. Antes de servir la copia en memoria se comprueba en
+wix_stats (por PK) que el snapshot siga vigente y sea el mismo, asi la
+invalidacion hecha por otro worker se ve al instante; las asignaciones (hechas
+fuera de esta app) se reflejan al vencer la ventana.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from app.db import get_db_connection
+except ImportError:
+    from db import get_db_connection
+
+
+# Segundos que un snapshot se considera vigente
+WIX_STATS_MAX_AGE = int(os.getenv("WIX_STATS_MAX_AGE", "60"))
+
+CLAVE_SNAPSHOT = "wix"
+
+_memoria: Dict[str, Any] = {"valor": None, "calculado": 0.0, "marca": None}
+_recalculo_lock = threading.Lock()
+
+
+def invalidar_wix_stats(cnx=None) -> None:
+    """
+    Marca el snapshot como vencido en una transaccion corta, despues del
+    commit de quien llama: sobre `cnx` si se pasa o sobre una conexion prestada.
+    """
+    _memoria["calculado"] = 0.0
+    propia = cnx is None
+    try:
+        if propia:
+            cnx = get_db_connection()
+            if cnx is None:
+                return
+        cursor = cnx.cursor()
+        cursor.execute("UPDATE wix_stats SET vigente = 0 WHERE clave = %s", (CLAVE_SNAPSHOT,))
+        cnx.commit()
+        cursor.close()
+    except Exception as e:
+        # Sin tabla (migracion pendiente) el snapshot solo vence por tiempo
+        print(f"[WixStats] No se pudo invalidar el snapshot: {e}")
+    finally:
+        if propia and cnx is not None:
+            cnx.close()
+
+
+def calcular_estadisticas_wix(cursor) -> Dict[str, Any]:
+    """Asignacion y sincronizacion en un solo recorrido de WIX."""
+    cursor.execute("""
+        SELECT
+            origen,
+            NULLIF(asesor_in, '') AS asesor,
+            (asesor_in IS NOT NULL AND asesor_in != '' AND fecha_asignacion IS NOT NULL) AS asignado,
+            sync_status,
+            COUNT(*) AS cantidad
+        FROM WIX
+        GROUP BY origen, asesor, asignado, sync_status
+    """)
+
+    total = 0
+    asignados = 0
+    por_asesor: Dict[str, int] = {}
+    por_origen: Dict[str, int] = {}
+    sync = {
+        "pendiente": 0,
+        "enviando": 0,
+        "enviado": 0,
+        "confirmado": 0,
+        "error": 0,
+        "timeout": 0,
+        "sin_estado": 0
+    }
+
+    for row in cursor.fetchall():
+        cantidad = int(row["cantidad"])
+        total += cantidad
+        if row["asignado"]:
+            asignados += cantidad
+        if row["asesor"] is not None:
+            por_asesor[row["asesor"]] = por_asesor.get(row["asesor"], 0) + cantidad
+        origen = row["origen"] or "sin_origen"
+        por_origen[origen] = por_origen.get(origen, 0) + cantidad
+        status = row["sync_status"] or "sin_estado"
+        sync[status] = sync.get(status, 0) + cantidad
+
+    sync["total"] = sum(sync.values())
+
+    return {
+        "asignacion": {
+            "total": total,
+            "asignados": asignados,
+            "sin_asignar": total - asignados,
+            "porcentaje_asignados": round((asignados / total * 100) if total > 0 else 0, 1),
+            "por_asesor": dict(sorted(por_asesor.items(), key=lambda x: x[1], reverse=True)),
+            "por_origen": dict(sorted(por_origen.items(), key=lambda x: x[1], reverse=True))
+        },
+        "sync": sync,
+        "calculado_en": datetime.now().isoformat()
+    }
+
+
+def _leer_snapshot(cursor) -> Optional[Tuple[Dict[str, Any], Any]]:
+    """(valor, marca) del snapshot vigente; None si vencio o no existe."""
+    cursor.execute("""
+        SELECT valor, UNIX_TIMESTAMP(calculado_en) AS marca FROM wix_stats
+        WHERE clave = %s AND vigente = 1
+          AND calculado_en > NOW() - INTERVAL %s SECOND
+    """, (CLAVE_SNAPSHOT, WIX_STATS_MAX_AGE))
+    row = cursor.fetchone()
+    return (json.loads(row["valor"]), row["marca"]) if row else None
+
+
+def _leer_marca(cursor) -> Any:
+    """Marca del snapshot vigente en wix_stats (sin leer el valor)."""
+    cursor.execute("""
+        SELECT UNIX_TIMESTAMP(calculado_en) AS marca FROM wix_stats
+        WHERE clave = %s AND vigente = 1
+    """, (CLAVE_SNAPSHOT,))
+    row = cursor.fetchone()
+    return row["marca"] if row else None
+
+
+def _memoria_vigente() -> bool:
+    """La copia en memoria es la del snapshot vigente de wix_stats."""
+    if _memoria["marca"] is None:
+        return False
+    cnx = get_db_connection()
+    if cnx is None:
+        return False
+    try:
+        cursor = cnx.cursor(dictionary=True)
+        marca = _leer_marca(cursor)
+        cursor.close()
+        return marca == _memoria["marca"]
+    except Exception as e:
+        print(f"[WixStats] No se pudo comprobar el snapshot: {e}")
+        return False
+    finally:
+        cnx.close()
+
+
+def _guardar_snapshot(cursor, valor: Dict[str, Any]) -> None:
+    cursor.execute("""
+        INSERT INTO wix_stats (clave, valor, vigente, calculado_en)
+        VALUES (%s, %s, 1, NOW())
+        ON DUPLICATE KEY UPDATE valor = VALUES(valor), vigente = 1, calculado_en = NOW()
+    """, (CLAVE_SNAPSHOT, json.dumps(valor, ensure_ascii=False)))
+
+
+def obtener_estadisticas_wix(forzar: bool = False) -> Dict[str, Any]:
+    """
+    Snapshot vigente de las estadisticas (memoria -> wix_stats -> recalculo).
+    Solo un hilo por proceso recalcula; los demas reciben el snapshot anterior
+    si existe.
+
+    Returns:
+        Dict con asignacion, sync y calculado_en (o {"error": ...})
+    """
+    if not forzar and _memoria["valor"] is not None \
+            and time.time() - _memoria["calculado"] < WIX_STATS_MAX_AGE \
+            and _memoria_vigente():
+        return _memoria["valor"]
+
+    if not _recalculo_lock.acquire(blocking=_memoria["valor"] is None):
+        return _memoria["valor"]
+
+    try:
+        cnx = get_db_connection()
+        if cnx is None:
+            return _memoria["valor"] or {"error": "No se pudo conectar a la BD"}
+
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            valor, marca = None, None
+            if not forzar:
+                try:
+                    snapshot = _leer_snapshot(cursor)
+                    if snapshot is not None:
+                        valor, marca = snapshot
+                except Exception as e:
+                    print(f"[WixStats] Snapshot no disponible: {e}")
+
+            if valor is None:
+                valor = calcular_estadisticas_wix(cursor)
+                try:
+                    _guardar_snapshot(cursor, valor)
+                    marca = _leer_marca(cursor)
+                    cnx.commit()
+                except Exception as e:
+                    cnx.rollback()
+                    print(f"[WixStats] No se pudo guardar el snapshot: {e}")
+
+            _memoria["valor"] = valor
+            _memoria["calculado"] = time.time()
+            _memoria["marca"] = marca
+            return valor
+
+        except Exception as e:
+            print(f"[WixStats] ERROR al calcular estadisticas: {e}")
+            return {"error": str(e)}
+
+        finally:
+            cursor.close()
+            cnx.close()
+
+    finally:
+        _recalculo_lock.release()
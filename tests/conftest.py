@@ -0,0 +1,62 @@
+"""
+Configuracion comun de las pruebas: el paquete `app` se importa desde la raiz
+del repo y los cursores de MySQL se reemplazan por FakeCursor, que guarda cada
+sentencia con sus parametros para poder revisar el SQL generado.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def normalizar(sql: str) -> str:
+    """SQL en una sola linea con espacios simples."""
+    return " ".join(sql.split())
+
+
+class FakeCursor:
+    """
+    Cursor falso. `respuestas` es una lista de resultados que se entregan en
+    orden a fetchall/fetchone; `rowcounts` el rowcount tras cada execute
+    (por defecto 0).
+    """
+
+    def __init__(self, respuestas=None, rowcounts=None):
+        self.respuestas = list(respuestas or [])
+        self.rowcounts = list(rowcounts or [])
+        self.sentencias = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.sentencias.append((normalizar(sql), tuple(params or ())))
+        self.rowcount = self.rowcounts.pop(0) if self.rowcounts else 0
+
+    def fetchall(self):
+        return self.respuestas.pop(0) if self.respuestas else []
+
+    def fetchone(self):
+        filas = self.fetchall()
+        return filas[0] if filas else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, *args, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
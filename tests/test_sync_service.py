@@ -0,0 +1,190 @@
+"""Guardas SQL del outbox, la confirmacion por lotes y la paginacion keyset de sync_service."""
+
+from datetime import datetime
+
+import pytest
+
+from app import sync_service
+from conftest import FakeCursor, FakeConnection, normalizar
+
+
+GUARDA_LEASE = "AND sync_status = 'enviando' AND sync_bloqueado_por = %s"
+
+
+# ----------------------------------------------------------------------
+# _registrar_resultados
+# ----------------------------------------------------------------------
+
+def test_registrar_resultados_solo_toca_filas_del_despachador():
+    cursor = FakeCursor(rowcounts=[2, 1])
+    resultados = {10: None, 11: None, 12: "HTTP 500: error"}
+
+    enviados, fallidos, perdidos = sync_service._registrar_resultados(cursor, resultados, "host:1:abc")
+
+    assert (enviados, fallidos, perdidos) == (2, 1, 0)
+    (sql_enviados, params_enviados), (sql_fallidos, params_fallidos) = cursor.sentencias
+
+    assert "sync_status = 'enviado'" in sql_enviados
+    assert sql_enviados.endswith(f"WHERE id IN (%s, %s) {GUARDA_LEASE}")
+    assert params_enviados == (10, 11, "host:1:abc")
+
+    assert "IF(sync_intentos + 1 >= sync_max_intentos, 'error', 'pendiente')" in sql_fallidos
+    assert sql_fallidos.endswith(f"WHERE id IN (%s) {GUARDA_LEASE}")
+    assert params_fallidos[:2] == (12, "HTTP 500: error")
+    assert params_fallidos[-2:] == (12, "host:1:abc")
+
+
+def test_registrar_resultados_cuenta_lease_perdido():
+    # El receptor confirmo 21 y otro despachador reclamo 22: ningun UPDATE los toca
+    cursor = FakeCursor(rowcounts=[1, 0])
+    resultados = {20: None, 21: None, 22: "Timeout"}
+
+    assert sync_service._registrar_resultados(cursor, resultados, "d") == (1, 0, 2)
+
+
+def test_registrar_resultados_sin_fallidos_un_solo_update():
+    cursor = FakeCursor(rowcounts=[1])
+
+    assert sync_service._registrar_resultados(cursor, {5: None}, "d") == (1, 0, 0)
+    assert len(cursor.sentencias) == 1
+
+
+# ----------------------------------------------------------------------
+# _cerrar_leases_agotados / _reclamar_lote_outbox
+# ----------------------------------------------------------------------
+
+def test_cerrar_leases_agotados_solo_leases_vencidos_sin_intentos():
+    cursor = FakeCursor(rowcounts=[3])
+
+    assert sync_service._cerrar_leases_agotados(cursor) == 3
+    sql, _ = cursor.sentencias[0]
+    assert "SET sync_status = 'error'" in sql
+    assert ("WHERE sync_status = 'enviando' AND sync_proximo_intento <= NOW() "
+            "AND sync_intentos >= sync_max_intentos") in sql
+
+
+def test_reclamar_lote_outbox_reserva_con_la_condicion_del_outbox():
+    leads = [{"id": 1, "submission_time": datetime(2024, 1, 1, 10, 0)}, {"id": 2, "submission_time": None}]
+    cursor = FakeCursor(respuestas=[[{"id": 1}, {"id": 2}], leads])
+
+    reclamados = sync_service._reclamar_lote_outbox(cursor, "d", 50)
+
+    (sql_elegibles, params_elegibles), (sql_claim, params_claim), (sql_lote, params_lote) = cursor.sentencias
+    condicion = normalizar(sync_service._CONDICION_OUTBOX)
+
+    assert condicion in sql_elegibles
+    assert sql_elegibles.endswith("ORDER BY id LIMIT %s")
+    assert params_elegibles == (50,)
+
+    # El claim repite la condicion: una fila tomada por otro despachador entre
+    # el SELECT y el UPDATE no se reserva dos veces
+    assert sql_claim.endswith(f"WHERE id IN (%s, %s) AND {condicion}")
+    assert "sync_intentos = sync_intentos + IF(sync_status = 'enviando', 1, 0), sync_status = 'enviando'" in sql_claim
+    assert params_claim == ("d", sync_service.SYNC_LEASE_SECONDS, 1, 2)
+
+    assert "WHERE sync_bloqueado_por = %s AND sync_status = 'enviando'" in sql_lote
+    assert params_lote == ("d",)
+    assert reclamados[0]["submission_time"] == "2024-01-01T10:00:00"
+
+
+def test_condicion_outbox_exige_intentos_y_lease_vencido():
+    condicion = normalizar(sync_service._CONDICION_OUTBOX)
+
+    assert ("OR (sync_status = 'enviando' AND sync_proximo_intento <= NOW() "
+            "AND sync_intentos < sync_max_intentos)") in condicion
+    assert "j.estado IN ('pendiente', 'en_proceso')" in condicion
+
+
+def test_reclamar_lote_outbox_sin_elegibles_no_actualiza():
+    cursor = FakeCursor(respuestas=[[]])
+
+    assert sync_service._reclamar_lote_outbox(cursor, "d", 50) == []
+    assert len(cursor.sentencias) == 1
+
+
+# ----------------------------------------------------------------------
+# confirmar_recepcion_lote
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def conexion(monkeypatch):
+    """Conexion falsa para confirmar_recepcion_lote; retorna (cursor, cnx, invalidaciones)."""
+    def preparar(respuestas):
+        cursor = FakeCursor(respuestas=respuestas)
+        cnx = FakeConnection(cursor)
+        invalidaciones = []
+        monkeypatch.setattr(sync_service, "get_db_connection", lambda: cnx)
+        monkeypatch.setattr(sync_service, "invalidar_wix_stats", lambda c=None: invalidaciones.append("stats"))
+        monkeypatch.setattr(sync_service, "marcar_cambio", lambda r, c=None: invalidaciones.append(r))
+        return cursor, cnx, invalidaciones
+    return preparar
+
+
+def test_confirmar_recepcion_lote_bloquea_y_omite_confirmados(conexion):
+    cursor, cnx, invalidaciones = conexion([[(1, "enviado"), (2, "confirmado")]])
+
+    respuesta = sync_service.confirmar_recepcion_lote([
+        {"record_id": 1, "external_id": "EXT-1"},
+        {"record_id": 2},
+        {"record_id": 3},
+        {"record_id": 1},
+        {"record_id": "x"},
+    ])
+
+    (sql_bloqueo, params_bloqueo), (sql_update, params_update) = cursor.sentencias
+    assert sql_bloqueo.endswith("WHERE id IN (%s, %s, %s) FOR UPDATE")
+    assert params_bloqueo == (1, 2, 3)
+
+    # Solo el lead que existe y no estaba confirmado
+    assert "sync_status = 'confirmado'" in sql_update
+    assert "sync_bloqueado_por = NULL" in sql_update
+    assert sql_update.endswith("WHERE id IN (%s)")
+    assert params_update == (1, "EXT-1", 1)
+
+    assert cnx.commits == 1
+    assert invalidaciones == ["stats", "WIX"]
+    assert [r["resultado"] for r in respuesta["resultados"]] == [
+        "actualizado", "ya_confirmado", "no_encontrado", "duplicado", "invalido"
+    ]
+
+
+def test_confirmar_recepcion_lote_todo_confirmado_no_actualiza(conexion):
+    cursor, cnx, invalidaciones = conexion([[(7, "confirmado")]])
+
+    sync_service.confirmar_recepcion_lote([{"record_id": 7}])
+
+    assert len(cursor.sentencias) == 1
+    assert "stats" not in invalidaciones
+
+
+def test_confirmar_recepcion_lote_error_hace_rollback(conexion, monkeypatch):
+    cursor, cnx, _ = conexion([[(1, "enviado")]])
+
+    def fallar(sql, params=None):
+        raise RuntimeError("deadlock")
+    monkeypatch.setattr(cursor, "execute", fallar)
+
+    respuesta = sync_service.confirmar_recepcion_lote([{"record_id": 1}])
+
+    assert respuesta["success"] is False
+    assert cnx.rollbacks == 1 and cnx.commits == 0
+
+
+# ----------------------------------------------------------------------
+# _condicion_despues_de (keyset de /sync/leads)
+# ----------------------------------------------------------------------
+
+def test_condicion_despues_de_con_fecha():
+    fecha = datetime(2024, 5, 1, 12, 30)
+
+    sql, params = sync_service._condicion_despues_de((fecha, 42))
+
+    assert sql == " AND (submission_time < %s OR (submission_time = %s AND id < %s) OR submission_time IS NULL)"
+    assert params == [fecha, fecha, 42]
+
+
+def test_condicion_despues_de_en_el_tramo_null():
+    sql, params = sync_service._condicion_despues_de((None, 42))
+
+    assert sql == " AND submission_time IS NULL AND id < %s"
+    assert params == [42]